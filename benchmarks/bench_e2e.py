@@ -0,0 +1,273 @@
+# benchmarks/bench_e2e.py
+"""
+Сквозной бенчмарк бота без сети: MOEX ISS и T-Invest подменяются локальной заглушкой
+(benchmarks/stub_server.py), база — синтетическая, N пользователей × M бумаг во временном каталоге.
+
+Замеряются:
+    update_bond_data   — ежедневное обновление всех отслеживаемых бумаг (каждый прогон с устаревшими данными);
+    check_and_notify   — ежечасная сверка очереди напоминаний;
+    process_add_isin   — /add до ответа пользователю: через раз новая бумага и уже известная;
+    add_enrichment     — /add вместе с фоновой догрузкой (название, FIGI, график) до итогового сообщения;
+    bond_info_callback — кнопка /info по случайной отслеживаемой бумаге;
+    portfolio_command  — /portfolio случайного пользователя (графики из БД, котировки с MOEX, NumPy).
+
+Для каждого сценария: пропускная способность, p50/p99 задержки и пиковая память (tracemalloc,
+отдельным прогоном, чтобы трассировка не искажала время). --cold выключает HTTP-кэш и кэш графиков
+в БД — тогда каждый прогон ходит в заглушку.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_e2e --users 2000 --bonds 3 --instruments 500 --latency-ms 50
+    python -m benchmarks.bench_e2e --fixtures benchmarks/fixtures --error-rate 0.05 --cold --json e2e.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.stub_server import StubServer, StubState
+
+
+class FakeMessage:
+    def __init__(self, text: str = ""):
+        self.text = text
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        return FakeMessage(text)
+
+    async def edit_text(self, text: str, **kwargs) -> None:
+        self.text = text
+
+
+class FakeCallbackQuery:
+    def __init__(self, data: str):
+        self.data = data
+
+    async def answer(self, *args, **kwargs) -> None:
+        pass
+
+    async def edit_message_text(self, text: str, **kwargs) -> None:
+        pass
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.full_name = f"user{user_id}"
+
+
+class FakeUpdate:
+    def __init__(self, user_id: int, text: str = "", callback_data: str | None = None):
+        self.effective_user = FakeUser(user_id)
+        self.message = FakeMessage(text)
+        self.callback_query = FakeCallbackQuery(callback_data) if callback_data else None
+
+
+class FakeContext:
+    def __init__(self):
+        self.bot_data = {"logger": lambda message: None}
+        self.user_data = {}
+
+
+def percentile(timings: list[float], q: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def configure_environment(tmp: str, stub_url: str, cold: bool, rate_limits: bool) -> None:
+    """До импорта модулей бота: config.py читает окружение один раз при импорте."""
+    os.environ.update({
+        "MOEX_ISS_URL": stub_url,
+        "TINKOFF_API_URL": f"{stub_url}/rest",
+        "T_TOKEN": "bench",
+        "DATABASE_PATH": os.path.join(tmp, "bot.db"),
+        "HTTP_CACHE_PATH": os.path.join(tmp, "http_cache.db"),
+        "LOG_FILE": os.path.join(tmp, "bot.log"),
+        "METRICS_PORT": "0",
+    })
+    if not rate_limits:
+        os.environ.update({"MOEX_RPS": "0", "TINKOFF_RPS": "0"})
+    if cold:
+        os.environ.update({
+            "HTTP_CACHE_TTL_BONDIZATION": "0",
+            "HTTP_CACHE_TTL_SECURITY": "0",
+            "HTTP_CACHE_TTL_MARKET_BONDIZATION": "0",
+            "SCHEDULE_CACHE_TTL_HOURS": "0",
+        })
+
+
+def build_database(users: int, bonds_per_user: int, isins: list[str], add_users: int, seed: int) -> None:
+    from sqlalchemy import insert
+
+    from bot.DB import init_db, engine, User, Instrument, TrackedBond
+
+    init_db()
+    rng = random.Random(seed)
+    stale = datetime.utcnow() - timedelta(days=2)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"tg_id": uid, "full_name": f"user{uid}"} for uid in range(users + 2 * add_users)])
+        conn.execute(insert(Instrument), [{"isin": isin, "last_updated": stale} for isin in isins])
+        conn.execute(insert(TrackedBond), [
+            {"user_id": uid, "isin": isin}
+            for uid in range(users) for isin in rng.sample(isins, min(bonds_per_user, len(isins)))
+        ])
+
+
+def mark_stale() -> None:
+    from sqlalchemy import update
+
+    from bot.DB import engine, Instrument
+
+    with engine.begin() as conn:
+        conn.execute(update(Instrument).values(last_updated=datetime.utcnow() - timedelta(days=2)))
+
+
+async def measure(name: str, calls: list, concurrency: int, stub: StubState, before=None) -> dict:
+    """
+    `calls` — фабрики корутин, по одной на вызов. Прогон по времени, затем по памяти на первых вызовах.
+    """
+    requests_before = sum(stub.requests.values())
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def timed(factory) -> None:
+        async with semaphore:
+            if before:
+                before()
+            started = time.perf_counter()
+            await factory()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(factory) for factory in calls))
+    elapsed = time.perf_counter() - started
+    requests = sum(stub.requests.values()) - requests_before
+
+    tracemalloc.start()
+    for factory in calls[:max(1, min(len(calls), concurrency))]:
+        if before:
+            before()
+        await factory()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "calls": len(calls),
+        "throughput": len(calls) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(timings, 0.5),
+        "p99_ms": percentile(timings, 0.99),
+        "peak_mib": peak / 1024 / 1024,
+        "stub_requests": requests,
+    }
+
+
+async def run(args, stub: StubState, isins: list[str]) -> list[dict]:
+    from bot.DB import async_engine
+    from bot.enrichment import bond_enrichment
+    from bot.handlers import process_add_isin, bond_info_callback, portfolio_command
+    from bot.notifications import check_and_notify
+    from core.http_cache import close_cache
+    from core.http_client import close_clients
+    from database.catalogue import load_bond_catalogue
+    from database.update import update_bond_data
+
+    async def add_and_enrich(update: FakeUpdate) -> None:
+        await process_add_isin(update, FakeContext())
+        await bond_enrichment.join()
+
+    rng = random.Random(args.seed)
+    await load_bond_catalogue()
+    results = []
+    try:
+        results.append(await measure(
+            "update_bond_data", [update_bond_data] * args.update_runs, 1, stub, before=mark_stale))
+        results.append(await measure(
+            "check_and_notify", [lambda: check_and_notify(None)] * args.repeat, 1, stub))
+
+        add_calls = []
+        for i in range(args.adds):
+            # Через раз — новая бумага (FIGI, название и график из сети) и уже отслеживаемая кем-то
+            isin = f"RU000B{i:06d}" if i % 2 == 0 else rng.choice(isins)
+            update = FakeUpdate(args.users + i, text=isin)
+            add_calls.append(lambda update=update: process_add_isin(update, FakeContext()))
+        results.append(await measure("process_add_isin", add_calls, args.concurrency, stub))
+        await bond_enrichment.join()
+
+        enrich_calls = []
+        for i in range(args.adds):
+            isin = f"RU000C{i:06d}" if i % 2 == 0 else rng.choice(isins)
+            update = FakeUpdate(args.users + args.adds + i, text=isin)
+            enrich_calls.append(lambda update=update: add_and_enrich(update))
+        results.append(await measure("add_enrichment", enrich_calls, args.concurrency, stub))
+
+        info_calls = []
+        for _ in range(args.repeat):
+            update = FakeUpdate(rng.randrange(args.users), callback_data=rng.choice(isins))
+            info_calls.append(lambda update=update: bond_info_callback(update, FakeContext()))
+        results.append(await measure("bond_info_callback", info_calls, args.concurrency, stub))
+
+        portfolio_calls = []
+        for _ in range(args.repeat):
+            update = FakeUpdate(rng.randrange(args.users))
+            portfolio_calls.append(lambda update=update: portfolio_command(update, FakeContext()))
+        results.append(await measure("portfolio_command", portfolio_calls, args.concurrency, stub))
+    finally:
+        await close_clients()
+        close_cache()
+        await async_engine.dispose()
+    return results
+
+
+def report(args, results: list[dict], stub: StubState) -> None:
+    print(f"users={args.users}, bonds/user={args.bonds}, instruments={args.instruments}, "
+          f"latency={args.latency_ms}±{args.jitter_ms} мс, errors={args.error_rate:.0%}, "
+          f"concurrency={args.concurrency}, {'cold' if args.cold else 'warm'}")
+    print(f"{'сценарий':<22}{'вызовов':>9}{'выз./с':>10}{'p50, мс':>10}{'p99, мс':>10}{'пик, МиБ':>10}"
+          f"{'запросов':>10}")
+    for row in results:
+        print(f"{row['scenario']:<22}{row['calls']:>9}{row['throughput']:>10.1f}{row['p50_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['peak_mib']:>10.1f}{row['stub_requests']:>10}")
+    print("запросы к заглушке:", ", ".join(f"{k}={v}" for k, v in sorted(stub.requests.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--bonds", type=int, default=3, help="бумаг на пользователя")
+    parser.add_argument("--instruments", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200, help="вызовов check_and_notify, bond_info_callback и portfolio_command")
+    parser.add_argument("--adds", type=int, default=100, help="вызовов process_add_isin")
+    parser.add_argument("--update-runs", type=int, default=3, help="прогонов update_bond_data")
+    parser.add_argument("--concurrency", type=int, default=1, help="одновременных вызовов обработчиков")
+    parser.add_argument("--fixtures", help="каталог записанных ответов (см. benchmarks/stub_server.py)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--cold", action="store_true", help="без HTTP-кэша и кэша графиков в БД")
+    parser.add_argument("--rate-limits", action="store_true", help="оставить MOEX_RPS/TINKOFF_RPS из окружения")
+    parser.add_argument("--json", help="дописать результаты в файл (для сравнения между коммитами)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    isins = [f"RU000A{i:06d}" for i in range(args.instruments)]
+    stub = StubState(isins, args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, seed=args.seed)
+    server = StubServer(stub).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, server.url, args.cold, args.rate_limits)
+        build_database(args.users, args.bonds, isins, args.adds, args.seed)
+        try:
+            results = asyncio.run(run(args, stub, isins))
+        finally:
+            server.stop()
+
+    report(args, results, stub)
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"at": datetime.now().isoformat(timespec="seconds"), "args": vars(args),
+                                "results": results}, ensure_ascii=False) + "\n")
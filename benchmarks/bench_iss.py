@@ -0,0 +1,141 @@
+# benchmarks/bench_iss.py
+"""
+Размер ответа bondization.json и время его разбора: полный ответ ISS против выборки
+только нужных блоков и колонок (database/iss.py).
+
+По умолчанию используется синтетический ответ по длинной бумаге (30 лет, купон раз в квартал,
+амортизация последние 5 лет, оферты). Записанные ответы MOEX можно передать через --payload.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_iss --years 30 --repeat 300
+    python -m benchmarks.bench_iss --payload recorded/RU000A0JX0J2.json
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from database.bond_utils import moex_events
+from database.iss import IssTable, SECURITY_BONDIZATION_BLOCKS
+
+# Колонки полного ответа securities/{isin}/bondization.json
+FULL_COLUMNS = {
+    "coupons": ["isin", "name", "issuevalue", "coupondate", "recorddate", "startdate", "initialfacevalue",
+                "facevalue", "faceunit", "value", "valueprc", "value_rub", "secid", "primary_boardid"],
+    "amortizations": ["isin", "name", "issuevalue", "amortdate", "facevalue", "initialfacevalue", "faceunit",
+                      "valueprc", "value", "value_rub", "data_source", "secid", "primary_boardid"],
+    "offers": ["isin", "name", "issuevalue", "offerdate", "offerdatestart", "offerdateend", "facevalue",
+               "faceunit", "price", "value", "agent", "offertype", "secid", "primary_boardid"],
+}
+
+
+def synthetic_payload(years: int) -> dict:
+    """Полный ответ ISS с метаданными по одной длинной бумаге."""
+    isin, name = "RU000A0ZZZZ1", "ОФЗ-ПД 26238 15/05/2041"
+    start = date.today() - timedelta(days=365 * 5)
+    payments = years * 4
+    rows = {"coupons": [], "amortizations": [], "offers": []}
+    for k in range(payments):
+        pay = (start + timedelta(days=91 * (k + 1))).isoformat()
+        rows["coupons"].append([isin, name, 350000000000, pay, pay, pay, 1000, 1000, "SUB", 35.4, 7.1, 35.4,
+                                "SU26238RMFS4", "TQOB"])
+        if k >= payments - 20:
+            rows["amortizations"].append([isin, name, 350000000000, pay, 1000, 1000, "SUB", 5, 50.0, 50.0,
+                                          "amortization", "SU26238RMFS4", "TQOB"])
+    for k in range(0, years, 3):
+        offer = (start + timedelta(days=365 * k)).isoformat()
+        rows["offers"].append([isin, name, 350000000000, offer, offer, offer, 1000, "SUB", 100.0, 1000,
+                               "Агент", "Put", "SU26238RMFS4", "TQOB"])
+
+    payload = {}
+    for block, columns in FULL_COLUMNS.items():
+        payload[block] = {
+            "metadata": {column: {"type": "string", "bytes": 189, "max_size": 0} for column in columns},
+            "columns": columns,
+            "data": rows[block],
+        }
+    return payload
+
+
+def lean_payload(full: dict) -> dict:
+    """То, что ISS отдаёт на запрос с iss.only, <блок>.columns и iss.meta=off."""
+    lean = {}
+    for block, spec in SECURITY_BONDIZATION_BLOCKS.items():
+        columns = full.get(block, {}).get("columns", [])
+        index = [columns.index(column) for column in spec.columns if column in columns]
+        lean[block] = {
+            "columns": [columns[i] for i in index],
+            "data": [[row[i] for i in index] for row in full.get(block, {}).get("data", [])],
+        }
+    return lean
+
+
+def _convert_date(date_string: str) -> str:
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d").strftime("%d.%m.%Y")
+    except ValueError:
+        return date_string
+
+
+def parse_full(raw: bytes) -> dict:
+    """Прежний разбор: словарь на каждую строку и конвертация каждого поля с «date» в имени."""
+    data = json.loads(raw)
+    result = {}
+    for block in ("amortizations", "coupons", "offers"):
+        columns = data[block].get("columns", [])
+        events = []
+        for row in data[block].get("data", []):
+            event = dict(zip(columns, row))
+            for key in event.keys():
+                if "date" in key.lower() and isinstance(event[key], str):
+                    event[key] = _convert_date(event[key])
+            events.append(event)
+        result[block] = events
+    return result
+
+
+def parse_lean(raw: bytes) -> list:
+    data = json.loads(raw)
+    return moex_events({
+        block: IssTable(spec, data.get(block, {})) for block, spec in SECURITY_BONDIZATION_BLOCKS.items()
+    })
+
+
+def measure(parse, raw: bytes, repeat: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(raw)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def run(payloads: list[tuple[str, dict]], repeat: int) -> None:
+    print(f"{'ответ':<28}{'полный, Б':>12}{'выборка, Б':>12}{'разбор до p50, мкс':>20}{'после p50':>12}"
+          f"{'до p99':>10}{'после p99':>12}")
+    for label, full in payloads:
+        full_raw = json.dumps(full, ensure_ascii=False).encode()
+        lean_raw = json.dumps(lean_payload(full), ensure_ascii=False).encode()
+        before_p50, before_p99 = measure(parse_full, full_raw, repeat)
+        after_p50, after_p99 = measure(parse_lean, lean_raw, repeat)
+        print(f"{label:<28}{len(full_raw):>12}{len(lean_raw):>12}{before_p50:>20.1f}{after_p50:>12.1f}"
+              f"{before_p99:>10.1f}{after_p99:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", nargs="*", default=[], help="записанные полные ответы bondization.json")
+    parser.add_argument("--years", type=int, default=30, help="срок синтетической бумаги")
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.payload:
+        payloads = []
+        for path in args.payload:
+            with open(path, encoding="utf-8") as f:
+                payloads.append((path[-28:], json.load(f)))
+    else:
+        payloads = [(f"синтетика, {args.years} лет", synthetic_payload(args.years))]
+    run(payloads, args.repeat)
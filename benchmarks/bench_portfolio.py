@@ -0,0 +1,134 @@
+# benchmarks/bench_portfolio.py
+"""
+Аналитика портфеля (core/analytics.py) на больших синтетических портфелях: пакетный расчёт
+на NumPy против расчёта по одной бумаге в цикле Python (Newton на скалярах).
+
+Каждая бумага: квартальный купон, погашение через 1–15 лет, часть с амортизацией последние 2 года,
+цена — приведённая стоимость по случайной «истинной» ставке 5–25%. Бенчмарк заодно сверяет,
+что оба способа дают одну доходность и что она совпадает с заложенной.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_portfolio --bonds 10000 --repeat 5
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from bot.DB import COUPON, AMORTIZATION
+from core.analytics import build_cash_flows, analyze
+from core.bonds import BondEvent, SOURCE_MOEX
+
+
+def synthetic_portfolio(bonds: int, today: date, seed: int) -> tuple[list[list[BondEvent]], np.ndarray]:
+    rng = random.Random(seed)
+    schedules, rates = [], []
+    for _ in range(bonds):
+        payments = rng.randint(4, 60)
+        coupon = Decimal(rng.randint(500, 6000)) / 100
+        first = today + timedelta(days=rng.randint(1, 91))
+        amortized = rng.random() < 0.3
+        events, face = [], Decimal(1000)
+        for k in range(payments):
+            pay = first + timedelta(days=91 * k)
+            events.append(BondEvent(pay, coupon * face / 1000, COUPON, SOURCE_MOEX))
+            if amortized and k >= payments - 8:
+                events.append(BondEvent(pay, Decimal(125), AMORTIZATION, SOURCE_MOEX))
+                face -= 125
+        if face:
+            events.append(BondEvent(first + timedelta(days=91 * (payments - 1)), face, AMORTIZATION, SOURCE_MOEX))
+        schedules.append(events)
+        rates.append(rng.uniform(0.05, 0.25))
+    return schedules, np.array(rates)
+
+
+def present_values(flows, rates: np.ndarray) -> np.ndarray:
+    return np.bincount(flows.bond, weights=flows.amount * (1 + rates[flows.bond]) ** -flows.years,
+                       minlength=flows.bonds)
+
+
+def scalar_ytm(years: list[float], amounts: list[float], price: float, tol: float = 1e-10) -> float:
+    """То же уравнение, что в solve_ytm, но по одной бумаге и на скалярах."""
+    y = 0.1
+    for _ in range(50):
+        value = slope = 0.0
+        for t, cf in zip(years, amounts):
+            discounted = cf * (1 + y) ** -t
+            value += discounted
+            slope -= t * discounted / (1 + y)
+        step = (value - price) / slope
+        y = min(max(y - step, -0.95), 10.0)
+        if abs(step) < tol:
+            break
+    return y
+
+
+def scalar_metrics(flows, clean: np.ndarray, dirty: np.ndarray) -> list[tuple[float, float, float]]:
+    """Текущая доходность, YTM и дюрация по одной бумаге: группировка выплат и расчёт в цикле."""
+    per_bond = [([], [], []) for _ in range(flows.bonds)]
+    for bond, t, cf, kind in zip(flows.bond.tolist(), flows.years.tolist(), flows.amount.tolist(),
+                                 flows.kind.tolist()):
+        per_bond[bond][0].append(t)
+        per_bond[bond][1].append(cf)
+        per_bond[bond][2].append(kind)
+
+    result = []
+    for i, (years, amounts, kinds) in enumerate(per_bond):
+        annual = sum(cf for t, cf, kind in zip(years, amounts, kinds) if kind == 0 and t <= 1.0)
+        y = scalar_ytm(years, amounts, dirty[i])
+        pv = [cf * (1 + y) ** -t for t, cf in zip(years, amounts)]
+        duration = sum(t * v for t, v in zip(years, pv)) / sum(pv)
+        result.append((annual / clean[i], y, duration))
+    return result
+
+
+def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(bonds: int, repeat: int, seed: int) -> None:
+    today = date.today()
+    schedules, rates = synthetic_portfolio(bonds, today, seed)
+
+    started = time.perf_counter()
+    flows = build_cash_flows(schedules, today)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    dirty = present_values(flows, rates)
+    clean = dirty * 0.99
+
+    metrics = analyze(flows, clean, dirty)
+    scalar = scalar_metrics(flows, clean, dirty)
+    error_vs_true = np.nanmax(np.abs(metrics.ytm - rates))
+    error_vs_scalar = max(abs(metrics.ytm[i] - y) for i, (_, y, _) in enumerate(scalar))
+
+    vector_ms = measure(lambda: analyze(flows, clean, dirty), repeat)
+    scalar_ms = measure(lambda: scalar_metrics(flows, clean, dirty), max(1, repeat // 2))
+
+    print(f"bonds={bonds}, выплат={len(flows.amount)}, repeat={repeat}")
+    print(f"сборка массивов из графиков: {build_ms:.1f} мс")
+    print(f"{'расчёт':<28}{'p50, мс':>10}")
+    print(f"{'NumPy, пакетом':<28}{vector_ms:>10.1f}")
+    print(f"{'Python, по одной бумаге':<28}{scalar_ms:>10.1f}")
+    print(f"ускорение: ×{scalar_ms / vector_ms:.1f}")
+    print(f"макс. расхождение YTM: с заложенной {error_vs_true:.2e}, со скалярным расчётом {error_vs_scalar:.2e}")
+    print(f"портфель: YTM {metrics.portfolio_ytm:.4f}, текущая {metrics.portfolio_current_yield:.4f}, "
+          f"дюрация {metrics.portfolio_duration:.2f} г.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bonds", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.bonds, args.repeat, args.seed)
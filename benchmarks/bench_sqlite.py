@@ -0,0 +1,121 @@
+# benchmarks/bench_sqlite.py
+"""
+Задержка горячих запросов SQLite до и после настройки (WAL, PRAGMA, индексы).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sqlite --users 5000 --bonds 3 --instruments 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import Session
+
+from bot.DB import Base, User, Instrument, CouponEvent, TrackedBond, COUPON
+from database.db_setup import _apply_pragmas
+
+# Индексы, добавленные настройкой: в режиме «до» их удаляем
+TUNED_INDEXES = ["uq_tracked_bonds_user_isin", "ix_tracked_bonds_isin", "ix_coupon_events_event_date",
+                 "ix_instruments_last_updated"]
+
+
+def build_database(path: str, tuned: bool, users: int, bonds_per_user: int, instruments: int, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    if tuned:
+        event.listen(engine, "connect", _apply_pragmas)
+    Base.metadata.create_all(engine)
+    if not tuned:
+        with engine.begin() as conn:
+            for index in TUNED_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    rng = random.Random(seed)
+    isins = [f"RU000A{i:06d}" for i in range(instruments)]
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"tg_id": uid, "full_name": f"user{uid}"} for uid in range(users)])
+        conn.execute(insert(Instrument), [{"isin": isin, "name": isin, "last_updated": datetime.utcnow()}
+                                          for isin in isins])
+        conn.execute(insert(CouponEvent), [
+            {"isin": isin, "event_type": COUPON, "event_date": today + timedelta(days=91 * k + i % 91),
+             "value": 25.0, "source": "MOEX"}
+            for i, isin in enumerate(isins) for k in range(12)
+        ])
+        conn.execute(insert(TrackedBond), [
+            {"user_id": uid, "isin": isin}
+            for uid in range(users) for isin in rng.sample(isins, bonds_per_user)
+        ])
+    return engine, isins
+
+
+def measure(engine, name: str, sql: str, params_factory, repeat: int) -> tuple[str, float, float]:
+    timings = []
+    with engine.connect() as conn:
+        statement = text(sql)
+        for _ in range(repeat):
+            params = params_factory()
+            started = time.perf_counter()
+            conn.execute(statement, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return name, statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def measure_writes(engine, users: int, isins: list[str], repeat: int) -> tuple[str, float, float]:
+    """Одиночные commit'ы, как у /add: здесь решают journal_mode и synchronous."""
+    timings = []
+    with Session(engine) as session:
+        for i in range(repeat):
+            started = time.perf_counter()
+            session.add(TrackedBond(user_id=users + i, isin=isins[i % len(isins)]))
+            session.commit()
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return "insert+commit подписки", statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def run(users: int, bonds_per_user: int, instruments: int, repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    today = date.today()
+    queries = [
+        ("бумаги пользователя (user_id)", "SELECT * FROM tracked_bonds WHERE user_id = :u",
+         lambda: {"u": rng.randrange(users)}),
+        ("подписка (user_id, isin)", "SELECT id FROM tracked_bonds WHERE user_id = :u AND isin = :i",
+         lambda: {"u": rng.randrange(users), "i": f"RU000A{rng.randrange(instruments):06d}"}),
+        ("подписчики бумаги (isin)", "SELECT user_id FROM tracked_bonds WHERE isin = :i",
+         lambda: {"i": f"RU000A{rng.randrange(instruments):06d}"}),
+        ("события на дату (event_date)", "SELECT * FROM coupon_events WHERE event_date = :d",
+         lambda: {"d": (today + timedelta(days=rng.randrange(365))).isoformat()}),
+    ]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for tuned in (False, True):
+            label = "после" if tuned else "до"
+            engine, isins = build_database(os.path.join(tmp, f"{label}.db"), tuned, users, bonds_per_user,
+                                           instruments, seed)
+            rows = [measure(engine, name, sql, factory, repeat) for name, sql, factory in queries]
+            rows.append(measure_writes(engine, users, isins, min(repeat, 200)))
+            results[label] = rows
+            engine.dispose()
+
+    print(f"users={users}, bonds/user={bonds_per_user}, instruments={instruments}, repeat={repeat}")
+    print(f"{'запрос':<34}{'до p50, мкс':>14}{'до p99':>10}{'после p50':>12}{'после p99':>12}")
+    for before, after in zip(results["до"], results["после"]):
+        print(f"{before[0]:<34}{before[1]:>14.1f}{before[2]:>10.1f}{after[1]:>12.1f}{after[2]:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--bonds", type=int, default=3, help="бумаг на пользователя")
+    parser.add_argument("--instruments", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.users, args.bonds, args.instruments, args.repeat, args.seed)
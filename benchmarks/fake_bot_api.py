@@ -0,0 +1,274 @@
+# benchmarks/fake_bot_api.py
+"""
+Локальная проверка бота в режиме webhook без Telegram: заглушка Bot API и генератор обновлений.
+
+Заглушка отвечает на вызовы бота (getMe, setWebhook, sendMessage, editMessageText, ...) и запоминает,
+когда и в какой чат ушёл ответ. Генератор шлёт на webhook бота сообщения пользователей с заданной
+частотой: каждый пользователь проходит сценарий /start, /add + ISIN, /list, /info, /events, /portfolio,
+/remove + ISIN, и следующее его сообщение уходит только после того, как webhook принял предыдущее
+(как это делает Telegram). MOEX и T-Invest подменяются benchmarks/stub_server.py, бот (main.py)
+запускается отдельным процессом с временной базой.
+
+Замеряются задержка от отправки обновления до ответа бота (p50/p99), число обновлений без ответа
+и ошибки диалогов: ответ на ISIN внутри /add или /remove, который обработан вне диалога.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fake_bot_api --users 100 --rate 50 --concurrency 64
+    python -m benchmarks.fake_bot_api --users 100 --rate 50 --concurrency 1 --latency-ms 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httpx
+
+from benchmarks.bench_e2e import configure_environment, percentile
+from benchmarks.stub_server import StubServer, StubState
+
+BOT_TOKEN = "123456:fake"
+WEBHOOK_SECRET = "bench"
+SCRIPT = ["/start", "/add", "{isin}", "/list", "/info", "/events", "/portfolio", "/remove", "{isin}"]
+# Ожидаемые ответы на ISIN внутри диалогов (по номеру шага в SCRIPT)
+DIALOG_REPLIES = {2: ("добавлена", "отслеживаешь", "3 бумаги"), 8: ("удалена", "не отслеживаешь")}
+
+
+class FakeBotState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.replies: dict[int, list[tuple[float, str]]] = defaultdict(list)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.webhook_set = threading.Event()
+        self._message_ids = iter(range(1, 10 ** 9))
+
+    def message(self, chat_id: int, text: str) -> dict:
+        with self.lock:
+            message_id = next(self._message_ids)
+        return {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"},
+                "text": text}
+
+
+class FakeBotHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: FakeBotState
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, result) -> None:
+        body = json.dumps({"ok": True, "result": result}, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _params(self) -> dict:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw or "{}")
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+    def do_POST(self) -> None:
+        method = self.path.rsplit("/", 1)[-1]
+        params = self._params()
+        state = self.state
+        with state.lock:
+            state.calls[method] += 1
+
+        if method == "getMe":
+            self._reply({"id": 1, "is_bot": True, "first_name": "BondWatch", "username": "bondwatch_bench_bot"})
+        elif method == "setWebhook":
+            state.webhook_set.set()
+            self._reply(True)
+        elif method == "getWebhookInfo":
+            self._reply({"url": "", "has_custom_certificate": False, "pending_update_count": 0})
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id, text = int(params["chat_id"]), params.get("text", "")
+            if method == "sendMessage":
+                with state.lock:
+                    state.replies[chat_id].append((time.perf_counter(), text))
+            self._reply(state.message(chat_id, text))
+        elif method == "getUpdates":
+            time.sleep(min(float(params.get("timeout") or 0), 1.0))
+            self._reply([])
+        else:
+            self._reply(True)
+
+
+class FakeBotApi:
+    """ThreadingHTTPServer в фоновом потоке, как и заглушка MOEX/T-Invest."""
+
+    def __init__(self, state: FakeBotState, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundFakeBotHandler", (FakeBotHandler,), {"state": state})
+        self.state = state
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBotApi":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def text_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+async def drive(webhook_url: str, users: list[int], isins: dict[int, str], rate: float) -> dict[int, list[float]]:
+    """Шлёт сценарий всех пользователей: обновление k уходит не раньше t0 + k / rate. Возвращает время отправки."""
+    sent: dict[int, list[float]] = defaultdict(list)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+    started = time.perf_counter()
+
+    async def user_flow(client: httpx.AsyncClient, index: int, user_id: int) -> None:
+        for step, template in enumerate(SCRIPT):
+            k = step * len(users) + index
+            delay = started + k / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent[user_id].append(time.perf_counter())
+            response = await client.post(webhook_url, headers=headers,
+                                         json=text_update(k + 1, user_id, template.format(isin=isins[user_id])))
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=100)) as client:
+        await asyncio.gather(*(user_flow(client, index, user_id) for index, user_id in enumerate(users)))
+    return sent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"webhook бота не поднялся на порту {port}")
+
+
+def report(args, sent: dict[int, list[float]], state: FakeBotState, elapsed: float) -> None:
+    latencies, unanswered, dialog_errors = [], 0, 0
+    for user_id, posted in sent.items():
+        replies = state.replies.get(user_id, [])
+        unanswered += max(0, len(posted) - len(replies))
+        for step, (posted_at, (replied_at, text)) in enumerate(zip(posted, replies)):
+            latencies.append((replied_at - posted_at) * 1000)
+            expected = DIALOG_REPLIES.get(step)
+            if expected and not any(marker in text for marker in expected):
+                dialog_errors += 1
+
+    total = sum(len(posted) for posted in sent.values())
+    print(f"users={args.users}, rate={args.rate}/с, concurrency={args.concurrency}, latency MOEX/T-Invest="
+          f"{args.latency_ms} мс")
+    print(f"обновлений: {total} за {elapsed:.1f} c, ответов: {len(latencies)}, без ответа: {unanswered}, "
+          f"ошибок диалогов: {dialog_errors}")
+    if latencies:
+        print(f"задержка ответа: p50 {percentile(latencies, 0.5):.1f} мс, p99 {percentile(latencies, 0.99):.1f} мс, "
+              f"среднее {statistics.mean(latencies):.1f} мс")
+    print("вызовы Bot API: " + ", ".join(f"{method}={count}" for method, count in sorted(state.calls.items())))
+
+
+def run(args) -> None:
+    rng = random.Random(args.seed)
+    isins = [f"RU000A{i:06d}" for i in range(args.instruments)]
+    stub = StubServer(StubState(isins, latency_ms=args.latency_ms, seed=args.seed)).start()
+    fake = FakeBotApi(FakeBotState()).start()
+    port = free_port()
+    users = [1_000_000 + i for i in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, stub.url, cold=False, rate_limits=False)
+        env = {
+            **os.environ,
+            "TELEGRAM_TOKEN": BOT_TOKEN,
+            "TELEGRAM_API_URL": f"{fake.url}/bot",
+            "BOT_MODE": "webhook",
+            "WEBHOOK_PORT": str(port),
+            "WEBHOOK_URL": f"http://127.0.0.1:{port}/telegram",
+            "WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "CONCURRENT_UPDATES": str(args.concurrency),
+        }
+        bot = subprocess.Popen([sys.executable, "main.py"], env=env, stdout=subprocess.DEVNULL,
+                               stderr=None if args.verbose else subprocess.DEVNULL)
+        try:
+            if not fake.state.webhook_set.wait(timeout=60):
+                raise TimeoutError("бот не зарегистрировал webhook")
+            wait_for_port(port, timeout=30)
+
+            started = time.perf_counter()
+            sent = asyncio.run(drive(env["WEBHOOK_URL"], users, {user: rng.choice(isins) for user in users},
+                                     args.rate))
+            # Ждём ответы на все отправленные обновления (или таймаут)
+            deadline = time.monotonic() + args.drain_timeout
+            expected = sum(len(posted) for posted in sent.values())
+            while time.monotonic() < deadline:
+                with fake.state.lock:
+                    answered = sum(len(replies) for replies in fake.state.replies.values())
+                if answered >= expected:
+                    break
+                time.sleep(0.1)
+            elapsed = time.perf_counter() - started
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+            fake.stop()
+            stub.stop()
+
+    report(args, sent, fake.state, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50.0, help="обновлений в секунду на все чаты")
+    parser.add_argument("--concurrency", type=int, default=64, help="CONCURRENT_UPDATES бота (1 — по одному)")
+    parser.add_argument("--instruments", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="задержка заглушки MOEX/T-Invest")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="сколько ждать оставшиеся ответы, c")
+    parser.add_argument("--verbose", action="store_true", help="показывать stderr бота")
+    parser.add_argument("--seed", type=int, default=42)
+    run(parser.parse_args())
@@ -0,0 +1,375 @@
+# benchmarks/stub_server.py
+"""
+Локальная заглушка MOEX ISS и T-Invest REST для бенчмарков без сети.
+
+Отдаёт bondization.json (по бумаге и сводный по рынку, с постраничной выдачей), securities/{isin}.json,
+котировки рынка облигаций, BondBy, GetBondCoupons и Bonds. Ответы берутся из записанных файлов (--fixtures), а если файла нет —
+генерируются по ISIN детерминированно. Задержка и доля ошибок 503 настраиваются.
+
+Бот направляется на заглушку переменными окружения:
+    MOEX_ISS_URL=http://127.0.0.1:8765 TINKOFF_API_URL=http://127.0.0.1:8765/rest
+
+Запуск отдельно (например, для ручной проверки бота):
+    python -m benchmarks.stub_server --port 8765 --latency-ms 80 --error-rate 0.02
+Запись фикстур с настоящих API (нужны сеть и T_TOKEN):
+    python -m benchmarks.stub_server --record benchmarks/fixtures RU000A0JX0J2 SU26238RMFS4
+
+Раскладка каталога фикстур:
+    bondization/<ISIN>.json, securities/<ISIN>.json, market_bondization.json, market_securities.json,
+    BondBy/<ISIN>.json, GetBondCoupons/<FIGI>.json, Bonds.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SECURITY_PREFIX = "/iss/securities/"
+MARKET_BONDIZATION = "/iss/statistics/engines/stock/markets/bonds/bondization.json"
+MARKET_SECURITIES = "/iss/engines/stock/markets/bonds/securities.json"
+TINKOFF_PREFIX = "/rest/tinkoff.public.invest.api.contract.v1.InstrumentsService/"
+
+COLUMNS = {
+    "coupons": ["isin", "name", "issuevalue", "coupondate", "recorddate", "startdate", "initialfacevalue",
+                "facevalue", "faceunit", "value", "valueprc", "value_rub", "secid", "primary_boardid"],
+    "amortizations": ["isin", "name", "issuevalue", "amortdate", "facevalue", "initialfacevalue", "faceunit",
+                      "valueprc", "value", "value_rub", "data_source", "secid", "primary_boardid"],
+    "offers": ["isin", "name", "issuevalue", "offerdate", "offerdatestart", "offerdateend", "facevalue",
+               "faceunit", "price", "value", "agent", "offertype", "secid", "primary_boardid"],
+}
+CURSOR_COLUMNS = ["INDEX", "TOTAL", "PAGESIZE"]
+
+
+def _seed(key: str) -> int:
+    return zlib.crc32(key.encode())
+
+
+def synthetic_figi(isin: str) -> str:
+    return f"BBG{_seed(isin):09d}"[:12]
+
+
+def synthetic_name(isin: str) -> str:
+    return f"Облигация {isin[-6:]}"
+
+
+def synthetic_bondization(isin: str, today: date | None = None) -> dict[str, list[list]]:
+    """Полные строки coupons/amortizations/offers одной бумаги: 5 лет, купон раз в квартал."""
+    today = today or date.today()
+    seed = _seed(isin)
+    start = today - timedelta(days=365 * 2 - seed % 91)
+    name = synthetic_name(isin)
+    value = round(10 + seed % 40 + 0.5, 2)
+    rows = {"coupons": [], "amortizations": [], "offers": []}
+    for k in range(20):
+        pay = (start + timedelta(days=91 * (k + 1))).isoformat()
+        rows["coupons"].append([isin, name, 1000000, pay, pay, pay, 1000, 1000, "SUR", value, 8.5, value,
+                                isin, "TQCB"])
+        if k >= 16:
+            rows["amortizations"].append([isin, name, 1000000, pay, 1000, 1000, "SUR", 25, 250.0, 250.0,
+                                          "amortization", isin, "TQCB"])
+    if seed % 3 == 0:
+        offer = (today + timedelta(days=180 + seed % 180)).isoformat()
+        rows["offers"].append([isin, name, 1000000, offer, offer, offer, 1000, "SUR", 100.0, 1000,
+                               "Агент", "Put", isin, "TQCB"])
+    return rows
+
+
+class StubState:
+    """Фикстуры и параметры заглушки, общие для всех потоков сервера."""
+
+    def __init__(self, isins: list[str], fixtures: str | None = None, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, catalogue_share: float = 0.8, seed: int = 42):
+        self.isins = list(isins)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # Часть бумаг есть в справочнике Bonds; остальные T-Invest находит только через BondBy
+        self.catalogued = {isin for isin in self.isins if _seed(isin) % 100 < catalogue_share * 100}
+        self.requests: dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            return max(0.0, self.latency_ms + jitter) / 1000
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def recorded(self, kind: str, key: str | None = None):
+        """Записанный ответ: по ключу, иначе любой файл того же вида (выбор зависит только от ключа)."""
+        if not self.fixtures:
+            return None
+        if key is None:
+            path = os.path.join(self.fixtures, f"{kind}.json")
+        else:
+            folder = os.path.join(self.fixtures, kind)
+            if not os.path.isdir(folder):
+                return None
+            path = os.path.join(folder, f"{key}.json")
+            if not os.path.exists(path):
+                files = sorted(f for f in os.listdir(folder) if f.endswith(".json"))
+                if not files:
+                    return None
+                path = os.path.join(folder, files[_seed(key) % len(files)])
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _select(payload: dict, query: dict[str, list[str]]) -> dict:
+    """Как ISS: iss.only — только перечисленные блоки, <блок>.columns — только перечисленные колонки."""
+    only = query.get("iss.only", [""])[0]
+    blocks = only.split(",") if only else list(payload)
+    result = {}
+    for block in blocks:
+        if block not in payload:
+            continue
+        columns, data = payload[block].get("columns", []), payload[block].get("data", [])
+        wanted = query.get(f"{block}.columns", [""])[0]
+        if wanted:
+            index = [columns.index(column) for column in wanted.split(",") if column in columns]
+            columns, data = [columns[i] for i in index], [[row[i] for i in index] for row in data]
+        result[block] = {"columns": columns, "data": data}
+    return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # клиент отменил запрос — например, проигравшие параллельные BondBy
+
+    def _begin(self, endpoint: str) -> bool:
+        self.state.count(endpoint)
+        time.sleep(self.state.delay())
+        if self.state.should_fail():
+            self._reply(503, {"error": "injected"})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == MARKET_BONDIZATION:
+            if self._begin("market_bondization"):
+                self._reply(200, self._market_bondization(query))
+        elif url.path == MARKET_SECURITIES:
+            if self._begin("market_securities"):
+                self._reply(200, _select(self._market_securities(), query))
+        elif url.path.startswith(SECURITY_PREFIX) and url.path.endswith("/bondization.json"):
+            isin = url.path[len(SECURITY_PREFIX):].split("/")[0]
+            if self._begin("bondization"):
+                payload = self.state.recorded("bondization", isin) or {
+                    block: {"columns": COLUMNS[block], "data": rows}
+                    for block, rows in synthetic_bondization(isin).items()
+                }
+                self._reply(200, _select(payload, query))
+        elif url.path.startswith(SECURITY_PREFIX) and url.path.endswith(".json"):
+            isin = url.path[len(SECURITY_PREFIX):-len(".json")]
+            if self._begin("securities"):
+                payload = self.state.recorded("securities", isin) or {"description": {
+                    "columns": ["name", "title", "value", "type", "sort_order", "is_hidden", "precision"],
+                    "data": [["SECID", "Код ценной бумаги", isin, "string", 1, 0, None],
+                             ["NAME", "Полное наименование", synthetic_name(isin), "string", 2, 0, None],
+                             ["SHORTNAME", "Краткое наименование", isin[-6:], "string", 3, 0, None]],
+                }}
+                self._reply(200, _select(payload, query))
+        else:
+            self._reply(404, {})
+
+    def _market_bondization(self, query: dict[str, list[str]]) -> dict:
+        start = int(query.get("start", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        since = date.fromisoformat(query.get("from", [date.today().isoformat()])[0])
+        till = date.fromisoformat(query.get("till", [(since + timedelta(days=400)).isoformat()])[0])
+
+        payload = self.state.recorded("market_bondization")
+        if payload is None:
+            # Дата события — четвёртая колонка во всех трёх блоках
+            payload = {block: {"columns": columns, "data": []} for block, columns in COLUMNS.items()}
+            for isin in self.state.isins:
+                for block, rows in synthetic_bondization(isin).items():
+                    payload[block]["data"].extend(
+                        row for row in rows if since <= date.fromisoformat(row[3]) <= till)
+
+        paged = {}
+        for block in COLUMNS:
+            data = payload.get(block, {}).get("data", [])
+            paged[block] = {"columns": payload.get(block, {}).get("columns", COLUMNS[block]),
+                            "data": data[start:start + limit]}
+            paged[f"{block}.cursor"] = {"columns": CURSOR_COLUMNS, "data": [[start, len(data), limit]]}
+        return _select(paged, query)
+
+    def _market_securities(self) -> dict:
+        payload = self.state.recorded("market_securities")
+        if payload is None:
+            payload = {
+                "securities": {"columns": ["SECID", "BOARDID", "ISIN", "FACEVALUE", "PREVPRICE", "ACCRUEDINT"],
+                               "data": [[isin, "TQCB", isin, 1000, 90 + _seed(isin) % 15, 5.5]
+                                        for isin in self.state.isins]},
+                "marketdata": {"columns": ["SECID", "BOARDID", "LAST"],
+                               "data": [[isin, "TQCB", 91 + _seed(isin) % 14] for isin in self.state.isins]},
+            }
+        return payload
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        method = self.path[len(TINKOFF_PREFIX):] if self.path.startswith(TINKOFF_PREFIX) else None
+
+        if method == "BondBy":
+            if not self._begin("BondBy"):
+                return
+            isin, class_code = body.get("id", ""), body.get("classCode")
+            recorded = self.state.recorded("BondBy", isin)
+            if recorded and recorded.get("instrument", {}).get("classCode") == class_code:
+                self._reply(200, recorded)
+            elif not recorded and class_code == "TQCB":
+                self._reply(200, {"instrument": {"figi": synthetic_figi(isin), "isin": isin, "ticker": isin,
+                                                 "classCode": class_code, "name": synthetic_name(isin)}})
+            else:
+                self._reply(400, {"code": 3, "message": "50002"})
+        elif method == "GetBondCoupons":
+            if not self._begin("GetBondCoupons"):
+                return
+            figi = body.get("instrumentId", "")
+            recorded = self.state.recorded("GetBondCoupons", figi)
+            if recorded is None:
+                first = date.today() + timedelta(days=_seed(figi) % 91)
+                recorded = {"events": [{
+                    "figi": figi,
+                    "couponDate": f"{first + timedelta(days=91 * k)}T00:00:00Z",
+                    "couponNumber": str(k + 1),
+                    "payOneBond": {"currency": "rub", "units": "24", "nano": 930000000},
+                } for k in range(4)]}
+            self._reply(200, recorded)
+        elif method == "Bonds":
+            if not self._begin("Bonds"):
+                return
+            self._reply(200, self.state.recorded("Bonds") or {"instruments": [
+                {"figi": synthetic_figi(isin), "isin": isin, "ticker": isin, "classCode": "TQCB",
+                 "name": synthetic_name(isin), "nominal": {"currency": "rub", "units": "1000", "nano": 0},
+                 "maturityDate": f"{date.today() + timedelta(days=365 * 3)}T00:00:00Z"}
+                for isin in sorted(self.state.catalogued)
+            ]})
+        else:
+            self._reply(404, {})
+
+
+class StubServer:
+    """ThreadingHTTPServer в фоновом потоке: задержки заглушки не блокируют event loop бота."""
+
+    def __init__(self, state: StubState, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+        self.state = state
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def record(directory: str, isins: list[str]) -> None:
+    """Сохраняет ответы настоящих MOEX ISS и T-Invest в раскладке каталога фикстур."""
+    import httpx
+
+    from config import MOEX_ISS_URL, TINKOFF_API_URL, T_TOKEN
+
+    def save(kind: str, key: str | None, payload) -> None:
+        path = os.path.join(directory, f"{kind}.json" if key is None else os.path.join(kind, f"{key}.json"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        print(f"💾 {path}")
+
+    instruments = TINKOFF_PREFIX[len("/rest"):]
+    headers = {"Authorization": f"Bearer {T_TOKEN}"}
+    with httpx.Client(timeout=30) as moex, httpx.Client(base_url=TINKOFF_API_URL, headers=headers,
+                                                         timeout=60) as tinkoff:
+        today = date.today()
+        save("market_bondization", None, moex.get(f"{MOEX_ISS_URL}{MARKET_BONDIZATION}", params={
+            "from": today.isoformat(), "till": (today + timedelta(days=400)).isoformat(),
+            "limit": 100, "iss.meta": "off", "iss.json": "compact"}).json())
+        bonds = tinkoff.post(f"{instruments}Bonds", json={"instrumentStatus": "INSTRUMENT_STATUS_ALL"}).json()
+        save("Bonds", None, bonds)
+        save("market_securities", None, moex.get(f"{MOEX_ISS_URL}{MARKET_SECURITIES}", params={
+            "marketprice_board": 1, "iss.meta": "off", "iss.json": "compact",
+            "iss.only": "securities,marketdata"}).json())
+        by_isin = {bond.get("isin"): bond for bond in bonds.get("instruments", [])}
+
+        for isin in isins:
+            for kind, path in (("bondization", f"{SECURITY_PREFIX}{isin}/bondization.json"),
+                               ("securities", f"{SECURITY_PREFIX}{isin}.json")):
+                save(kind, isin, moex.get(f"{MOEX_ISS_URL}{path}",
+                                          params={"iss.meta": "off", "iss.json": "compact"}).json())
+            bond = by_isin.get(isin)
+            if not bond:
+                continue
+            save("BondBy", isin, tinkoff.post(f"{instruments}BondBy", json={
+                "idType": "INSTRUMENT_ID_TYPE_TICKER", "classCode": bond["classCode"], "id": bond["ticker"]}).json())
+            save("GetBondCoupons", bond["figi"], tinkoff.post(f"{instruments}GetBondCoupons", json={
+                "instrumentId": bond["figi"], "from": f"{today}T00:00:00Z",
+                "to": f"{today + timedelta(days=365)}T00:00:00Z"}).json())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", help="каталог записанных ответов")
+    parser.add_argument("--instruments", type=int, default=200, help="синтетических ISIN в сводном bondization")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--record", metavar="DIR", help="записать фикстуры для ISIN из аргументов и выйти")
+    parser.add_argument("isins", nargs="*")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.isins)
+    else:
+        isins = args.isins or [f"RU000A{i:06d}" for i in range(args.instruments)]
+        server = StubServer(StubState(isins, args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate),
+                            args.host, args.port).start()
+        print(f"🧪 Заглушка MOEX/T-Invest: {server.url} (MOEX_ISS_URL={server.url}, TINKOFF_API_URL={server.url}/rest)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.stop()
@@ -1,25 +1,59 @@
 # bot.DB.py
 
-from sqlalchemy import create_engine, Column, Integer, String, BigInteger, ForeignKey, DateTime, Date, Float
+from sqlalchemy import create_engine, inspect, Column, Integer, String, BigInteger, ForeignKey, DateTime, Date, \
+    Float, Index, UniqueConstraint
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timedelta
+from config import DATABASE_PATH
+from database.db_setup import configure_sqlite
 
-# Создаём движок SQLite
-engine = create_engine("sqlite:///bot.db")
+# Создаём движок SQLite: синхронный — для init_db и миграций, асинхронный — для бота и фоновых задач
+engine = create_engine(f"sqlite:///{DATABASE_PATH}")
 Session = sessionmaker(bind=engine)
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{DATABASE_PATH}")
+configure_sqlite(engine)
+configure_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 Base = declarative_base()
 
+# Типы событий в графике выплат
+COUPON = "COUPON"
+AMORTIZATION = "AMORTIZATION"
+OFFER = "OFFER"
+
+# Как присылать напоминания: по каждому событию сразу или сводкой раз в день / неделю
+DIGEST_IMMEDIATE = "immediate"
+DIGEST_DAILY = "daily"
+DIGEST_WEEKLY = "weekly"
+
 
 def get_session():
     return Session()
 
 
+def get_async_session() -> AsyncSession:
+    """
+    Асинхронная сессия, не блокирующая event loop бота. Использовать как контекстный менеджер:
+    `async with get_async_session() as session:` — сессия закроется при любом выходе из блока.
+    """
+    return AsyncSessionLocal()
+
+
 # Функция для инициализации базы данных
 def init_db():
+    from database.migrations import run_migrations, stamp_schema_version
+
+    fresh = not inspect(engine).has_table("tracked_bonds")
     # Создаём все таблицы, если они ещё не существуют
     Base.metadata.create_all(engine)
 
+    if fresh:
+        stamp_schema_version(engine)
+    else:
+        run_migrations(engine)
+
 
 # Модель пользователя
 class User(Base):
@@ -28,26 +62,130 @@ class User(Base):
     id = Column(Integer, primary_key=True)  # primary_key для id
     tg_id = Column(BigInteger, unique=True)  # Уникальный tg_id
     full_name = Column(String)
+    digest_mode = Column(String, nullable=False, default=DIGEST_IMMEDIATE, server_default=DIGEST_IMMEDIATE)
 
     tracked_bonds = relationship(
         "TrackedBond", back_populates="user", cascade="all, delete-orphan"
     )
 
 
-# Модель отслеживаемой облигации
-class TrackedBond(Base):
-    __tablename__ = "tracked_bonds"
+# Инструмент (облигация): один на ISIN, общий для всех подписчиков
+class Instrument(Base):
+    __tablename__ = "instruments"
+    __table_args__ = (
+        Index("ix_instruments_last_updated", "last_updated"),
+    )
 
-    id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, ForeignKey("users.tg_id"))  # Ссылаемся на tg_id
-    isin = Column(String, nullable=False)
+    isin = Column(String, primary_key=True)
     name = Column(String)
     figi = Column(String, nullable=True)
     class_code = Column(String, nullable=True)
     ticker = Column(String, nullable=True)
-    added_at = Column(DateTime, default=datetime.utcnow)
     last_updated = Column(DateTime, default=datetime.utcnow)
-    next_coupon_date = Column(Date, nullable=True)
-    next_coupon_value = Column(Float, nullable=True)
+    events_updated_at = Column(DateTime, nullable=True)  # Когда график выплат последний раз сверяли с MOEX
+
+    subscriptions = relationship("TrackedBond", back_populates="instrument")
+    events = relationship(
+        "CouponEvent", back_populates="instrument", cascade="all, delete-orphan",
+        order_by="CouponEvent.event_date",
+    )
+
+
+# Событие графика выплат: купон, амортизация или оферта
+class CouponEvent(Base):
+    __tablename__ = "coupon_events"
+    __table_args__ = (
+        UniqueConstraint("isin", "event_type", "event_date", name="uq_coupon_events_isin_type_date"),
+        Index("ix_coupon_events_event_date", "event_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    isin = Column(String, ForeignKey("instruments.isin", ondelete="CASCADE"), nullable=False)
+    event_type = Column(String, nullable=False)  # COUPON / AMORTIZATION / OFFER
+    event_date = Column(Date, nullable=False)
+    value = Column(Float, nullable=True)  # Купон/амортизация на одну бумагу или цена оферты, руб.
+    source = Column(String)  # TINKOFF / MOEX
+
+    instrument = relationship("Instrument", back_populates="events")
+
+
+# Результат поиска FIGI по ISIN в T-Invest: найденное хранится бессрочно, ненайденное — до retry_after
+class FigiResolution(Base):
+    __tablename__ = "figi_resolutions"
+
+    isin = Column(String, primary_key=True)
+    figi = Column(String, nullable=True)  # None — не найден
+    class_code = Column(String, nullable=True)
+    name = Column(String, nullable=True)
+    resolved_at = Column(DateTime, default=datetime.utcnow)
+    retry_after = Column(DateTime, nullable=True)
+
+
+# Локальная копия справочника облигаций T-Invest (InstrumentsService/Bonds), обновляется раз в сутки
+class BondCatalogue(Base):
+    __tablename__ = "bond_catalogue"
+
+    isin = Column(String, primary_key=True)
+    figi = Column(String, nullable=False)
+    class_code = Column(String, nullable=True)
+    ticker = Column(String, nullable=True)
+    name = Column(String, nullable=True)
+    nominal = Column(Float, nullable=True)
+    maturity_date = Column(Date, nullable=True)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Исходящее сообщение Telegram: лежит в БД до отправки, чтобы не потеряться при перезапуске
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_not_before", "status", "not_before"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False, default=5)  # меньше — срочнее
+    dedupe_key = Column(String, nullable=True, unique=True)  # одно и то же напоминание не ставится дважды
+    status = Column(String, nullable=False, default="PENDING")  # PENDING / SENT / FAILED
+    attempts = Column(Integer, nullable=False, default=0)
+    not_before = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+# Аренда шарда обновления процессом worker.py: пока expires_at в будущем, бумаги шарда обновляет только owner
+class ShardLease(Base):
+    __tablename__ = "shard_leases"
+
+    shard = Column(Integer, primary_key=True)
+    owner = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    refreshed_at = Column(DateTime, nullable=True)  # Когда бумаги шарда последний раз обновлялись целиком
+
+
+# Живой процесс worker.py: по свежим heartbeat шарды делятся поровну между процессами
+class WorkerHeartbeat(Base):
+    __tablename__ = "worker_heartbeats"
+
+    worker_id = Column(String, primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+
+# Подписка пользователя на инструмент
+class TrackedBond(Base):
+    __tablename__ = "tracked_bonds"
+    __table_args__ = (
+        # Уникальный индекс заодно обслуживает поиск по user_id и по паре (user_id, isin)
+        Index("uq_tracked_bonds_user_isin", "user_id", "isin", unique=True),
+        Index("ix_tracked_bonds_isin", "isin"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey("users.tg_id"))  # Ссылаемся на tg_id
+    isin = Column(String, ForeignKey("instruments.isin"), nullable=False)
+    added_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="tracked_bonds")
+    instrument = relationship("Instrument", back_populates="subscriptions")
@@ -0,0 +1,141 @@
+# bot/bond_info.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple
+
+from bot.DB import COUPON, AMORTIZATION, OFFER
+from config import BOND_INFO_CACHE_SIZE, BOND_INFO_TTL_SECONDS
+from core.bonds import BondEvent
+from core.metrics import Gauge, BOND_INFO_CACHE
+from database.events import fetch_bond_events
+
+logger = logging.getLogger(__name__)
+
+
+class CachedInfo(NamedTuple):
+    events: list[BondEvent]
+    text: str
+    rendered_on: date  # текст зависит от даты: «ближайший купон» меняется в полночь
+    fetched_at: float  # time.monotonic() загрузки графика
+
+
+def render_bond_info(isin: str, events: list[BondEvent], today: date) -> str:
+    """Текст ответа по событиям бумаги (события идут в порядке дат)."""
+    reply_text = f"📊 Информация по облигации {isin}:\n\n"
+
+    coupons = [event for event in events if event.event_type == COUPON]
+    amortizations = [event for event in events if event.event_type == AMORTIZATION]
+    offers = [event for event in events if event.event_type == OFFER]
+
+    # Купоны
+    if coupons:
+        nearest_coupon = next((event for event in coupons if event.event_date >= today), None)
+        if nearest_coupon:
+            reply_text += "📝 Купон:\n"
+            reply_text += (f"- Дата: {nearest_coupon.event_date:%d.%m.%Y}; "
+                           f"Размер купона: {nearest_coupon.amount} руб.\n")
+
+    # Амортизации
+    if amortizations:
+        # Самая близкая будущая амортизация
+        nearest_amortization = next((event for event in amortizations if event.event_date > today), None)
+        if nearest_amortization:
+            reply_text += "\n📝 Амортизация:\n"
+            reply_text += (f"- Дата: {nearest_amortization.event_date:%d.%m.%Y}; "
+                           f"Сумма амортизации: {nearest_amortization.amount} руб.\n")
+        else:
+            reply_text += "\n📌 Амортизация отсутствует или прошла.\n"
+
+    # Оферты (сообщение об отсутствии оферт)
+    if offers:
+        reply_text += "\n📝 Оферты:\n"
+        for event in offers:
+            if event.amount is not None:
+                reply_text += f"- Дата: {event.event_date:%d.%m.%Y}; Цена оферты: {event.amount} руб.\n"
+    else:
+        reply_text += "\n📌 Оферты отсутствуют.\n"
+
+    # Если нет никаких событий
+    if not events:
+        reply_text += "\nНет событий для этой облигации."
+    return reply_text
+
+
+class BondInfoCache:
+    """
+    Готовые ответы кнопки /info по ISIN (LRU в памяти) по схеме stale-while-revalidate:
+    устаревшая запись отдаётся сразу, а график перечитывается в фоне. Одновременные
+    запросы одного ISIN ждут одну общую загрузку.
+    """
+
+    def __init__(self, capacity: int = BOND_INFO_CACHE_SIZE, ttl: float = BOND_INFO_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CachedInfo] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, isin: str) -> None:
+        """График бумаги изменился: следующий запрос перечитает его (старый текст ещё можно отдать)."""
+        entry = self._entries.get(isin)
+        if entry:
+            self._entries[isin] = entry._replace(fetched_at=float("-inf"))
+
+    async def _load(self, isin: str) -> CachedInfo:
+        events = await fetch_bond_events(isin)
+        today = date.today()
+        entry = CachedInfo(events, render_bond_info(isin, events, today), today, time.monotonic())
+        # Пустой график чаще означает ошибку MOEX, чем бумагу без событий: не затираем им прежний
+        current = self._entries.get(isin)
+        if current and not events:
+            return current
+        self._entries[isin] = entry
+        self._entries.move_to_end(isin)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _refresh(self, isin: str) -> asyncio.Task:
+        task = self._inflight.get(isin)
+        if task is None:
+            task = asyncio.create_task(self._load(isin), name=f"bond-info-{isin}")
+            self._inflight[isin] = task
+            task.add_done_callback(lambda _: self._inflight.pop(isin, None))
+            task.add_done_callback(_log_failure)
+        return task
+
+    async def get(self, isin: str) -> str:
+        entry = self._entries.get(isin)
+        if entry is None:
+            BOND_INFO_CACHE.inc(result="miss")
+            # shield: отмена одного ожидающего не должна отменять загрузку для остальных
+            entry = await asyncio.shield(self._refresh(isin))
+        else:
+            self._entries.move_to_end(isin)
+            if time.monotonic() - entry.fetched_at > self.ttl:
+                BOND_INFO_CACHE.inc(result="stale")
+                self._refresh(isin)
+            else:
+                BOND_INFO_CACHE.inc(result="hit")
+
+        today = date.today()
+        if entry.rendered_on != today:
+            rendered = entry._replace(text=render_bond_info(isin, entry.events, today), rendered_on=today)
+            if self._entries.get(isin) is entry:
+                self._entries[isin] = rendered
+            entry = rendered
+        return entry.text
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        logger.warning("⚠️ Не удалось загрузить график для /info: %s", task.exception())
+
+
+bond_info_cache = BondInfoCache()
+Gauge("bondwatch_bond_info_cached", "Бумаги в кэше ответов /info", lambda: len(bond_info_cache))
@@ -0,0 +1,85 @@
+# bot/digests.py
+import logging
+from datetime import date, timedelta
+
+from bot.DB import get_async_session, COUPON, AMORTIZATION, OFFER, DIGEST_DAILY, DIGEST_WEEKLY
+from bot.outbox import outbox, PRIORITY_LOW
+from config import REMINDER_DAYS_BEFORE
+from database.crud import get_events_between
+
+logger = logging.getLogger(__name__)
+
+EVENT_LABELS = {
+    COUPON: ("КУПОН", "Сумма купона"),
+    AMORTIZATION: ("АМОРТИЗАЦИЯ", "Сумма амортизации"),
+    OFFER: ("ОФЕРТА", "Цена оферты"),
+}
+
+# Сколько дней событий попадает в одну сводку
+DIGEST_DAYS = {
+    DIGEST_DAILY: 1,
+    DIGEST_WEEKLY: 7,
+}
+
+
+def event_line(isin: str, event_type: str, event_date: date, value: float | None) -> str:
+    label, amount_label = EVENT_LABELS.get(event_type, (event_type, "Сумма"))
+    line = f"• {event_date:%d.%m.%Y} — {isin}: {label}"
+    if value is not None:
+        line += f" ({amount_label.lower()}: {value:.2f} руб.)"
+    return line
+
+
+def reminder_text(events: list[tuple]) -> str:
+    """Одно сообщение на все сработавшие напоминания пользователя. events: (isin, event_type, event_date, value)."""
+    if len(events) == 1:
+        isin, event_type, event_date, value = events[0]
+        label, amount_label = EVENT_LABELS.get(event_type, (event_type, "Сумма"))
+        text = f"🔔 Напоминание: через {REMINDER_DAYS_BEFORE} дня ({event_date}) у бумаги {isin} — событие: {label}."
+        if value is not None:
+            text += f"\n{amount_label}: {value:.2f} руб."
+        return text
+
+    return "🔔 Напоминание о ближайших событиях по твоим бумагам:\n\n" + "\n".join(event_line(*e) for e in events)
+
+
+def group_by_user(rows: list[tuple]) -> dict[int, list[tuple]]:
+    """(user_id, isin, event_type, event_date, value) -> {user_id: [(isin, event_type, event_date, value), ...]}"""
+    grouped: dict[int, list[tuple]] = {}
+    for user_id, *event in rows:
+        grouped.setdefault(user_id, []).append(tuple(event))
+    return grouped
+
+
+def digest_window(mode: str, today: date) -> tuple[date, date]:
+    """События, о которых сводка предупреждает, как и обычное напоминание, за REMINDER_DAYS_BEFORE дней."""
+    start = today + timedelta(days=REMINDER_DAYS_BEFORE)
+    return start, start + timedelta(days=DIGEST_DAYS[mode] - 1)
+
+
+def digest_text(start: date, end: date, events: list[tuple]) -> str:
+    period = f"{start:%d.%m.%Y}" if start == end else f"{start:%d.%m.%Y}–{end:%d.%m.%Y}"
+    return f"🗓 Сводка событий по твоим бумагам на {period}:\n\n" + "\n".join(event_line(*e) for e in events)
+
+
+async def send_digests(mode: str, today: date | None = None) -> int:
+    """
+    Ставит в очередь по одному сообщению на каждого пользователя с настройкой `mode`, у которого есть события
+    в окне сводки. Одним запросом к БД; повторный запуск за тот же период ничего не дублирует.
+    """
+    start, end = digest_window(mode, today or date.today())
+    async with get_async_session() as session:
+        rows = await get_events_between(session, start, end, digest_mode=mode)
+
+    messages = [
+        {
+            "chat_id": user_id,
+            "text": digest_text(start, end, events),
+            "priority": PRIORITY_LOW,
+            "dedupe_key": f"digest:{mode}:{user_id}:{start}",
+        }
+        for user_id, events in group_by_user(rows).items()
+    ]
+    added = await outbox.enqueue_many(messages) if messages else 0
+    logger.info("🗓 Сводки (%s) на %s..%s: %s сообщений по %s событиям", mode, start, end, added, len(rows))
+    return added
@@ -0,0 +1,131 @@
+# bot/enrichment.py
+import asyncio
+import logging
+from datetime import date
+
+from telegram import Message
+from telegram.error import TelegramError
+
+from bot.DB import get_async_session, Instrument
+from bot.bond_info import bond_info_cache
+from bot.reminders import reminder_scheduler
+from database.bond_update import update_coupon_schedule
+from database.crud import has_coupon_events, get_next_events
+from database.events import fetch_bond_events
+from database.figi_lookup import get_figi_by_ticker_and_classcode
+from database.names import instrument_names
+
+logger = logging.getLogger(__name__)
+
+
+async def _skip():
+    return None
+
+
+async def added_text(isin: str) -> str:
+    """Итоговое сообщение /add: название и ближайший купон из БД."""
+    name = (await instrument_names.get_many([isin]))[isin]
+    async with get_async_session() as session:
+        next_coupon = (await get_next_events(session, [isin], date.today())).get(isin)
+
+    text = f"📌 Бумага {name} ({isin}) добавлена!" if name else f"📌 Бумага {isin} добавлена!"
+    if next_coupon:
+        text += f"\n👉 Следующий купон: {next_coupon.event_date:%d.%m.%Y}"
+        if next_coupon.value is not None:
+            text += f" на сумму {next_coupon.value} руб."
+    else:
+        text += "\n📭 График выплат пока не найден — попробую загрузить его при ежедневном обновлении."
+    return text
+
+
+class BondEnrichment:
+    """
+    Догрузка данных о только что добавленной бумаге после ответа пользователю: название, FIGI
+    и график выплат MOEX запрашиваются параллельно, купоны T-Invest — только если MOEX их не знает.
+    Одновременные /add одной бумаги разными пользователями ждут одну общую догрузку.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._followups: set[asyncio.Task] = set()
+        self.stats = {"enriched": 0, "joined": 0, "failed": 0}
+
+    async def _enrich(self, isin: str, reload_schedule: bool = False) -> None:
+        async with get_async_session() as session:
+            instrument = await session.get(Instrument, isin)
+            if not instrument:
+                return
+            need_name = not instrument.name
+            need_figi = not instrument.figi
+            need_schedule = (reload_schedule or instrument.last_updated is None
+                             or not await has_coupon_events(session, isin))
+
+        _, figi, moex_schedule = await asyncio.gather(
+            instrument_names.backfill([isin]) if need_name else _skip(),
+            get_figi_by_ticker_and_classcode(isin) if need_figi else _skip(),
+            fetch_bond_events(isin, use_cache=False) if need_schedule else _skip(),
+            return_exceptions=True,
+        )
+        if isinstance(figi, Exception):
+            logger.warning("⚠️ Не удалось получить FIGI для %s: %s", isin, figi)
+        if isinstance(moex_schedule, Exception):
+            logger.warning("⚠️ Не удалось получить график MOEX для %s: %s", isin, moex_schedule)
+            moex_schedule = []
+
+        if need_schedule:
+            # FIGI к этому моменту уже записан — нужен для запасных купонов T-Invest
+            async with get_async_session() as session:
+                instrument = await session.get(Instrument, isin)
+                await update_coupon_schedule(instrument, session, moex_schedule)
+            bond_info_cache.invalidate(isin)
+        self.stats["enriched"] += 1
+
+    def enrich(self, isin: str, reload_schedule: bool = False) -> asyncio.Task:
+        """
+        Запускает догрузку ISIN или возвращает уже идущую.
+        :param reload_schedule: перечитать график, даже если в БД он есть (например, обрезан окном массовой загрузки)
+        """
+        task = self._inflight.get(isin)
+        if task is not None:
+            self.stats["joined"] += 1
+            return task
+        task = asyncio.create_task(self._enrich(isin, reload_schedule), name=f"enrich-{isin}")
+        self._inflight[isin] = task
+        task.add_done_callback(lambda _: self._inflight.pop(isin, None))
+        return task
+
+    async def _follow_up(self, task: asyncio.Task, user_id: int, isin: str, message: Message | None) -> None:
+        try:
+            await asyncio.shield(task)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error("❌ Не удалось догрузить данные о бумаге %s: %s", isin, e)
+
+        await reminder_scheduler.reschedule_subscription(user_id, isin)
+        if message is None:
+            return
+        try:
+            await message.edit_text(await added_text(isin))
+        except TelegramError as e:
+            logger.warning("⚠️ Не удалось обновить сообщение о добавлении %s: %s", isin, e)
+
+    def submit(self, user_id: int, isin: str, message: Message | None = None) -> None:
+        """Догружает бумагу в фоне, затем ставит напоминания и дописывает подробности в `message`."""
+        follow_up = asyncio.create_task(self._follow_up(self.enrich(isin), user_id, isin, message),
+                                        name=f"enrich-reply-{isin}")
+        self._followups.add(follow_up)
+        follow_up.add_done_callback(self._followups.discard)
+
+    async def join(self) -> None:
+        """Ждёт завершения всех начатых догрузок (для бенчмарков и остановки)."""
+        while self._followups:
+            await asyncio.gather(*self._followups, return_exceptions=True)
+
+    async def stop(self) -> None:
+        for task in [*self._inflight.values(), *self._followups]:
+            task.cancel()
+        await asyncio.gather(*self._inflight.values(), *self._followups, return_exceptions=True)
+        logger.info("🧩 Догрузка данных о бумагах остановлена: %s", self.stats)
+
+
+bond_enrichment = BondEnrichment()
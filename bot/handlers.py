@@ -1,15 +1,21 @@
 # bot.handlers.py
 from telegram import Update
 from telegram.ext import CommandHandler, Application, ContextTypes, filters, MessageHandler, ConversationHandler
-from bot.DB import get_session, User
+from bot.DB import get_async_session, User
 import re
 from bot.DB import TrackedBond
-from database.bond_update import get_next_coupon
-from database.events import fetch_bond_events
-from database.figi_lookup import get_figi_by_ticker_and_classcode
+from bot.bond_info import bond_info_cache
+from bot.enrichment import bond_enrichment
+from bot.portfolio import load_portfolio, portfolio_text
+from bot.keyboards import digest_keyboard, DIGEST_LABELS, DIGEST_CALLBACK_PREFIX
+from bot.reminders import reminder_scheduler
+from database.crud import get_or_create_instrument, get_next_events
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
-from database.moex_name_lookup import get_bond_name_from_moex
-from database.bond_utils import update_bond_coupon_info
+from database.names import instrument_names
+from database.catalogue import lookup_bond
+from core.metrics import HANDLER_SECONDS
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler
 from datetime import datetime
@@ -18,6 +24,8 @@ import logging
 import io
 import sys
 
+logger = logging.getLogger(__name__)
+
 sys.stdout = io.TextIOWrapper(sys.stdout.detach(), encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.detach(), encoding='utf-8')
 
@@ -26,18 +34,27 @@ AWAITING_ISIN_TO_REMOVE = 1
 AWAITING_ISIN_TO_ADD = 2
 
 
+async def _get_user_with_bonds(session, tg_id: int) -> User | None:
+    result = await session.execute(
+        select(User)
+        .options(selectinload(User.tracked_bonds))
+        .where(User.tg_id == tg_id)
+    )
+    return result.scalars().first()
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    session = get_session()
 
-    # Проверка: есть ли пользователь в БД
-    db_user = session.query(User).filter_by(tg_id=user.id).first()
-    if not db_user:
-        # Если нет — добавляем
-        new_user = User(tg_id=user.id, full_name=user.full_name)
-        session.add(new_user)
-        session.commit()
-        context.bot_data.get("logger", print)(f"✅ Новый пользователь: {user.full_name} ({user.id})")
+    async with get_async_session() as session:
+        # Проверка: есть ли пользователь в БД
+        db_user = (await session.execute(select(User).where(User.tg_id == user.id))).scalars().first()
+        if not db_user:
+            # Если нет — добавляем
+            new_user = User(tg_id=user.id, full_name=user.full_name)
+            session.add(new_user)
+            await session.commit()
+            context.bot_data.get("logger", print)(f"✅ Новый пользователь: {user.full_name} ({user.id})")
 
     await update.message.reply_text(
         f"👋 Привет, {user.first_name}!\n\n"
@@ -49,45 +66,34 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def list_tracked_bonds(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = get_session()
-    user = session.query(User) \
-        .options(selectinload(User.tracked_bonds)) \
-        .filter_by(tg_id=update.effective_user.id) \
-        .first()
-
-    if not user or not user.tracked_bonds:
-        await update.message.reply_text("❗️Ты пока не отслеживаешь ни одной облигации.")
-        session.close()
-        return
+    async with get_async_session() as session:
+        user = await _get_user_with_bonds(session, update.effective_user.id)
+
+        if not user or not user.tracked_bonds:
+            await update.message.reply_text("❗️Ты пока не отслеживаешь ни одной облигации.")
+            return
+
+        text = "📋 Вот список твоих отслеживаемых бумаг:\n\n"
+        logger.debug("Found user %s with %s tracked bonds.", user.id, len(user.tracked_bonds))
+        isins = [bond.isin for bond in user.tracked_bonds]
+        next_coupons = await get_next_events(session, isins, datetime.now().date())
+        # Названия — из кэша и БД; чего нет, догрузит фоновый воркер, а пока показываем ISIN
+        names = await instrument_names.get_many(isins)
+        for bond in user.tracked_bonds:
+            logger.debug("Processing bond: %s, Name: %s", bond.isin, names[bond.isin])
+            added = bond.added_at.strftime("%Y-%m-%d")
+            display_name = names[bond.isin] or bond.isin
+
+            # читаем купон из графика выплат
+            next_coupon_text = ""
+            next_coupon = next_coupons.get(bond.isin)
+            if next_coupon and next_coupon.value:
+                next_coupon_text = (
+                    f"\n👉 Следующий купон: {next_coupon.event_date} на сумму {next_coupon.value} руб."
+                )
+
+            text += f"• {display_name} ({bond.isin}, добавлена {added})\n"
 
-    text = "📋 Вот список твоих отслеживаемых бумаг:\n\n"
-    logging.info(f"Found user {user.id} with {len(user.tracked_bonds)} tracked bonds.")
-    for bond in user.tracked_bonds:
-        logging.info(f"Processing bond: {bond.isin}, Name: {bond.name}")
-        added = bond.added_at.strftime("%Y-%m-%d")
-
-        display_name = bond.name
-        if not display_name:
-            moex_name = await get_bond_name_from_moex(bond.isin)
-            if moex_name:
-                display_name = moex_name
-                bond.name = moex_name
-                session.commit()
-                logging.info(f"Bond name updated to: {display_name}")
-
-        if not display_name:
-            display_name = bond.isin
-
-        # читаем купон из модели
-        next_coupon_text = ""
-        if bond.next_coupon_date and bond.next_coupon_value:
-            next_coupon_text = (
-                f"\n👉 Следующий купон: {bond.next_coupon_date} на сумму {bond.next_coupon_value} руб."
-            )
-
-        text += f"• {display_name} ({bond.isin}, добавлена {added})\n"
-
-    session.close()
     await update.message.reply_text(text)
 
 
@@ -99,54 +105,43 @@ async def process_add_isin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Это не похоже на ISIN. Попробуй ещё раз.")
         return AWAITING_ISIN_TO_ADD
 
-    session = get_session()
     user_id = user.id
 
-    count = session.query(TrackedBond).filter_by(user_id=user_id).count()
-    if count >= 3:
-        await update.message.reply_text("❌ Ты уже отслеживаешь 3 бумаги. Удали одну, чтобы добавить новую.")
-        return ConversationHandler.END
-
-    exists = session.query(TrackedBond).filter_by(user_id=user_id, isin=text).first()
-    if exists:
-        await update.message.reply_text("✅ Ты уже отслеживаешь эту бумагу.")
-        return ConversationHandler.END
-
-    moex_name = await get_bond_name_from_moex(text)
-    bond = TrackedBond(user_id=user_id, isin=text, name=moex_name)
-    session.add(bond)
-    session.commit()
-
-    try:
-        await get_figi_by_ticker_and_classcode(text)
-    except Exception as e:
-        context.bot_data.get("logger", print)(f"⚠️ Не удалось получить FIGI для {text}: {e}")
-
-    bond = session.query(TrackedBond).filter_by(user_id=user_id, isin=text).first()
-
-    if not bond.name and moex_name:
-        bond.name = moex_name
-        session.commit()
-
-    logger = context.bot_data.get("logger", print)
-
-    # Пробуем сначала get_next_coupon
-    coupon_set = False
-    try:
-        next_coupon = await get_next_coupon(bond.isin, bond.figi, bond, session)
-        if next_coupon:
-            bond.next_coupon_date = next_coupon['date']
-            bond.next_coupon_value = next_coupon['value']
-            session.commit()
-            coupon_set = True
-    except Exception as e:
-        logger(f"⚠️ Не удалось получить следующий купон для {text}: {e}")
-
-    # Если купон не установлен — вызываем fallback
-    if not coupon_set:
-        await update_bond_coupon_info(bond, session, logger)
-
-    await update.message.reply_text(f"📌 Бумага {text} добавлена!")
+    async with get_async_session() as session:
+        count = await session.scalar(
+            select(func.count()).select_from(TrackedBond).where(TrackedBond.user_id == user_id)
+        )
+        if count >= 3:
+            await update.message.reply_text("❌ Ты уже отслеживаешь 3 бумаги. Удали одну, чтобы добавить новую.")
+            return ConversationHandler.END
+
+        exists = await session.scalar(
+            select(TrackedBond.id).where(TrackedBond.user_id == user_id, TrackedBond.isin == text)
+        )
+        if exists:
+            await update.message.reply_text("✅ Ты уже отслеживаешь эту бумагу.")
+            return ConversationHandler.END
+
+        # Инструмент общий для всех подписчиков: если его уже кто-то отслеживает, сеть не нужна
+        instrument = await get_or_create_instrument(session, text)
+        if not instrument.name:
+            catalogue_entry = lookup_bond(text)
+            instrument.name = catalogue_entry and catalogue_entry.name
+        session.add(TrackedBond(user_id=user_id, isin=text))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Параллельный /add той же бумаги успел раньше — уникальный индекс (user_id, isin)
+            await session.rollback()
+            await update.message.reply_text("✅ Ты уже отслеживаешь эту бумагу.")
+            return ConversationHandler.END
+
+        if instrument.name:
+            instrument_names.remember(text, instrument.name)
+
+    # Отвечаем сразу; название, FIGI и график догрузятся в фоне и допишутся в это же сообщение
+    message = await update.message.reply_text(f"📌 Бумага {text} добавлена! ⏳ Загружаю название и график выплат…")
+    bond_enrichment.submit(user_id, text, message)
     return ConversationHandler.END
 
 
@@ -161,137 +156,147 @@ async def remove_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def process_remove_isin(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = get_session()
     isin = update.message.text.strip().upper()
-    user = session.query(User).filter_by(tg_id=update.effective_user.id).first()
 
-    if not user:
-        await update.message.reply_text("Ты пока не зарегистрирован. Напиши /start.")
-        return ConversationHandler.END
+    async with get_async_session() as session:
+        user = await session.scalar(select(User).where(User.tg_id == update.effective_user.id))
+
+        if not user:
+            await update.message.reply_text("Ты пока не зарегистрирован. Напиши /start.")
+            return ConversationHandler.END
 
-    subscription = session.query(TrackedBond).filter_by(user_id=user.tg_id, isin=isin).first()
+        subscription = await session.scalar(
+            select(TrackedBond).where(TrackedBond.user_id == user.tg_id, TrackedBond.isin == isin)
+        )
+
+        if subscription:
+            await session.delete(subscription)
+            await session.commit()
 
     if not subscription:
         await update.message.reply_text(f"❌ Ты не отслеживаешь бумагу с ISIN {isin}.")
     else:
-        session.delete(subscription)
-        session.commit()
+        await reminder_scheduler.reschedule_subscription(user.tg_id, isin)
         await update.message.reply_text(f"✅ Бумага {isin} успешно удалена из отслеживания.")
 
     return ConversationHandler.END
 
 
 async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = get_session()
-    user = session.query(User) \
-        .options(selectinload(User.tracked_bonds)) \
-        .filter_by(tg_id=update.effective_user.id) \
-        .first()
+    async with get_async_session() as session:
+        user = await _get_user_with_bonds(session, update.effective_user.id)
 
-    if not user or not user.tracked_bonds:
-        await update.message.reply_text("❗️ Ты пока не отслеживаешь ни одной облигации.")
-        session.close()
-        return
+        if not user or not user.tracked_bonds:
+            await update.message.reply_text("❗️ Ты пока не отслеживаешь ни одной облигации.")
+            return
+
+        isins = [bond.isin for bond in user.tracked_bonds]
+        next_coupons = await get_next_events(session, isins, datetime.now().date())
 
+    names = await instrument_names.get_many(isins)
     text = "📊 Ближайшие события по твоим облигациям:\n\n"
     for bond in user.tracked_bonds:
         next_event = None
-        if bond.next_coupon_date:
-            next_event = f"{bond.next_coupon_date} — выплата купона {bond.next_coupon_value:.2f} руб."
+        next_coupon = next_coupons.get(bond.isin)
+        if next_coupon:
+            value = f"{next_coupon.value:.2f}" if next_coupon.value is not None else "—"
+            next_event = f"{next_coupon.event_date} — выплата купона {value} руб."
 
+        display_name = names[bond.isin] or bond.isin
         if next_event:
-            text += f"• {bond.name or bond.isin}:\n  🏷️ {next_event}\n"
+            text += f"• {display_name}:\n  🏷️ {next_event}\n"
         else:
-            text += f"• {bond.name or bond.isin}:\n  ✨ Нет ближайших событий\n"
+            text += f"• {display_name}:\n  ✨ Нет ближайших событий\n"
 
-    session.close()
     await update.message.reply_text(text)
 
 
 async def info_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = get_session()
-    user = session.query(User) \
-        .options(selectinload(User.tracked_bonds)) \
-        .filter_by(tg_id=update.effective_user.id) \
-        .first()
+    async with get_async_session() as session:
+        user = await _get_user_with_bonds(session, update.effective_user.id)
 
     if not user or not user.tracked_bonds:
         await update.message.reply_text("❗️ Ты пока не отслеживаешь ни одной облигации.")
-        session.close()
         return
 
-    keyboard_buttons = [[InlineKeyboardButton(bond.name or bond.isin, callback_data=bond.isin)] for bond in
-                        user.tracked_bonds]
+    names = await instrument_names.get_many([bond.isin for bond in user.tracked_bonds])
+    keyboard_buttons = [[InlineKeyboardButton(names[bond.isin] or bond.isin, callback_data=bond.isin)]
+                        for bond in user.tracked_bonds]
     reply_markup = InlineKeyboardMarkup(keyboard_buttons)
 
     await update.message.reply_text("Выберите облигацию:", reply_markup=reply_markup)
-    session.close()
 
 
 async def bond_info_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    isin = query.data
-    events = await fetch_bond_events(isin)
-
-    reply_text = f"📊 Информация по облигации {isin}:\n\n"
-
-    current_date = datetime.now().date()  # Текущая дата
-
-    # Купоны
-    if events.get("coupons"):
-        # Ближайший купон
-        nearest_coupon = min((event for event in events["coupons"] if event.get('coupondate')),
-                             key=lambda x: x.get('coupondate'),
-                             default=None)
-        if nearest_coupon:
-            reply_text += "📝 Купон:\n"
-            reply_text += f"- Дата: {nearest_coupon.get('coupondate')}; Размер купона: {nearest_coupon.get('value')} руб.\n"
-
-    # Амортизации
-    if events.get("amortizations"):
-        # Самая близкая будущая амортизация
-        nearest_amortization = min((event for event in events["amortizations"]
-                                    if datetime.strptime(event.get('amortdate'), '%d.%m.%Y').date() > current_date),
-                                  key=lambda x: datetime.strptime(x.get('amortdate'), '%d.%m.%Y').date(),
-                                  default=None)
-        if nearest_amortization:
-            reply_text += "\n📝 Амортизация:\n"
-            reply_text += f"- Дата: {nearest_amortization.get('amortdate')}; Сумма амортизации: {nearest_amortization.get('value')} руб.\n"
-        else:
-            reply_text += "\n📌 Амортизация отсутствует или прошла.\n"
-
-    # Оферты (сообщение об отсутствии оферт)
-    if events.get("offers") and events["offers"]:
-        reply_text += "\n📝 Оферты:\n"
-        for event in events["offers"]:
-            offer_date = event.get('offerdate')
-            price = event.get('price')
-            if price is not None:
-                reply_text += f"- Дата: {offer_date}; Цена оферты: {price} руб.\n"
-    else:
-        reply_text += "\n📌 Оферты отсутствуют.\n"
+    await query.edit_message_text(await bond_info_cache.get(query.data))
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async with get_async_session() as session:
+        user = await session.scalar(select(User).where(User.tg_id == update.effective_user.id))
+
+    if not user:
+        await update.message.reply_text("Ты пока не зарегистрирован. Напиши /start.")
+        return
+
+    await update.message.reply_text(
+        "🔔 Как присылать напоминания о купонах, амортизациях и офертах?",
+        reply_markup=digest_keyboard(user.digest_mode),
+    )
+
+
+async def digest_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    mode = query.data.removeprefix(DIGEST_CALLBACK_PREFIX)
+    if mode not in DIGEST_LABELS:
+        return
+
+    async with get_async_session() as session:
+        user = await session.scalar(select(User).where(User.tg_id == update.effective_user.id))
+        if not user:
+            await query.edit_message_text("Ты пока не зарегистрирован. Напиши /start.")
+            return
+        user.digest_mode = mode
+        await session.commit()
+
+    await reminder_scheduler.reschedule_user(user.tg_id)
+    await query.edit_message_text(f"✅ Режим уведомлений: {DIGEST_LABELS[mode]}")
+
+
+async def portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    portfolio = await load_portfolio(update.effective_user.id)
+    if not portfolio:
+        await update.message.reply_text("❗️ Ты пока не отслеживаешь ни одной облигации.")
+        return
+
+    await update.message.reply_text(portfolio_text(portfolio))
 
-    # Если нет никаких событий
-    if not any([events.get("coupons"), events.get("amortizations"), events.get("offers")]):
-        reply_text += "\nНет событий для этой облигации."
 
-    await query.edit_message_text(reply_text)
+def _timed(callback):
+    """Время обработки каждого обработчика попадает в метрику bondwatch_handler_seconds."""
+    return HANDLER_SECONDS.time(handler=callback.__name__)(callback)
 
 
 def register_handlers(app: Application):
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("list", list_tracked_bonds))
-    app.add_handler(CommandHandler("events", show_events))
-    app.add_handler(CallbackQueryHandler(bond_info_callback))  # Добавляем обработчик callback-запросов
-    app.add_handler(CommandHandler("info", info_command))
+    app.add_handler(CommandHandler("start", _timed(start)))
+    app.add_handler(CommandHandler("list", _timed(list_tracked_bonds)))
+    app.add_handler(CommandHandler("events", _timed(show_events)))
+    app.add_handler(CommandHandler("digest", _timed(digest_command)))
+    app.add_handler(CallbackQueryHandler(_timed(digest_callback), pattern=f"^{DIGEST_CALLBACK_PREFIX}"))
+    app.add_handler(CallbackQueryHandler(_timed(bond_info_callback)))  # Добавляем обработчик callback-запросов
+    app.add_handler(CommandHandler("info", _timed(info_command)))
+    app.add_handler(CommandHandler("portfolio", _timed(portfolio_command)))
 
     # /remove диалог
     remove_conv = ConversationHandler(
-        entry_points=[CommandHandler("remove", remove_command)],
+        entry_points=[CommandHandler("remove", _timed(remove_command))],
         states={
-            AWAITING_ISIN_TO_REMOVE: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_remove_isin)],
+            AWAITING_ISIN_TO_REMOVE: [MessageHandler(filters.TEXT & ~filters.COMMAND, _timed(process_remove_isin))],
         },
         fallbacks=[],
     )
@@ -299,9 +304,9 @@ def register_handlers(app: Application):
 
     # /add диалог
     add_conv = ConversationHandler(
-        entry_points=[CommandHandler("add", add_command)],
+        entry_points=[CommandHandler("add", _timed(add_command))],
         states={
-            AWAITING_ISIN_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_isin)],
+            AWAITING_ISIN_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, _timed(process_add_isin))],
         },
         fallbacks=[],
     )
@@ -0,0 +1,21 @@
+# bot/keyboards.py
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.DB import DIGEST_IMMEDIATE, DIGEST_DAILY, DIGEST_WEEKLY
+
+DIGEST_CALLBACK_PREFIX = "digest:"
+
+DIGEST_LABELS = {
+    DIGEST_IMMEDIATE: "⚡ По каждому событию",
+    DIGEST_DAILY: "📅 Сводка раз в день",
+    DIGEST_WEEKLY: "🗓 Сводка раз в неделю",
+}
+
+
+def digest_keyboard(current_mode: str) -> InlineKeyboardMarkup:
+    """Выбор режима уведомлений; текущий отмечен галочкой."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(("✅ " if mode == current_mode else "") + label,
+                              callback_data=f"{DIGEST_CALLBACK_PREFIX}{mode}")]
+        for mode, label in DIGEST_LABELS.items()
+    ])
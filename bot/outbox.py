@@ -0,0 +1,340 @@
+# bot/outbox.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from telegram import Bot
+from telegram.error import RetryAfter, Forbidden, BadRequest
+
+from bot.DB import get_async_session, OutboxMessage
+from config import OUTBOX_RPS, OUTBOX_CHAT_INTERVAL, OUTBOX_CONCURRENCY, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETENTION_DAYS
+from core.metrics import Gauge, TELEGRAM_SENDS, TELEGRAM_DELIVERY_SECONDS
+from core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PENDING = "PENDING"
+SENT = "SENT"
+FAILED = "FAILED"
+
+# Приоритеты: меньше — срочнее
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 300
+
+# По скольким последним отправкам считать задержку и пропускную способность
+METRICS_WINDOW = 1000
+
+
+class _Pending(NamedTuple):
+    chat_id: int
+    text: str
+    priority: int
+    attempts: int
+    created_at: datetime
+
+
+def _retry_after_seconds(retry_after) -> float:
+    # Старые версии PTB отдают int, новые — timedelta
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений Telegram.
+
+    Каждое сообщение сначала записывается в таблицу outbox, поэтому после перезапуска неотправленное
+    дочитывается из БД. Отправка идёт по приоритету, не быстрее OUTBOX_RPS в целом и не чаще
+    раза в OUTBOX_CHAT_INTERVAL секунд в один чат. RetryAfter приостанавливает всю очередь на указанное
+    Telegram время, сетевые ошибки повторяются с экспоненциальной паузой, а заблокированные чаты
+    помечаются FAILED сразу.
+
+    Если напоминания планируют отдельные процессы worker.py, они только записывают сообщения в таблицу,
+    а процесс бота раз в `poll_seconds` дочитывает новые строки и доставляет их.
+    """
+
+    def __init__(self):
+        self._ready: list[tuple[int, int, int]] = []  # (priority, seq, id)
+        self._delayed: list[tuple[datetime, int, int]] = []  # (not_before, seq, id)
+        self._messages: dict[int, _Pending] = {}
+        self._seq = itertools.count()
+        self._chat_ready: dict[int, float] = {}
+        self._paused_until = 0.0
+        self._bucket = TokenBucket(OUTBOX_RPS)
+        self._semaphore = asyncio.Semaphore(OUTBOX_CONCURRENCY)
+        self._wakeup = asyncio.Event()
+        self._inflight: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+        self._poll_seconds: float | None = None
+        self._next_poll = 0.0
+        self._last_id = 0  # Самая новая строка outbox, уже известная этому процессу
+
+        self.stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "flood_waits": 0}
+        self._latencies: deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._sent_at: deque[float] = deque(maxlen=METRICS_WINDOW)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def _push(self, msg_id: int, item: _Pending, not_before: datetime | None = None) -> None:
+        self._last_id = max(self._last_id, msg_id)
+        self._messages[msg_id] = item
+        if not_before and not_before > datetime.utcnow():
+            heapq.heappush(self._delayed, (not_before, next(self._seq), msg_id))
+        else:
+            heapq.heappush(self._ready, (item.priority, next(self._seq), msg_id))
+        self._wakeup.set()
+
+    async def enqueue(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL,
+                      dedupe_key: str | None = None) -> bool:
+        """Ставит сообщение в очередь. False — сообщение с таким dedupe_key уже было."""
+        return await self.enqueue_many([
+            {"chat_id": chat_id, "text": text, "priority": priority, "dedupe_key": dedupe_key}
+        ]) == 1
+
+    async def enqueue_many(self, messages: list[dict]) -> int:
+        """
+        Ставит пачку сообщений одной транзакцией. Элементы: chat_id, text, priority, dedupe_key (необязательно).
+        Возвращает, сколько сообщений действительно добавлено.
+        """
+        added = []
+        now = datetime.utcnow()
+        async with get_async_session() as session:
+            for message in messages:
+                priority = message.get("priority", PRIORITY_NORMAL)
+                result = await session.execute(
+                    sqlite_insert(OutboxMessage)
+                    .values(
+                        chat_id=message["chat_id"],
+                        text=message["text"],
+                        priority=priority,
+                        dedupe_key=message.get("dedupe_key"),
+                        status=PENDING,
+                        attempts=0,
+                        created_at=now,
+                    )
+                    .on_conflict_do_nothing(index_elements=[OutboxMessage.dedupe_key])
+                    .returning(OutboxMessage.id)
+                )
+                msg_id = result.scalar()
+                if msg_id is not None:
+                    added.append((msg_id, _Pending(message["chat_id"], message["text"], priority, 0, now)))
+            await session.commit()
+
+        # Очередь не запущена в этом процессе (worker.py) — сообщения доставит процесс бота, дочитав их из БД
+        if self._task is not None:
+            for msg_id, item in added:
+                if msg_id not in self._messages:
+                    self._push(msg_id, item)
+        self.stats["enqueued"] += len(added)
+        return len(added)
+
+    async def _load(self) -> None:
+        async with get_async_session() as session:
+            await session.execute(delete(OutboxMessage).where(
+                OutboxMessage.status == SENT,
+                OutboxMessage.sent_at < datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS),
+            ))
+            await session.commit()
+            result = await session.execute(
+                select(OutboxMessage).where(OutboxMessage.status == PENDING).order_by(OutboxMessage.id)
+            )
+            rows = list(result.scalars())
+
+        for row in rows:
+            item = _Pending(row.chat_id, row.text, row.priority, row.attempts, row.created_at)
+            self._push(row.id, item, row.not_before)
+        logger.info("📮 Очередь исходящих сообщений загружена: %s неотправленных", len(rows))
+
+    async def _poll(self) -> None:
+        """Дочитывает сообщения, которые поставили в очередь другие процессы."""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.status == PENDING, OutboxMessage.id > self._last_id)
+                .order_by(OutboxMessage.id)
+            )
+            rows = list(result.scalars())
+
+        for row in rows:
+            if row.id not in self._messages:
+                self._push(row.id, _Pending(row.chat_id, row.text, row.priority, row.attempts, row.created_at),
+                           row.not_before)
+        if rows:
+            logger.debug("📮 Из БД дочитано сообщений: %s", len(rows))
+
+    async def _update_row(self, msg_id: int, **values) -> None:
+        async with get_async_session() as session:
+            await session.execute(update(OutboxMessage).where(OutboxMessage.id == msg_id).values(**values))
+            await session.commit()
+
+    async def _mark_sent(self, msg_id: int, item: _Pending) -> None:
+        self._messages.pop(msg_id, None)
+        now = datetime.utcnow()
+        await self._update_row(msg_id, status=SENT, sent_at=now, attempts=item.attempts + 1, last_error=None)
+        self.stats["sent"] += 1
+        TELEGRAM_SENDS.inc(result="sent")
+        latency = (now - item.created_at).total_seconds()
+        TELEGRAM_DELIVERY_SECONDS.observe(latency)
+        self._latencies.append(latency)
+        self._sent_at.append(time.monotonic())
+
+    async def _fail(self, msg_id: int, item: _Pending, error: Exception) -> None:
+        self._messages.pop(msg_id, None)
+        await self._update_row(msg_id, status=FAILED, attempts=item.attempts + 1, last_error=str(error)[:500])
+        self.stats["failed"] += 1
+        TELEGRAM_SENDS.inc(result="failed")
+        logger.error("❌ Сообщение %s в чат %s не доставлено: %s", msg_id, item.chat_id, error)
+
+    async def _retry(self, msg_id: int, item: _Pending, delay: float, error: Exception) -> None:
+        not_before = datetime.utcnow() + timedelta(seconds=delay)
+        await self._update_row(msg_id, attempts=item.attempts, not_before=not_before, last_error=str(error)[:500])
+        self.stats["retried"] += 1
+        TELEGRAM_SENDS.inc(result="flood_wait" if isinstance(error, RetryAfter) else "retry")
+        self._push(msg_id, item, not_before)
+
+    async def _deliver(self, msg_id: int, item: _Pending) -> None:
+        try:
+            await self._bot.send_message(chat_id=item.chat_id, text=item.text)
+        except RetryAfter as e:
+            # Флуд-контроль касается всего бота: ставим на паузу всю очередь, попытку не засчитываем
+            delay = _retry_after_seconds(e.retry_after)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.stats["flood_waits"] += 1
+            logger.warning("⏳ Telegram просит подождать %.0f c, очередь на паузе", delay)
+            await self._retry(msg_id, item, delay, e)
+        except (Forbidden, BadRequest) as e:
+            # Бот заблокирован или чат не существует — повторять бесполезно
+            await self._fail(msg_id, item, e)
+        except Exception as e:
+            if item.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                await self._fail(msg_id, item, e)
+            else:
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** item.attempts)
+                logger.warning("🔁 Сообщение %s в чат %s: %s, повтор через %s c", msg_id, item.chat_id, e, delay)
+                await self._retry(msg_id, item._replace(attempts=item.attempts + 1), delay, e)
+        else:
+            await self._mark_sent(msg_id, item)
+
+    def _promote_delayed(self) -> None:
+        now = datetime.utcnow()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, msg_id = heapq.heappop(self._delayed)
+            item = self._messages.get(msg_id)
+            if item:
+                heapq.heappush(self._ready, (item.priority, seq, msg_id))
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            if self._poll_seconds and time.monotonic() >= self._next_poll:
+                self._next_poll = time.monotonic() + self._poll_seconds
+                try:
+                    await self._poll()
+                except Exception as e:
+                    logger.error("❌ Не удалось дочитать очередь сообщений из БД: %s", e)
+
+            self._promote_delayed()
+            if not self._ready:
+                timeout = None
+                if self._delayed:
+                    timeout = max(0.0, (self._delayed[0][0] - datetime.utcnow()).total_seconds())
+                if self._poll_seconds:
+                    until_poll = max(0.0, self._next_poll - time.monotonic())
+                    timeout = until_poll if timeout is None else min(timeout, until_poll)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, seq, msg_id = heapq.heappop(self._ready)
+            item = self._messages.get(msg_id)
+            if not item:
+                continue
+
+            # В один чат — не чаще раза в OUTBOX_CHAT_INTERVAL секунд
+            wait = self._chat_ready.get(item.chat_id, 0.0) - time.monotonic()
+            if wait > 0:
+                heapq.heappush(self._delayed, (datetime.utcnow() + timedelta(seconds=wait), seq, msg_id))
+                continue
+            self._chat_ready[item.chat_id] = time.monotonic() + OUTBOX_CHAT_INTERVAL
+
+            await self._semaphore.acquire()
+            await self._bucket.acquire()
+            task = asyncio.create_task(self._deliver(msg_id, item))
+            self._inflight.add(task)
+            task.add_done_callback(self._on_delivered)
+
+    def _on_delivered(self, task: asyncio.Task) -> None:
+        self._inflight.discard(task)
+        self._semaphore.release()
+        self._wakeup.set()
+        if not task.cancelled() and task.exception():
+            logger.error("❌ Ошибка очереди сообщений: %s", task.exception())
+
+    def metrics(self) -> dict:
+        """Глубина очереди, счётчики, задержка доставки (p50/p99, c) и скорость отправки (сообщ./с)."""
+        latencies = list(self._latencies)
+        throughput = 0.0
+        if len(self._sent_at) > 1:
+            span = self._sent_at[-1] - self._sent_at[0]
+            throughput = round((len(self._sent_at) - 1) / span, 2) if span > 0 else 0.0
+        return {
+            **self.stats,
+            "queued": len(self._messages),
+            "inflight": len(self._inflight),
+            "latency_p50": round(_percentile(latencies, 0.5), 3),
+            "latency_p99": round(_percentile(latencies, 0.99), 3),
+            "throughput": throughput,
+        }
+
+    async def start(self, bot: Bot, poll_seconds: float | None = None) -> None:
+        """poll_seconds — дочитывать сообщения других процессов (worker.py) с таким интервалом."""
+        self._bot = bot
+        self._poll_seconds = poll_seconds
+        await self._load()
+        self._task = asyncio.create_task(self.run(), name="outbox")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Даём начатым отправкам завершиться; недоставленное останется в БД со статусом PENDING
+        if self._inflight:
+            await asyncio.wait(self._inflight, timeout=5)
+        logger.info("📮 Очередь сообщений остановлена: %s", self.metrics())
+
+
+outbox = Outbox()
+
+Gauge("bondwatch_outbox_queued", "Сообщения в очереди outbox, ещё не доставленные", lambda: len(outbox))
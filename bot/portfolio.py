@@ -0,0 +1,128 @@
+# bot/portfolio.py
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+
+from bot.DB import get_async_session, TrackedBond, Instrument
+from bot.enrichment import bond_enrichment
+from core.analytics import build_cash_flows, analyze, PortfolioMetrics
+from core.bonds import BondEvent
+from database.bond_utils import stored_events
+from database.catalogue import lookup_bond
+from database.crud import get_future_events
+from database.moex_prices import fetch_bond_quotes
+
+logger = logging.getLogger(__name__)
+
+# Горизонт помесячного прогноза дохода
+PORTFOLIO_MONTHS = 12
+# Насколько назад читать график: по прошлым купонам оцениваются необъявленные купоны флоатеров
+HISTORY_DAYS = 400
+
+
+class Portfolio(NamedTuple):
+    """Бумаги пользователя (по одной каждого выпуска) и посчитанные по ним метрики."""
+    isins: list[str]
+    names: list[str]
+    metrics: PortfolioMetrics
+    today: date
+    incomplete: list[str]  # Названия бумаг, чей график в БД обрывается раньше погашения (без YTM и дюрации)
+
+
+def is_truncated(isin: str, events: list[BondEvent]) -> bool:
+    """Сохранённый график кончается раньше даты погашения из справочника T-Invest — он неполный."""
+    entry = lookup_bond(isin)
+    if not entry or not entry.maturity_date:
+        return False
+    return not events or events[-1].event_date < entry.maturity_date
+
+
+async def load_portfolio(user_id: int, today: date | None = None) -> Portfolio | None:
+    """
+    Графики выплат всех бумаг пользователя из БД и цены с MOEX -> метрики одним пакетом.
+    Неполные графики (см. `is_truncated`) в YTM не участвуют и перечитываются в фоне — не в ответе пользователю.
+    """
+    today = today or date.today()
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(TrackedBond.isin, Instrument.name)
+            .join(Instrument, Instrument.isin == TrackedBond.isin)
+            .where(TrackedBond.user_id == user_id)
+            .order_by(TrackedBond.added_at)
+        )
+        bonds = list(result)
+        if not bonds:
+            return None
+        isins = [isin for isin, _ in bonds]
+        schedules = await get_future_events(session, isins, today - timedelta(days=HISTORY_DAYS))
+
+    events = {isin: stored_events(schedules[isin]) for isin in isins}
+    truncated = [is_truncated(isin, events[isin]) for isin in isins]
+    for isin, cut in zip(isins, truncated):
+        if cut:
+            bond_enrichment.enrich(isin, reload_schedule=True).add_done_callback(_log_failure)
+
+    quotes = await fetch_bond_quotes(isins)
+    clean = np.array([quotes[isin].clean if isin in quotes else np.nan for isin in isins])
+    # Без цены бумага не участвует в YTM и дюрации: по обрезанному графику они были бы неверными
+    dirty = np.array([quotes[isin].dirty if isin in quotes and not cut else np.nan
+                      for isin, cut in zip(isins, truncated)])
+
+    flows = build_cash_flows([events[isin] for isin in isins], today)
+    metrics = analyze(flows, clean, dirty, PORTFOLIO_MONTHS)
+    names = [name or isin for isin, name in bonds]
+    return Portfolio(isins, names, metrics, today, [name for name, cut in zip(names, truncated) if cut])
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        logger.warning("⚠️ Не удалось перечитать график для /portfolio: %s", task.exception())
+
+
+def _percent(value: float) -> str:
+    return f"{value * 100:.2f}%" if np.isfinite(value) else "—"
+
+
+def _years(value: float) -> str:
+    return f"{value:.2f} г." if np.isfinite(value) else "—"
+
+
+def portfolio_text(portfolio: Portfolio) -> str:
+    metrics = portfolio.metrics
+    lines = [
+        f"💼 Бумаг в портфеле: {len(portfolio.isins)} (по одной каждого выпуска)",
+        f"Доходность к погашению: {_percent(metrics.portfolio_ytm)}",
+        f"Текущая доходность: {_percent(metrics.portfolio_current_yield)}",
+        f"Дюрация: {_years(metrics.portfolio_duration)}",
+        "",
+        f"📅 Выплаты на {PORTFOLIO_MONTHS} мес.:",
+    ]
+
+    year, month = portfolio.today.year, portfolio.today.month
+    for offset, (coupons, amortizations) in enumerate(zip(metrics.monthly_coupons, metrics.monthly_amortizations)):
+        if coupons or amortizations:
+            y, m = divmod(month - 1 + offset, 12)
+            line = f"• {m + 1:02d}.{year + y}: купоны {coupons:.2f} руб."
+            if amortizations:
+                line += f", амортизация {amortizations:.2f} руб."
+            lines.append(line)
+    total_coupons, total_amortizations = metrics.monthly_coupons.sum(), metrics.monthly_amortizations.sum()
+    if not total_coupons and not total_amortizations:
+        lines.append("• выплат не ожидается")
+    else:
+        lines.append(f"Итого: купоны {total_coupons:.2f} руб., амортизация {total_amortizations:.2f} руб.")
+
+    lines += ["", "📊 По бумагам:"]
+    for i, name in enumerate(portfolio.names):
+        lines.append(
+            f"• {name}: YTM {_percent(metrics.ytm[i])}, текущая {_percent(metrics.current_yield[i])}, "
+            f"дюрация {_years(metrics.duration[i])} (модиф. {_years(metrics.modified_duration[i])})"
+        )
+    if portfolio.incomplete:
+        lines += ["", f"⏳ Загружаю полный график выплат: {', '.join(portfolio.incomplete)} — "
+                      "доходность и дюрация по ним появятся позже."]
+    return "\n".join(lines)
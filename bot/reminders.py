@@ -0,0 +1,281 @@
+# bot/reminders.py
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select
+
+from bot.DB import get_async_session, OutboxMessage, DIGEST_IMMEDIATE, DIGEST_DAILY, DIGEST_WEEKLY
+from bot.digests import reminder_text, group_by_user, send_digests
+from bot.outbox import outbox, PRIORITY_NORMAL
+from core.metrics import Gauge
+from config import REMINDER_DAYS_BEFORE, REMINDER_HOUR, REMINDER_HORIZON_DAYS, DIGEST_WEEKDAY
+from database.crud import get_events_between
+
+logger = logging.getLogger(__name__)
+
+# Дольше не спим: после пробуждения заново сверяемся с часами
+MAX_SLEEP_SECONDS = 3600
+# dedupe_key напоминаний в outbox: reminder:{user_id}:{isin}:{event_type}:{event_date},... — по событию на элемент
+DEDUPE_PREFIX = "reminder:"
+# За сколько дней смотреть в outbox: срабатывание позже дня due всё равно не ставится
+SENT_LOOKBACK = timedelta(days=2)
+# Через сколько повторить напоминания, которые не удалось записать в outbox
+RETRY_DELAY = timedelta(minutes=1)
+
+
+class ReminderScheduler:
+    """
+    Очередь напоминаний «за 3 дня до события», построенная по графику выплат из БД.
+
+    Напоминания лежат в куче по времени срабатывания. Ключ записи —
+    (user_id, isin, event_type, event_date); при изменении подписки старая запись не удаляется
+    из кучи, а просто перестаёт совпадать с актуальной в `_entries` и пропускается при извлечении.
+    В памяти держим только события ближайших REMINDER_HORIZON_DAYS дней — дальше подгружает `load()`.
+    Записанные в outbox ключи запоминаются в `_fired`, чтобы перестройка очереди в тот же день не поставила
+    их снова; при построении очереди `_fired` дополняется событиями, уже записанными в outbox
+    (перезапуск бота, смена владельца шарда 0).
+
+    В очередь попадают только пользователи с настройкой «сразу»; сработавшие одновременно напоминания
+    одного пользователя уходят одним сообщением. Раз в сутки в REMINDER_HOUR тот же цикл рассылает
+    ежедневные и (в DIGEST_WEEKDAY) еженедельные сводки.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, int, tuple]] = []
+        self._entries: dict[tuple, tuple[int, datetime, float | None]] = {}
+        self._fired: set[tuple] = set()  # Уже отправленные напоминания, пока не прошёл день срабатывания
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._next_digest: datetime | None = None
+
+    @staticmethod
+    def due_at(event_date: date) -> datetime:
+        return datetime.combine(event_date - timedelta(days=REMINDER_DAYS_BEFORE), time(hour=REMINDER_HOUR))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def running(self) -> bool:
+        """Очередь ведёт этот процесс. Иначе (WORKER_SHARDS > 0) её ведёт worker.py, сверяясь с БД каждый час."""
+        return self._task is not None
+
+    @staticmethod
+    def _window() -> tuple[date, date]:
+        start = date.today() + timedelta(days=REMINDER_DAYS_BEFORE)
+        return start, start + timedelta(days=REMINDER_HORIZON_DAYS)
+
+    def _schedule(self, user_id: int, isin: str, event_type: str, event_date: date, value: float | None) -> None:
+        now = datetime.now()
+        due = self.due_at(event_date)
+        if due.date() < now.date():
+            return
+        key = (user_id, isin, event_type, event_date)
+        if key in self._fired:
+            return
+        # Бот был выключен в момент срабатывания — отправляем сегодня же, сразу
+        due = max(due, now)
+
+        seq = next(self._seq)
+        self._entries[key] = (seq, due, value)
+        heapq.heappush(self._heap, (due, seq, key))
+        self._wakeup.set()
+
+    def _drop(self, isin: str | None = None, user_id: int | None = None) -> None:
+        for key in [key for key in self._entries
+                    if (isin is None or key[1] == isin) and (user_id is None or key[0] == user_id)]:
+            del self._entries[key]
+
+    async def _load_rows(self, isin: str | None = None, user_id: int | None = None) -> list[tuple]:
+        start, end = self._window()
+        async with get_async_session() as session:
+            return await get_events_between(session, start, end, isin=isin, user_id=user_id,
+                                            digest_mode=DIGEST_IMMEDIATE)
+
+    async def load(self) -> None:
+        """Полностью перестраивает очередь по данным из БД (без сетевых запросов)."""
+        rows = await self._load_rows()
+        self._heap.clear()
+        self._entries.clear()
+        today = date.today()
+        self._fired = {key for key in self._fired if self.due_at(key[3]).date() >= today}
+        self._fired |= await self._already_sent()
+        for row in rows:
+            self._schedule(*row)
+        logger.info("⏰ Очередь напоминаний построена: %s записей", len(self._entries))
+
+    async def reschedule_isin(self, isin: str) -> None:
+        """Перестраивает записи одной бумаги у всех подписчиков (после обновления графика)."""
+        if not self.running:
+            return
+        rows = await self._load_rows(isin=isin)
+        self._drop(isin)
+        for row in rows:
+            self._schedule(*row)
+
+    async def reschedule_subscription(self, user_id: int, isin: str) -> None:
+        """Перестраивает записи одной подписки (после добавления или удаления бумаги пользователем)."""
+        if not self.running:
+            return
+        rows = await self._load_rows(isin=isin, user_id=user_id)
+        self._drop(isin, user_id)
+        for row in rows:
+            self._schedule(*row)
+
+    async def reschedule_user(self, user_id: int) -> None:
+        """Перестраивает все записи пользователя (после смены режима уведомлений)."""
+        if not self.running:
+            return
+        rows = await self._load_rows(user_id=user_id)
+        self._drop(user_id=user_id)
+        for row in rows:
+            self._schedule(*row)
+
+    def _pop_due(self, now: datetime) -> list[tuple[tuple, float | None]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if not entry or entry[0] != seq:
+                continue  # Запись устарела
+            del self._entries[key]
+            due.append((key, entry[2]))
+        return due
+
+    def _retry(self, due: list[tuple[tuple, float | None]]) -> None:
+        """Возвращает в очередь напоминания, которые не удалось записать в outbox."""
+        retry_at = datetime.now() + RETRY_DELAY
+        for key, value in due:
+            if key in self._entries:
+                continue  # Пока писали, запись перестроили — она уже в очереди
+            seq = next(self._seq)
+            self._entries[key] = (seq, retry_at, value)
+            heapq.heappush(self._heap, (retry_at, seq, key))
+        self._wakeup.set()
+
+    def _mark_fired(self, keys) -> None:
+        for key in keys:
+            self._fired.add(key)
+            # Перестройка очереди во время записи могла вернуть запись — она больше не нужна
+            self._entries.pop(key, None)
+
+    def _seconds_until_next(self) -> float:
+        while self._heap:
+            _, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry and entry[0] == seq:
+                return max(0.0, (self._heap[0][0] - datetime.now()).total_seconds())
+            heapq.heappop(self._heap)
+        return MAX_SLEEP_SECONDS
+
+    @staticmethod
+    async def _already_sent(user_ids: set[int] | None = None) -> set[tuple]:
+        """События (user_id, isin, event_type, event_date), напоминания о которых уже есть в outbox."""
+        query = select(OutboxMessage.dedupe_key).where(
+            OutboxMessage.dedupe_key.startswith(DEDUPE_PREFIX),
+            OutboxMessage.created_at >= datetime.utcnow() - SENT_LOOKBACK,
+        )
+        if user_ids is not None:
+            query = query.where(OutboxMessage.chat_id.in_(user_ids))
+        async with get_async_session() as session:
+            dedupe_keys = (await session.execute(query)).scalars().all()
+
+        sent = set()
+        for dedupe_key in dedupe_keys:
+            user_id, _, events = dedupe_key.removeprefix(DEDUPE_PREFIX).partition(":")
+            for event in events.split(","):
+                isin, event_type, event_date = event.split(":")
+                sent.add((int(user_id), isin, event_type, date.fromisoformat(event_date)))
+        return sent
+
+    async def _send(self, due: list[tuple[tuple, float | None]]) -> None:
+        """
+        Передаёт сработавшие напоминания в очередь исходящих сообщений — она соблюдает лимиты Telegram.
+        На пользователя — одно сообщение, сколько бы событий у него ни сработало.
+        """
+        # Повторы отсекаем по каждому событию до группировки: состав сообщения может отличаться от прежнего
+        try:
+            sent = await self._already_sent({key[0] for key, _ in due})
+        except Exception as e:
+            logger.error("❌ Не удалось сверить напоминания с outbox, повторим через %s: %s", RETRY_DELAY, e)
+            self._retry(due)
+            return
+        self._mark_fired(key for key, _ in due if key in sent)
+        due = [(key, value) for key, value in due if key not in sent]
+        if not due:
+            return
+
+        messages = []
+        for user_id, events in group_by_user([(*key, value) for key, value in due]).items():
+            keys = sorted(f"{isin}:{event_type}:{event_date}" for isin, event_type, event_date, _ in events)
+            messages.append({
+                "chat_id": user_id,
+                "text": reminder_text(events),
+                "priority": PRIORITY_NORMAL,
+                "dedupe_key": f"{DEDUPE_PREFIX}{user_id}:" + ",".join(keys),
+            })
+        try:
+            added = await outbox.enqueue_many(messages)
+        except Exception as e:
+            logger.error("❌ Не удалось поставить напоминания в очередь, повторим через %s: %s", RETRY_DELAY, e)
+            self._retry(due)
+            return
+        # Отправленными считаем только записанные в outbox: иначе load() потерял бы их до конца дня
+        self._mark_fired(key for key, _ in due)
+        logger.info("✅ Напоминания по %s событиям: %s сообщений поставлено в очередь", len(due), added)
+
+    async def _send_digests(self, today: date) -> None:
+        modes = [DIGEST_DAILY] + ([DIGEST_WEEKLY] if today.weekday() == DIGEST_WEEKDAY else [])
+        for mode in modes:
+            try:
+                await send_digests(mode, today)
+            except Exception as e:
+                logger.error("❌ Не удалось разослать сводки (%s): %s", mode, e)
+
+    def _seconds_until_digest(self) -> float:
+        return max(0.0, (self._next_digest - datetime.now()).total_seconds())
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = min(self._seconds_until_next(), self._seconds_until_digest(), MAX_SLEEP_SECONDS)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                continue  # Очередь изменилась — пересчитываем ближайшее время
+            except asyncio.TimeoutError:
+                pass
+
+            now = datetime.now()
+            due = self._pop_due(now)
+            if due:
+                await self._send(due)
+
+            if now >= self._next_digest:
+                await self._send_digests(now.date())
+                self._next_digest = datetime.combine(now.date() + timedelta(days=1), time(hour=REMINDER_HOUR))
+
+    async def start(self) -> None:
+        await self.load()
+        # Если бот стартовал после REMINDER_HOUR, сегодняшние сводки уйдут сразу (повторы отсекает outbox)
+        self._next_digest = datetime.combine(date.today(), time(hour=REMINDER_HOUR))
+        self._task = asyncio.create_task(self.run(), name="reminders")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._entries.clear()
+
+
+reminder_scheduler = ReminderScheduler()
+
+Gauge("bondwatch_reminders_scheduled", "Напоминания в очереди reminder_scheduler", lambda: len(reminder_scheduler))
@@ -0,0 +1,78 @@
+# bot/updates.py
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Лимит семафора базового класса: настоящий лимит — PerChatUpdateProcessor.concurrency
+UNBOUNDED = 2 ** 31 - 1
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений (не больше `concurrency` сразу), но обновления одного
+    чата — строго по очереди поступления. Так диалоги /add и /remove (ConversationHandler) видят
+    сообщения пользователя в том порядке, в каком он их отправил, а медленный /add одного пользователя
+    не задерживает остальных.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        # Базовый класс берёт свой семафор ещё до do_process_update, и обновления, ждущие очереди
+        # занятого чата, держали бы слоты остальных чатов. Поэтому его делаем неограниченным
+        # (max_concurrent_updates сообщает UNBOUNDED), а лимит `concurrency` держит собственный семафор,
+        # который берётся только когда очередь чата подошла
+        super().__init__(UNBOUNDED)
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates должен быть положительным")
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._active = 0
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._waiting: dict[int, int] = {}  # Сколько обновлений чата в работе — чтобы убирать ненужные блокировки
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        return self._active
+
+    @staticmethod
+    def _chat_key(update: object) -> int | None:
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        async with self._slots:
+            self._active += 1
+            try:
+                await coroutine
+            finally:
+                self._active -= 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        # asyncio.Lock будит ожидающих по порядку, а слот берётся уже после него:
+        # каждый чат занимает не больше одного слота
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await self._run(coroutine)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -3,4 +3,115 @@ import os
 
 load_dotenv()
 
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
\ No newline at end of file
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+T_TOKEN = os.getenv("T_TOKEN")
+
+# Bot API: адрес можно подменить локальной заглушкой (benchmarks/fake_bot_api.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+# Получение обновлений: polling или webhook (встроенный HTTP-сервер PTB на WEBHOOK_LISTEN:WEBHOOK_PORT)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, который регистрируется в Telegram
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Заголовок X-Telegram-Bot-Api-Secret-Token
+# Сколько обновлений обрабатывать одновременно; обновления одного чата всё равно идут по очереди (1 — по одному)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Файл базы SQLite
+DATABASE_PATH = os.getenv("DATABASE_PATH", "bot.db")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Логи: файл с ротацией, общий уровень и уровни отдельных модулей ("httpx=WARNING,database.update=DEBUG"),
+# сколько одинаковых сообщений уровня INFO и ниже пропускать в минуту
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING,apscheduler=WARNING,aiosqlite=WARNING")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_SAMPLE_PER_MINUTE = int(os.getenv("LOG_SAMPLE_PER_MINUTE", "60"))
+
+# Метрики в формате Prometheus: GET /metrics на этом адресе (порт 0 — выключено)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Внешние API
+MOEX_ISS_URL = os.getenv("MOEX_ISS_URL", "https://iss.moex.com")
+TINKOFF_API_URL = os.getenv("TINKOFF_API_URL", "https://invest-public-api.tinkoff.ru/rest")
+
+# Пул HTTP-соединений (общий на всё приложение, отдельный на каждый хост)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Дисковый кэш ответов MOEX ISS (переживает перезапуск)
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "http_cache.db")
+HTTP_CACHE_MAX_MB = int(os.getenv("HTTP_CACHE_MAX_MB", "64"))
+# TTL по типам запросов, секунды (0 — не кэшировать)
+HTTP_CACHE_TTL_BONDIZATION = int(os.getenv("HTTP_CACHE_TTL_BONDIZATION", str(12 * 3600)))
+HTTP_CACHE_TTL_SECURITY = int(os.getenv("HTTP_CACHE_TTL_SECURITY", str(7 * 24 * 3600)))
+HTTP_CACHE_TTL_MARKET_BONDIZATION = int(os.getenv("HTTP_CACHE_TTL_MARKET_BONDIZATION", str(6 * 3600)))
+HTTP_CACHE_TTL_MARKETDATA = int(os.getenv("HTTP_CACHE_TTL_MARKETDATA", str(15 * 60)))
+
+# Лимиты запросов в секунду на хост (0 — без ограничения)
+MOEX_RPS = float(os.getenv("MOEX_RPS", "10"))
+TINKOFF_RPS = float(os.getenv("TINKOFF_RPS", "3"))
+
+# Напоминания о купонах: за сколько дней и в котором часу (локальное время)
+REMINDER_DAYS_BEFORE = int(os.getenv("REMINDER_DAYS_BEFORE", "3"))
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", "10"))
+# День недели для еженедельной сводки (0 — понедельник)
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", "0"))
+# Сколько дней вперёд держать напоминания в памяти (дальние подгружает периодическая сверка)
+REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", "14"))
+
+# Очередь исходящих сообщений Telegram: общий лимит в секунду, пауза между сообщениями в один чат,
+# число одновременных отправок и повторов, хранение истории отправленного
+OUTBOX_RPS = float(os.getenv("OUTBOX_RPS", "25"))
+OUTBOX_CHAT_INTERVAL = float(os.getenv("OUTBOX_CHAT_INTERVAL", "1.0"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+# Как часто процесс бота дочитывает из БД сообщения, поставленные в очередь процессами worker.py
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+
+# Сколько часов не повторять поиск FIGI для ISIN, который T-Invest не нашёл
+FIGI_NEGATIVE_TTL_HOURS = int(os.getenv("FIGI_NEGATIVE_TTL_HOURS", str(7 * 24)))
+
+# Названия инструментов: размер LRU-кэша в памяти, размер пачки фоновой догрузки,
+# сколько секунд копить пачку и через сколько часов повторять ISIN, для которого название не нашлось
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "10000"))
+NAME_BACKFILL_BATCH = int(os.getenv("NAME_BACKFILL_BATCH", "50"))
+NAME_BACKFILL_DELAY_SECONDS = float(os.getenv("NAME_BACKFILL_DELAY_SECONDS", "2"))
+NAME_RETRY_HOURS = int(os.getenv("NAME_RETRY_HOURS", "6"))
+
+# Кэш ответов кнопки /info: сколько бумаг держать в памяти и через сколько секунд перечитывать график в фоне
+BOND_INFO_CACHE_SIZE = int(os.getenv("BOND_INFO_CACHE_SIZE", "2000"))
+BOND_INFO_TTL_SECONDS = int(os.getenv("BOND_INFO_TTL_SECONDS", "600"))
+
+# Периодические задачи: случайная задержка запуска и сколько секунд опоздания ещё допустимо
+JOB_JITTER_SECONDS = float(os.getenv("JOB_JITTER_SECONDS", "30"))
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv("JOB_MISFIRE_GRACE_SECONDS", "300"))
+
+# Ежедневное обновление облигаций
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", "8"))
+
+# Отдельные процессы обновления (worker.py): на сколько шардов делить бумаги по хэшу ISIN
+# (0 — обновление и напоминания работают в процессе бота), срок аренды шарда и как часто её продлевать
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", "0"))
+WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "120"))
+WORKER_TICK_SECONDS = int(os.getenv("WORKER_TICK_SECONDS", "30"))
+# Как часто процесс бота подхватывает справочник и обновлённые графики, записанные процессами worker.py
+WORKER_SYNC_SECONDS = int(os.getenv("WORKER_SYNC_SECONDS", "300"))
+
+# Массовая загрузка графиков выплат всего рынка облигаций MOEX
+MOEX_BULK_PAGE_SIZE = int(os.getenv("MOEX_BULK_PAGE_SIZE", "100"))
+MOEX_BULK_WINDOW_DAYS = int(os.getenv("MOEX_BULK_WINDOW_DAYS", "400"))
+# Сколько сохранённый график считается свежим для get_bond_coupons_from_moex / fetch_bond_events
+SCHEDULE_CACHE_TTL_HOURS = int(os.getenv("SCHEDULE_CACHE_TTL_HOURS", "26"))
@@ -0,0 +1,167 @@
+# core.analytics.py
+from datetime import date
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from bot.DB import COUPON, AMORTIZATION
+from core.bonds import BondEvent
+
+COUPON_FLOW = 0
+AMORTIZATION_FLOW = 1
+
+# Годовая доходность в пределах (-95%, 1000%): дальше Newton уходит только на мусорных ценах
+YTM_MIN, YTM_MAX = -0.95, 10.0
+
+
+class CashFlows(NamedTuple):
+    """Будущие выплаты всех бумаг портфеля одним набором плоских массивов (одна строка — одна выплата)."""
+    bond: np.ndarray  # int32, номер бумаги 0..n-1
+    years: np.ndarray  # float64, срок до выплаты в годах (факт/365)
+    amount: np.ndarray  # float64, руб. на одну бумагу
+    kind: np.ndarray  # int8, COUPON_FLOW / AMORTIZATION_FLOW
+    month: np.ndarray  # int32, номер месяца от текущего (0 — этот месяц)
+    bonds: int
+
+
+class PortfolioMetrics(NamedTuple):
+    """Метрики по бумагам (массивы длины n, NaN — не посчитать) и по портфелю целиком."""
+    current_yield: np.ndarray
+    ytm: np.ndarray
+    duration: np.ndarray  # Маколея, лет
+    modified_duration: np.ndarray
+    monthly_coupons: np.ndarray  # руб. по месяцам вперёд
+    monthly_amortizations: np.ndarray
+    portfolio_current_yield: float
+    portfolio_ytm: float
+    portfolio_duration: float
+
+
+def build_cash_flows(schedules: list[Iterable[BondEvent]], today: date) -> CashFlows:
+    """
+    Графики выплат бумаг -> плоские массивы. Берутся купоны и амортизации строго после `today`;
+    купон без объявленной суммы (флоатер) считается равным последнему известному купону бумаги.
+    """
+    bond, days, amount, kind, month = [], [], [], [], []
+    for index, events in enumerate(schedules):
+        last_coupon = None
+        for event in events:
+            if event.event_type not in (COUPON, AMORTIZATION):
+                continue
+            is_coupon = event.event_type == COUPON
+            value = event.amount
+            if is_coupon:
+                value = value if value is not None else last_coupon
+                last_coupon = value
+            if value is None or event.event_date <= today:
+                continue
+            bond.append(index)
+            days.append((event.event_date - today).days)
+            amount.append(value)
+            kind.append(COUPON_FLOW if is_coupon else AMORTIZATION_FLOW)
+            month.append((event.event_date.year - today.year) * 12 + event.event_date.month - today.month)
+
+    return CashFlows(
+        bond=np.array(bond, dtype=np.int32),
+        years=np.array(days, dtype=np.float64) / 365.0,
+        amount=np.array(amount, dtype=np.float64),
+        kind=np.array(kind, dtype=np.int8),
+        month=np.array(month, dtype=np.int32),
+        bonds=len(schedules),
+    )
+
+
+def monthly_income(flows: CashFlows, months: int = 12) -> tuple[np.ndarray, np.ndarray]:
+    """Купоны и амортизации по месяцам вперёд, суммарно по портфелю."""
+    horizon = flows.month < months
+    coupons = horizon & (flows.kind == COUPON_FLOW)
+    amortizations = horizon & (flows.kind == AMORTIZATION_FLOW)
+    return (np.bincount(flows.month[coupons], weights=flows.amount[coupons], minlength=months),
+            np.bincount(flows.month[amortizations], weights=flows.amount[amortizations], minlength=months))
+
+
+def annual_coupons(flows: CashFlows) -> np.ndarray:
+    """Купоны каждой бумаги за ближайший год."""
+    mask = (flows.kind == COUPON_FLOW) & (flows.years <= 1.0)
+    return np.bincount(flows.bond[mask], weights=flows.amount[mask], minlength=flows.bonds)
+
+
+def solve_ytm(flows: CashFlows, dirty_price: np.ndarray, tol: float = 1e-10, max_iter: int = 50) -> np.ndarray:
+    """
+    Доходность к погашению всех бумаг сразу: Newton по вектору ставок, где цена и её производная
+    для всех бумаг считаются одним np.bincount по плоскому массиву выплат.
+    Решается sum(CF / (1 + y) ** t) = грязная цена; годовая эффективная ставка.
+    """
+    n = flows.bonds
+    y = np.full(n, 0.1)
+    has_flows = np.bincount(flows.bond, minlength=n) > 0
+    valid = has_flows & np.isfinite(dirty_price) & (dirty_price > 0)
+    if not valid.any():
+        return np.full(n, np.nan)
+
+    price = np.where(valid, dirty_price, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(max_iter):
+            rate = 1.0 + y[flows.bond]
+            discounted = flows.amount * rate ** -flows.years
+            value = np.bincount(flows.bond, weights=discounted, minlength=n)
+            slope = np.bincount(flows.bond, weights=-flows.years * discounted / rate, minlength=n)
+            step = np.where(valid, (value - price) / slope, 0.0)
+            step = np.nan_to_num(step, nan=0.0, posinf=0.0, neginf=0.0)
+            y = np.clip(y - step, YTM_MIN, YTM_MAX)
+            if np.abs(step).max() < tol:
+                break
+    return np.where(valid, y, np.nan)
+
+
+def macaulay_duration(flows: CashFlows, ytm: np.ndarray) -> np.ndarray:
+    """Средневзвешенный по приведённой стоимости срок выплат, лет."""
+    rate = 1.0 + np.nan_to_num(ytm)[flows.bond]
+    discounted = flows.amount * rate ** -flows.years
+    value = np.bincount(flows.bond, weights=discounted, minlength=flows.bonds)
+    weighted = np.bincount(flows.bond, weights=flows.years * discounted, minlength=flows.bonds)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(np.isfinite(ytm) & (value > 0), weighted / value, np.nan)
+
+
+def analyze(flows: CashFlows, clean_price: np.ndarray, dirty_price: np.ndarray,
+            months: int = 12) -> PortfolioMetrics:
+    """
+    Все метрики одним пакетом. Цены — в рублях за одну бумагу, NaN — цены нет.
+    YTM и дюрация считаются только для бумаг с ценой и погашением в графике (иначе поток неполный).
+    Портфель решается как ещё одна «бумага»: выплаты всех таких бумаг вместе против их суммарной грязной цены.
+    """
+    n = flows.bonds
+    coupons_year = annual_coupons(flows)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        current_yield = np.where(clean_price > 0, coupons_year / clean_price, np.nan)
+
+    redeemed = np.bincount(flows.bond[flows.kind == AMORTIZATION_FLOW], minlength=n) > 0
+    priced = np.isfinite(dirty_price) & (dirty_price > 0) & redeemed
+    dirty_price = np.where(priced, dirty_price, np.nan)
+    in_portfolio = priced[flows.bond]
+    combined = flows._replace(
+        bond=np.concatenate([flows.bond, np.full(int(in_portfolio.sum()), n, dtype=np.int32)]),
+        years=np.concatenate([flows.years, flows.years[in_portfolio]]),
+        amount=np.concatenate([flows.amount, flows.amount[in_portfolio]]),
+        kind=np.concatenate([flows.kind, flows.kind[in_portfolio]]),
+        month=np.concatenate([flows.month, flows.month[in_portfolio]]),
+        bonds=n + 1,
+    )
+    total_dirty = dirty_price[priced].sum() if priced.any() else np.nan
+    ytm = solve_ytm(combined, np.append(dirty_price, total_dirty))
+    duration = macaulay_duration(combined, ytm)
+
+    total_clean = clean_price[priced].sum() if priced.any() else 0.0
+    monthly_coupons, monthly_amortizations = monthly_income(flows, months)
+    return PortfolioMetrics(
+        current_yield=current_yield,
+        ytm=ytm[:n],
+        duration=duration[:n],
+        modified_duration=duration[:n] / (1.0 + ytm[:n]),
+        monthly_coupons=monthly_coupons,
+        monthly_amortizations=monthly_amortizations,
+        portfolio_current_yield=float(coupons_year[priced].sum() / total_clean) if total_clean > 0 else float("nan"),
+        portfolio_ytm=float(ytm[n]),
+        portfolio_duration=float(duration[n]),
+    )
@@ -0,0 +1,36 @@
+# core.bonds.py
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+# Источники графика выплат (колонка coupon_events.source)
+SOURCE_MOEX = "MOEX"
+SOURCE_TINKOFF = "TINKOFF"
+
+
+class BondEvent(NamedTuple):
+    """
+    Событие графика выплат: купон, амортизация или оферта на одну бумагу.
+    Кортеж без __dict__; сумма — Decimal в рублях (цена оферты — тоже сумма), None — не объявлена.
+    Создаётся только парсерами источников в database/bond_utils.py.
+    """
+    event_date: date
+    amount: Decimal | None
+    event_type: str  # COUPON / AMORTIZATION / OFFER
+    source: str  # SOURCE_MOEX / SOURCE_TINKOFF
+
+
+def to_decimal(value) -> Decimal | None:
+    """Число из JSON или БД -> Decimal без двоичного хвоста float (35.4, а не 35.39999...)."""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return Decimal(int(value))  # 1000.0 из колонки Float -> 1000, как в ответе MOEX
+    return Decimal(str(value))
+
+
+def amount_to_float(amount: Decimal | None) -> float | None:
+    """Сумма для колонки Float в SQLite."""
+    return float(amount) if amount is not None else None
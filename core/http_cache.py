@@ -0,0 +1,182 @@
+# core.http_cache.py
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from config import (
+    HTTP_CACHE_PATH, HTTP_CACHE_MAX_MB,
+    HTTP_CACHE_TTL_BONDIZATION, HTTP_CACHE_TTL_SECURITY, HTTP_CACHE_TTL_MARKET_BONDIZATION,
+    HTTP_CACHE_TTL_MARKETDATA,
+)
+from core.http_client import get_client
+from core.metrics import HTTP_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Путь запроса -> TTL в секундах. Первое совпадение выигрывает; не совпало — не кэшируем
+TTL_RULES = [
+    (re.compile(r"^/iss/statistics/.*/bondization\.json$"), HTTP_CACHE_TTL_MARKET_BONDIZATION),
+    (re.compile(r"^/iss/securities/[^/]+/bondization\.json$"), HTTP_CACHE_TTL_BONDIZATION),
+    (re.compile(r"^/iss/securities/[^/]+\.json$"), HTTP_CACHE_TTL_SECURITY),
+    (re.compile(r"^/iss/engines/stock/markets/bonds/securities\.json$"), HTTP_CACHE_TTL_MARKETDATA),
+]
+
+# Заголовки, которые имеет смысл хранить вместе с телом
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+
+def ttl_for(path: str) -> int:
+    for pattern, ttl in TTL_RULES:
+        if pattern.match(path):
+            return ttl
+    return 0
+
+
+class HttpCache:
+    """
+    Кэш ответов в SQLite: ключ — хост + URL с параметрами, срок жизни по типу запроса,
+    ревалидация по ETag/Last-Modified, вытеснение давно не читавшихся записей при превышении размера.
+    Методы синхронные и потокобезопасные — из event loop их зовут через asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> tuple[int, dict, bytes, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        status, headers, body, expires_at = row
+        return status, json.loads(headers), body, expires_at
+
+    def put(self, key: str, status: int, headers: dict, body: bytes, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, status, headers, body, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, status, json.dumps(headers), body, len(body), now + ttl, now),
+            )
+            self._size += len(body) - (old[0] if old else 0)
+            self.stats["stores"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def extend(self, key: str, ttl: int) -> None:
+        """Ответ подтверждён сервером (304) — продлеваем срок жизни."""
+        with self._lock:
+            self._conn.execute("UPDATE responses SET expires_at = ? WHERE key = ?", (time.time() + ttl, key))
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if not row:
+                self._size = 0
+                return
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._size -= row[1]
+            self.stats["evictions"] += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: HttpCache | None = None
+
+
+def get_cache() -> HttpCache:
+    global _cache
+    if _cache is None:
+        _cache = HttpCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+
+def close_cache() -> None:
+    global _cache
+    if _cache is not None:
+        logger.info("🗄 HTTP-кэш: %s", _cache.stats)
+        _cache.close()
+        _cache = None
+
+
+def _cached_response(request: httpx.Request, status: int, headers: dict, body: bytes) -> httpx.Response:
+    return httpx.Response(status, headers=headers, content=body, request=request)
+
+
+async def cached_get(host: str, url: str, params: dict | None = None) -> httpx.Response:
+    """
+    GET через общий клиент хоста с дисковым кэшем. Интерфейс тот же, что у client.get:
+    возвращается httpx.Response, так что вызывающий код по-прежнему делает raise_for_status() и json().
+    """
+    client = get_client(host)
+    ttl = ttl_for(url)
+    if ttl <= 0:
+        return await client.get(url, params=params)
+
+    cache = get_cache()
+    request = client.build_request("GET", url, params=params)
+    key = f"{host}:{request.url}"
+
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry:
+        status, headers, body, expires_at = entry
+        if expires_at > time.time():
+            cache.stats["hits"] += 1
+            HTTP_CACHE.inc(result="hit")
+            return _cached_response(request, status, headers, body)
+
+        # Запись устарела: спрашиваем сервер, изменился ли ответ
+        if headers.get("etag"):
+            request.headers["If-None-Match"] = headers["etag"]
+        if headers.get("last-modified"):
+            request.headers["If-Modified-Since"] = headers["last-modified"]
+
+    response = await client.send(request)
+
+    if entry and response.status_code == 304:
+        cache.stats["revalidated"] += 1
+        HTTP_CACHE.inc(result="revalidated")
+        await asyncio.to_thread(cache.extend, key, ttl)
+        return _cached_response(request, entry[0], entry[1], entry[2])
+
+    cache.stats["misses"] += 1
+    HTTP_CACHE.inc(result="miss")
+    if response.status_code == 200:
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        await asyncio.to_thread(cache.put, key, response.status_code, headers, response.content, ttl)
+    return response
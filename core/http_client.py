@@ -0,0 +1,123 @@
+# core.http_client.py
+import logging
+import re
+import time
+
+import httpx
+
+from config import (
+    MOEX_ISS_URL, TINKOFF_API_URL, T_TOKEN,
+    HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED, MOEX_RPS, TINKOFF_RPS,
+)
+from core.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MOEX = "moex"
+TINKOFF = "tinkoff"
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+_SECURITY_IN_PATH = re.compile(r"/securities/[^/]+")
+
+# Отдельный token bucket на каждый хост: лимиты MOEX и T-Invest не влияют друг на друга
+_buckets: dict[str, TokenBucket] = {
+    MOEX: TokenBucket(MOEX_RPS),
+    TINKOFF: TokenBucket(TINKOFF_RPS),
+}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 включается только если установлен пакет h2 (pip install httpx[http2])."""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("⚠️ HTTP2_ENABLED задан, но пакет h2 не установлен — используем HTTP/1.1")
+        return False
+    return True
+
+
+def _endpoint(host: str, path: str) -> str:
+    """Путь без ISIN/FIGI, чтобы у метрик было ограниченное число меток."""
+    if host == TINKOFF:
+        return path.rsplit("/", 1)[-1]
+    return _SECURITY_IN_PATH.sub("/securities/{isin}", path)
+
+
+def _throttle(host: str):
+    bucket = _buckets[host]
+
+    async def hook(request: httpx.Request) -> None:
+        await bucket.acquire()
+        # Время ожидания в token bucket в задержку запроса не входит
+        request.extensions["started"] = time.perf_counter()
+
+    return hook
+
+
+def _observe(host: str):
+    async def hook(response: httpx.Response) -> None:
+        request = response.request
+        endpoint = _endpoint(host, request.url.path)
+        started = request.extensions.get("started")
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, host=host, endpoint=endpoint)
+        HTTP_REQUESTS.inc(host=host, endpoint=endpoint, status=response.status_code)
+
+    return hook
+
+
+def _build_client(host: str) -> httpx.AsyncClient:
+    headers = {"Accept": "application/json"}
+    if host == MOEX:
+        base_url = MOEX_ISS_URL
+    elif host == TINKOFF:
+        base_url = TINKOFF_API_URL
+        headers["Authorization"] = f"Bearer {T_TOKEN}"
+    else:
+        raise ValueError(f"Неизвестный хост: {host}")
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        event_hooks={"request": [_throttle(host)], "response": [_observe(host)]},
+        http2=_http2_available(),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_client(host: str) -> httpx.AsyncClient:
+    """
+    Возвращает общий клиент для хоста. Соединения переиспользуются между запросами,
+    поэтому TCP+TLS рукопожатие выполняется один раз на соединение пула, а не на каждый вызов.
+    """
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _build_client(host)
+        _clients[host] = client
+    return client
+
+
+def moex_client() -> httpx.AsyncClient:
+    return get_client(MOEX)
+
+
+def tinkoff_client() -> httpx.AsyncClient:
+    return get_client(TINKOFF)
+
+
+async def close_clients(*_) -> None:
+    """Закрывает все пулы. Подходит как post_shutdown-колбэк приложения PTB."""
+    for host, client in list(_clients.items()):
+        await client.aclose()
+        logger.info("🔌 HTTP-клиент %s закрыт", host)
+    _clients.clear()
@@ -0,0 +1,99 @@
+# core.logging_setup.py
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import LOG_FILE, LOG_LEVEL, LOG_LEVELS, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_SAMPLE_PER_MINUTE
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: QueueListener | None = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает не больше `per_minute` записей в минуту с одним и тем же шаблоном сообщения
+    (логгер + строка формата до подстановки аргументов). WARNING и выше проходят всегда.
+    Число отброшенных записей дописывается к первой записи следующей минуты.
+    """
+
+    def __init__(self, per_minute: int):
+        super().__init__()
+        self.per_minute = per_minute
+        self._window = 0
+        self._counts: dict[tuple, int] = {}
+        self._dropped: dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_minute <= 0 or record.levelno >= logging.WARNING:
+            return True
+
+        window = int(time.monotonic() // 60)
+        if window != self._window:
+            self._window = window
+            self._counts.clear()
+
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        if count > self.per_minute:
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+            return False
+
+        dropped = self._dropped.pop(key, 0)
+        if dropped:
+            record.msg = f"{record.msg} [ещё {dropped} таких сообщений пропущено]"
+        return True
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """"httpx=WARNING,database.update=DEBUG" -> {"httpx": 30, "database.update": 10}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging() -> QueueListener:
+    """
+    Корневой логгер пишет только в очередь; файл (с ротацией) и консоль обслуживает QueueListener
+    в отдельном потоке, так что event loop бота не ждёт диска.
+    """
+    global _listener
+    if _listener:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding="utf-8")
+    stream_handler = logging.StreamHandler(sys.stderr)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_PER_MINUTE))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и закрывает файлы."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
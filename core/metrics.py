@@ -0,0 +1,191 @@
+# core.metrics.py
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from typing import Callable
+
+from config import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_registry: list = []
+_server: asyncio.AbstractServer | None = None
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Монотонный счётчик. Значения хранятся в словаре по кортежу меток — без блокировок, event loop один."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe — один bisect и три сложения."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}  # метки -> [счётчики корзин..., +Inf, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, **labels):
+        """Декоратор для корутин: время выполнения попадает в гистограмму, даже если корутина упала."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {state[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Значение, которое читается функцией в момент выгрузки (длина очереди, размер кэша)."""
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        try:
+            value = float(self.func())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Метрики приложения
+HTTP_REQUEST_SECONDS = Histogram(
+    "bondwatch_http_request_seconds", "Время запроса к внешнему API до получения ответа", ("host", "endpoint"))
+HTTP_REQUESTS = Counter(
+    "bondwatch_http_requests_total", "Запросы к внешним API по статусу ответа", ("host", "endpoint", "status"))
+HTTP_CACHE = Counter(
+    "bondwatch_http_cache_total", "Обращения к дисковому HTTP-кэшу", ("result",))
+SCHEDULE_CACHE = Counter(
+    "bondwatch_schedule_cache_total", "Чтение графика выплат из БД вместо MOEX", ("result",))
+BOND_INFO_CACHE = Counter(
+    "bondwatch_bond_info_cache_total", "Ответы кнопки /info из кэша в памяти: hit, stale (обновляется в фоне), miss",
+    ("result",))
+SCHEDULE_SOURCE = Counter(
+    "bondwatch_schedule_source_total", "Источник графика выплат при обновлении (tinkoff — запасной)", ("source",))
+FIGI_LOOKUPS = Counter(
+    "bondwatch_figi_lookups_total", "Поиск FIGI по источнику результата", ("result",))
+JOB_SECONDS = Histogram(
+    "bondwatch_job_duration_seconds", "Длительность периодических задач", ("job",))
+JOB_RUNS = Counter(
+    "bondwatch_job_runs_total", "Запуски периодических задач по результату", ("job", "result"))
+HANDLER_SECONDS = Histogram(
+    "bondwatch_handler_seconds", "Время обработки команды или кнопки бота", ("handler",))
+TELEGRAM_SENDS = Counter(
+    "bondwatch_telegram_sends_total", "Отправка сообщений из очереди outbox по результату", ("result",))
+TELEGRAM_DELIVERY_SECONDS = Histogram(
+    "bondwatch_telegram_delivery_seconds", "Задержка от постановки сообщения в очередь до доставки")
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, но их надо дочитать
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server() -> None:
+    """Поднимает GET /metrics на METRICS_HOST:METRICS_PORT. METRICS_PORT=0 — выключено."""
+    global _server
+    if METRICS_PORT <= 0 or _server:
+        return
+    _server = await asyncio.start_server(_handle, METRICS_HOST, METRICS_PORT)
+    logger.info("📈 Метрики доступны на http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+
+
+async def stop_metrics_server() -> None:
+    global _server
+    if _server:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,35 @@
+# core.rate_limit.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: в среднем не больше `rate` операций в секунду,
+    с всплеском до `capacity`. rate <= 0 отключает ограничение.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+
+        # Ждущие обслуживаются по очереди, чтобы никто не голодал
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
@@ -0,0 +1,107 @@
+# core.scheduler.py
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from telegram.ext import ContextTypes, JobQueue
+
+from config import JOB_JITTER_SECONDS, JOB_MISFIRE_GRACE_SECONDS
+from core.metrics import JOB_SECONDS, JOB_RUNS
+
+logger = logging.getLogger(__name__)
+
+# Статистика по задачам: имя -> счётчики и длительности
+job_stats: dict[str, dict] = {}
+_locks: dict[str, asyncio.Lock] = {}
+_listening: set[int] = set()
+
+
+def _stats(name: str) -> dict:
+    return job_stats.setdefault(name, {
+        "runs": 0,
+        "errors": 0,
+        "skipped": 0,  # предыдущий запуск ещё не закончился
+        "missed": 0,  # event loop был занят дольше JOB_MISFIRE_GRACE_SECONDS
+        "last_run": None,
+        "last_duration": None,
+        "max_duration": 0.0,
+    })
+
+
+def _on_not_run(event) -> None:
+    # id задачи APScheduler совпадает с именем, под которым задача зарегистрирована здесь
+    stats = job_stats.get(event.job_id)
+    if stats is None:
+        return
+    if event.code == EVENT_JOB_MAX_INSTANCES:
+        stats["skipped"] += 1
+        JOB_RUNS.inc(job=event.job_id, result="skipped")
+        logger.warning("⏭ Задача %s ещё выполняется, запуск пропущен", event.job_id)
+    else:
+        stats["missed"] += 1
+        JOB_RUNS.inc(job=event.job_id, result="missed")
+        logger.warning("⏰ Задача %s пропустила запуск (%s)", event.job_id, event.scheduled_run_time)
+
+
+def _single_flight(name: str, func: Callable[..., Awaitable], args: tuple, jitter: float):
+    """Оборачивает корутину в колбэк JobQueue: случайная задержка, не больше одного запуска за раз, замеры."""
+    lock = _locks.setdefault(name, asyncio.Lock())
+    stats = _stats(name)
+
+    async def callback(context: ContextTypes.DEFAULT_TYPE) -> None:
+        if jitter > 0:
+            await asyncio.sleep(random.uniform(0, jitter))
+
+        if lock.locked():
+            stats["skipped"] += 1
+            JOB_RUNS.inc(job=name, result="skipped")
+            logger.warning("⏭ Задача %s ещё выполняется, запуск пропущен", name)
+            return
+
+        async with lock:
+            started = time.monotonic()
+            stats["runs"] += 1
+            stats["last_run"] = datetime.now()
+            result = "ok"
+            try:
+                await func(*args)
+            except Exception as e:
+                result = "error"
+                stats["errors"] += 1
+                logger.error("❌ Задача %s завершилась с ошибкой: %s", name, e, exc_info=e)
+            finally:
+                duration = round(time.monotonic() - started, 2)
+                stats["last_duration"] = duration
+                stats["max_duration"] = max(stats["max_duration"], duration)
+                JOB_SECONDS.observe(duration, job=name)
+                JOB_RUNS.inc(job=name, result=result)
+                logger.info("🕒 Задача %s выполнена за %s c", name, duration)
+
+    return callback
+
+
+def _listen(job_queue: JobQueue) -> None:
+    if id(job_queue) not in _listening:
+        job_queue.scheduler.add_listener(_on_not_run, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        _listening.add(id(job_queue))
+
+
+def run_repeating(job_queue: JobQueue, func: Callable[..., Awaitable], interval: timedelta, *, name: str,
+                  args: tuple = (), first: timedelta | None = None, jitter: float = JOB_JITTER_SECONDS) -> None:
+    """
+    Запускает корутину `func(*args)` каждые `interval` на event loop бота.
+    Перекрывающиеся запуски пропускаются, опоздавшие больше чем на JOB_MISFIRE_GRACE_SECONDS — считаются пропущенными.
+    """
+    _listen(job_queue)
+    job_queue.run_repeating(
+        _single_flight(name, func, args, jitter),
+        interval=interval,
+        first=first if first is not None else interval,
+        name=name,
+        job_kwargs={"id": name, "coalesce": True, "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS},
+    )
+
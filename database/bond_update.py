@@ -1,79 +1,50 @@
 # database.bond_update
-from datetime import datetime, timedelta
-from database.moex_lookup import get_bond_coupons_from_moex
-from bot.notifications import get_bond_coupons_tinkoff
+from datetime import date, datetime, time, timedelta
 import logging
-from sqlalchemy.orm import Session
-from bot.DB import TrackedBond
-
-
-async def get_next_coupon(isin: str, figi: str | None, bond: TrackedBond, session: Session) -> None:
-    today = datetime.today().date()
-    one_year_later = today + timedelta(days=365)
-
-    # Сначала пробуем через Tinkoff
-    if figi:
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.DB import Instrument, COUPON
+from bot.notifications import get_bond_coupons_tinkoff
+from core.bonds import BondEvent
+from core.metrics import SCHEDULE_SOURCE
+from database.bond_utils import tinkoff_events
+from database.crud import replace_coupon_events
+from database.events import fetch_bond_events
+
+logger = logging.getLogger(__name__)
+
+
+async def update_coupon_schedule(instrument: Instrument, session: AsyncSession,
+                                 moex_schedule: list[BondEvent] | None = None) -> bool:
+    """
+    Загружает полный график выплат инструмента (купоны, амортизации, оферты) и сохраняет его
+    в coupon_events. Основной источник — MOEX, купоны из T-Invest запрашиваются, только если MOEX их не знает.
+    График MOEX всегда берётся из сети: сохранённый мог остаться от массовой загрузки, где есть только окно дат.
+    :param moex_schedule: уже полученный из сети график MOEX (если загружали параллельно с поиском FIGI)
+    """
+    if moex_schedule is None:
+        moex_schedule = await fetch_bond_events(instrument.isin, use_cache=False)
+
+    tinkoff_schedule = []
+    if instrument.figi and not any(event.event_type == COUPON for event in moex_schedule):
+        today = datetime.combine(date.today(), time.min)
         try:
-            coupons = await get_bond_coupons_tinkoff(figi, from_date=str(today), to_date=str(one_year_later))
-            upcoming = []
-            for c in coupons:
-                raw_date = c.get("date")
-                if not raw_date:
-                    continue
-                try:
-                    parsed_date = datetime.strptime(raw_date, "%Y-%m-%d").date()
-                    if parsed_date >= today:
-                        c["parsed_date"] = parsed_date
-                        upcoming.append(c)
-                except ValueError:
-                    logging.warning(f"⚠️ Невалидная дата {raw_date} от TINKOFF для {figi}")
-                    continue
-
-            if upcoming:
-                upcoming.sort(key=lambda x: x["parsed_date"])
-                first = upcoming[0]
-                logging.debug(f"💾 Первый купон для сохранения: {first}")
-                bond.next_coupon_date = first["parsed_date"]
-                bond.next_coupon_value = first["value"]
-                session.commit()
-                logging.debug(f"💾 Commit завершён, купон сохранён: {bond.next_coupon_date}, {bond.next_coupon_value}")
-                logging.info(f"✅ Данные купона обновлены через TINKOFF для {bond.isin}")
-                return
+            coupons = await get_bond_coupons_tinkoff(instrument.figi, from_date=today,
+                                                     to_date=today + timedelta(days=365))
+            tinkoff_schedule = tinkoff_events(coupons)
         except Exception as e:
-            logging.warning(f"❌ Tinkoff купоны не получены для {figi}: {e}")
-
-    # Если не получилось — пробуем MOEX
-    try:
-        coupons = await get_bond_coupons_from_moex(isin)
-        logging.debug(f"🧾 Все купоны от MOEX для {isin}: {coupons}")
-
-        upcoming = []
-        for c in coupons:
-            raw_date = c.get("couponDate")
-            if not raw_date:
-                continue
-            try:
-                parsed_date = datetime.strptime(raw_date, "%Y-%m-%d").date()
-                if parsed_date >= today:
-                    c["parsed_date"] = parsed_date
-                    upcoming.append(c)
-            except ValueError:
-                logging.warning(f"⚠️ Невалидная дата {raw_date} от MOEX для {isin}")
-                continue
-
-        logging.debug(f"🔍 Подходящие купоны от MOEX для {isin}: {upcoming}")
-
-        if upcoming:
-            upcoming.sort(key=lambda x: x["parsed_date"])
-            first = upcoming[0]
-            logging.debug(f"💾 Первый купон для сохранения: {first}")
-            bond.next_coupon_date = first["parsed_date"]
-            bond.next_coupon_value = first["couponValue"]
-            session.commit()
-            logging.debug(f"💾 Commit завершён, купон сохранён: {bond.next_coupon_date}, {bond.next_coupon_value}")
-            logging.info(f"✅ Данные купона обновлены через MOEX для {bond.isin}")
-            return
-    except Exception as e:
-        logging.warning(f"❌ MOEX купоны не получены для {isin}: {e}")
-
-    logging.info(f"❌ Купоны не найдены для {isin}")
\ No newline at end of file
+            logger.warning("❌ Tinkoff купоны не получены для %s: %s", instrument.figi, e)
+
+    events = moex_schedule + tinkoff_schedule
+    SCHEDULE_SOURCE.inc(source="tinkoff" if tinkoff_schedule else "moex" if moex_schedule else "none")
+    if not events:
+        logger.info("❌ График выплат не найден для %s", instrument.isin)
+        return False
+
+    await replace_coupon_events(session, instrument.isin, events)
+    if moex_schedule:
+        # Свежим считаем только полный график MOEX: по нему fetch_bond_events отвечает из БД
+        instrument.events_updated_at = datetime.utcnow()
+    await session.commit()
+    logger.debug("✅ График выплат обновлён для %s: %s событий (MOEX: %s, TINKOFF: %s)",
+                 instrument.isin, len(events), len(moex_schedule), len(tinkoff_schedule))
+    return True
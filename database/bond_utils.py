@@ -1,65 +1,67 @@
 # database.bond_utils.py
-from datetime import datetime, timedelta
-from bot.notifications import get_bond_coupons_tinkoff
-from database.moex_lookup import get_bond_coupons_from_moex
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Iterator
 
+from bot.DB import COUPON, AMORTIZATION, OFFER, CouponEvent
+from core.bonds import BondEvent, SOURCE_MOEX, SOURCE_TINKOFF, to_decimal, amount_to_float
+from database.iss import IssTable
 
-async def update_bond_coupon_info(bond, session, logger=print):
-    today = datetime.utcnow()
-    from_date = today
-    to_date = today + timedelta(days=30)
+# Блок bondization.json -> (тип события, поле даты, поле суммы)
+MOEX_EVENT_FIELDS = {
+    "coupons": (COUPON, "coupondate", "value"),
+    "amortizations": (AMORTIZATION, "amortdate", "value"),
+    "offers": (OFFER, "offerdate", "price"),
+}
 
-    logger(f"🚀 Отправляем запрос на Tinkoff с параметрами: ")
-    logger(f"from_date: {from_date}, to_date: {to_date}, instrumentId: {bond.figi}")
+NANO = Decimal(10) ** 9
 
-    events = []
-    try:
-        events = await get_bond_coupons_tinkoff(bond.figi, from_date, to_date)
-        logger(f"✅ Получены данные с Tinkoff: {events}")
-    except Exception as e:
-        logger(f"⚠️ Ошибка при запросе купонов через Tinkoff: {e}")
 
-    if not events:
-        try:
-            events = await get_bond_coupons_from_moex(bond.isin)
-            logger(f"✅ Получены данные с MOEX: {events}")
-        except Exception as e:
-            logger(f"⚠️ Ошибка при запросе купонов через MOEX: {e}")
+# Парсеры источников: по одному на источник, каждый за один проход выдаёт BondEvent
+
+def iter_moex_events(tables: dict[str, IssTable]) -> Iterator[tuple[tuple, BondEvent]]:
+    """
+    Таблицы bondization.json -> пары (строка ISS, событие). Строка нужна сводной загрузке
+    (ISIN и название бумаги); строки без даты пропускаются.
+    """
+    for block, (event_type, date_field, value_field) in MOEX_EVENT_FIELDS.items():
+        for row in tables.get(block, ()):
+            event_date = getattr(row, date_field)
+            if event_date:
+                yield row, BondEvent(event_date, getattr(row, value_field), event_type, SOURCE_MOEX)
+
 
-    if not events:
-        logger("⚠️ Не удалось получить ни одного купонного события. Данные не обновлены.")
-        return  # Не трогаем существующие значения
+def moex_events(tables: dict[str, IssTable]) -> list[BondEvent]:
+    """Таблицы bondization.json по одной бумаге -> события."""
+    return [event for _, event in iter_moex_events(tables)]
 
-    updated = False
-    for event in events:
-        event_date_str = event.get("couponDate") or event.get("COUPONDATE")
-        event_amount_units = event.get("payOneBond", {}).get("units")
-        event_amount_nano = event.get("payOneBond", {}).get("nano")
 
-        logger(f"Обрабатываем купонное событие: {event}")
-        logger(f"Дата купона: {event_date_str}, Сумма (units): {event_amount_units}, Сумма (nano): {event_amount_nano}")
+def tinkoff_events(coupons: list[dict]) -> list[BondEvent]:
+    """Купоны из GetBondCoupons -> события. Сумма складывается из units и nano без потери точности."""
+    events = []
+    for coupon in coupons:
+        raw_date = coupon.get("couponDate")
+        if not raw_date:
+            continue
+
+        pay = coupon.get("payOneBond")
+        amount = Decimal(int(pay.get("units", 0))) + Decimal(int(pay.get("nano", 0))) / NANO if pay else None
+        events.append(BondEvent(date.fromisoformat(raw_date[:10]), amount, COUPON, SOURCE_TINKOFF))
+    return events
 
-        if event_date_str and event_amount_units is not None and event_amount_nano is not None:
-            try:
-                event_date = datetime.fromisoformat(event_date_str.replace("Z", ""))
-                logger(f"✅ Преобразованная дата купона: {event_date}")
 
-                event_amount = int(event_amount_units) + int(event_amount_nano) / 1e9
-                logger(f"✅ Полная сумма купона: {event_amount}")
+def stored_events(rows: Iterable[CouponEvent]) -> list[BondEvent]:
+    """Сохранённый график (coupon_events) -> события с исходным source."""
+    return [BondEvent(row.event_date, to_decimal(row.value), row.event_type, row.source or SOURCE_MOEX)
+            for row in rows]
 
-                if event_date.date() > today.date():
-                    bond.next_coupon_date = event_date.date()
-                    bond.next_coupon_value = event_amount
-                    session.commit()
-                    logger(f"📌 Обновлены данные о купоне: дата = {event_date.date()}, сумма = {event_amount}")
-                    updated = True
-                    break
-                else:
-                    logger(f"⚠️ Купон в прошлом: дата = {event_date.date()}")
-            except Exception as e:
-                logger(f"⚠️ Ошибка при обработке купонного события: {e}")
-        else:
-            logger(f"⚠️ Данные купона некорректны: {event_date_str}, {event_amount_units}, {event_amount_nano}")
 
-    if not updated:
-        logger("⚠️ Все купонные события в прошлом или были некорректны. Данные не обновлены.")
\ No newline at end of file
+def event_row(isin: str, event: BondEvent) -> dict:
+    """Событие -> значения колонок coupon_events."""
+    return {
+        "isin": isin,
+        "event_type": event.event_type,
+        "event_date": event.event_date,
+        "value": amount_to_float(event.amount),
+        "source": event.source,
+    }
@@ -0,0 +1,124 @@
+# database.catalogue.py
+import logging
+import time
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from bot.DB import get_async_session, BondCatalogue, Instrument
+from core.http_client import tinkoff_client
+
+logger = logging.getLogger(__name__)
+
+# Полный список облигаций T-Invest одним запросом
+BONDS_PATH = "/tinkoff.public.invest.api.contract.v1.InstrumentsService/Bonds"
+
+
+class CatalogueEntry(NamedTuple):
+    figi: str
+    class_code: str | None
+    ticker: str | None
+    name: str | None
+    nominal: float | None
+    maturity_date: date | None
+
+
+# ISIN -> запись справочника; заполняется load_bond_catalogue() при старте и после каждой синхронизации
+_catalogue: dict[str, CatalogueEntry] = {}
+
+
+def lookup_bond(isin: str) -> CatalogueEntry | None:
+    """Ищет облигацию в локальном справочнике без обращения к сети."""
+    return _catalogue.get(isin)
+
+
+def _quotation(value: dict | None) -> float | None:
+    if not value:
+        return None
+    return int(value.get("units", 0)) + int(value.get("nano", 0)) / 1e9
+
+
+def _parse_bonds(instruments: list[dict]) -> list[dict]:
+    rows = {}
+    now = datetime.utcnow()
+    for bond in instruments:
+        isin, figi = bond.get("isin"), bond.get("figi")
+        if not isin or not figi:
+            continue
+        maturity = bond.get("maturityDate")
+        rows[isin] = {
+            "isin": isin,
+            "figi": figi,
+            "class_code": bond.get("classCode"),
+            "ticker": bond.get("ticker"),
+            "name": bond.get("name"),
+            "nominal": _quotation(bond.get("nominal")),
+            "maturity_date": date.fromisoformat(maturity.split("T")[0]) if maturity else None,
+            "synced_at": now,
+        }
+    return list(rows.values())
+
+
+def _entry(row) -> CatalogueEntry:
+    return CatalogueEntry(row.figi, row.class_code, row.ticker, row.name, row.nominal, row.maturity_date)
+
+
+async def load_bond_catalogue() -> int:
+    """Загружает справочник из SQLite в память. Возвращает число облигаций."""
+    async with get_async_session() as session:
+        result = await session.execute(select(BondCatalogue))
+        _catalogue.clear()
+        _catalogue.update({row.isin: _entry(row) for row in result.scalars()})
+    logger.info("📚 Справочник облигаций T-Invest загружен: %s бумаг", len(_catalogue))
+    return len(_catalogue)
+
+
+async def sync_bond_catalogue() -> dict:
+    """
+    Скачивает полный список облигаций T-Invest, сохраняет его в bond_catalogue и обновляет индекс в памяти.
+    Инструментам без FIGI сразу проставляются figi / class_code (и название, если его нет) из справочника.
+    """
+    started = time.monotonic()
+    response = await tinkoff_client().post(BONDS_PATH, json={"instrumentStatus": "INSTRUMENT_STATUS_ALL"})
+    response.raise_for_status()
+    rows = _parse_bonds(response.json().get("instruments", []))
+
+    async with get_async_session() as session:
+        if rows:
+            upsert = sqlite_insert(BondCatalogue)
+            await session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[BondCatalogue.isin],
+                    set_={column: upsert.excluded[column] for column in rows[0] if column != "isin"},
+                ),
+                rows,
+            )
+            # Бумаги, исчезнувшие из справочника, удаляем
+            await session.execute(delete(BondCatalogue).where(BondCatalogue.synced_at < rows[0]["synced_at"]))
+
+        resolved = await session.execute(
+            update(Instrument)
+            .where(Instrument.figi.is_(None), Instrument.isin == BondCatalogue.isin)
+            .values(
+                figi=BondCatalogue.figi,
+                class_code=BondCatalogue.class_code,
+                name=func.coalesce(Instrument.name, BondCatalogue.name),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    await load_bond_catalogue()
+
+    stats = {
+        "bonds": len(rows),
+        "resolved": resolved.rowcount,
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+    logger.info(
+        "📚 Справочник облигаций T-Invest синхронизирован: %s бумаг, FIGI проставлен %s инструментам (%s c)",
+        stats["bonds"], stats["resolved"], stats["elapsed"]
+    )
+    return stats
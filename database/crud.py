@@ -0,0 +1,114 @@
+# database.crud.py
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.DB import Instrument, CouponEvent, TrackedBond, User, COUPON
+from core.bonds import BondEvent, amount_to_float
+
+
+async def get_or_create_instrument(session: AsyncSession, isin: str, name: str | None = None) -> Instrument:
+    """
+    Инструмент по ISIN, при необходимости созданный. INSERT ... ON CONFLICT DO NOTHING: параллельный /add
+    той же новой бумаги другим пользователем не падает на уникальности instruments.isin.
+    """
+    instrument = await session.get(Instrument, isin)
+    if not instrument:
+        await session.execute(
+            sqlite_insert(Instrument).values(isin=isin, name=name)
+            .on_conflict_do_nothing(index_elements=[Instrument.isin])
+        )
+        instrument = await session.get(Instrument, isin)
+    if name and not instrument.name:
+        instrument.name = name
+    return instrument
+
+
+async def has_coupon_events(session: AsyncSession, isin: str) -> bool:
+    result = await session.execute(select(CouponEvent.id).where(CouponEvent.isin == isin).limit(1))
+    return result.first() is not None
+
+
+async def replace_coupon_events(session: AsyncSession, isin: str, events: list[BondEvent]) -> None:
+    """Заменяет сохранённый график выплат инструмента новым (без commit). Первое событие на дату побеждает."""
+    await session.execute(delete(CouponEvent).where(CouponEvent.isin == isin))
+    seen = set()
+    for event in events:
+        key = (event.event_type, event.event_date)
+        if key in seen:
+            continue
+        seen.add(key)
+        session.add(CouponEvent(isin=isin, event_type=event.event_type, event_date=event.event_date,
+                                value=amount_to_float(event.amount), source=event.source))
+
+
+async def get_next_events(session: AsyncSession, isins: list[str], on_or_after: date,
+                          event_type: str = COUPON) -> dict[str, CouponEvent]:
+    """Ближайшее событие заданного типа по каждому ISIN — одним запросом."""
+    if not isins:
+        return {}
+
+    nearest = select(
+        CouponEvent.isin, func.min(CouponEvent.event_date).label("event_date")
+    ).where(
+        CouponEvent.isin.in_(isins),
+        CouponEvent.event_type == event_type,
+        CouponEvent.event_date >= on_or_after,
+    ).group_by(CouponEvent.isin).subquery()
+
+    result = await session.execute(select(CouponEvent).join(nearest, and_(
+        CouponEvent.isin == nearest.c.isin,
+        CouponEvent.event_date == nearest.c.event_date,
+    )).where(CouponEvent.event_type == event_type))
+    return {event.isin: event for event in result.scalars()}
+
+
+async def get_future_events(session: AsyncSession, isins: list[str], after: date) -> dict[str, list[CouponEvent]]:
+    """Весь оставшийся график выплат по каждому ISIN (события после `after`, по датам) — одним запросом."""
+    schedules = {isin: [] for isin in isins}
+    if not isins:
+        return schedules
+    result = await session.execute(select(CouponEvent).where(
+        CouponEvent.isin.in_(isins), CouponEvent.event_date > after
+    ).order_by(CouponEvent.isin, CouponEvent.event_date))
+    for event in result.scalars():
+        schedules[event.isin].append(event)
+    return schedules
+
+
+async def get_events_between(session: AsyncSession, start: date, end: date, isin: str | None = None,
+                             user_id: int | None = None, digest_mode: str | None = None) -> list[tuple]:
+    """
+    События всех отслеживаемых бумаг с датой в [start, end] вместе с подписчиками:
+    кортежи (user_id, isin, event_type, event_date, value), упорядоченные по пользователю и дате.
+    Идёт по индексу event_date. digest_mode оставляет только пользователей с этой настройкой.
+    """
+    query = select(
+        TrackedBond.user_id, CouponEvent.isin, CouponEvent.event_type, CouponEvent.event_date, CouponEvent.value
+    ).join(CouponEvent, CouponEvent.isin == TrackedBond.isin).where(
+        CouponEvent.event_date >= start, CouponEvent.event_date <= end
+    )
+    if isin:
+        query = query.where(CouponEvent.isin == isin)
+    if user_id is not None:
+        query = query.where(TrackedBond.user_id == user_id)
+    if digest_mode:
+        query = query.join(User, User.tg_id == TrackedBond.user_id).where(User.digest_mode == digest_mode)
+    result = await session.execute(query.order_by(TrackedBond.user_id, CouponEvent.event_date))
+    return [tuple(row) for row in result]
+
+
+async def get_cached_schedule(session: AsyncSession, isin: str, max_age: timedelta) -> list[CouponEvent] | None:
+    """Сохранённый график выплат, если он сверялся не раньше `max_age` назад, иначе None."""
+    instrument = await session.get(Instrument, isin)
+    if not instrument or not instrument.events_updated_at:
+        return None
+    if instrument.events_updated_at < datetime.utcnow() - max_age:
+        return None
+
+    result = await session.execute(
+        select(CouponEvent).where(CouponEvent.isin == isin).order_by(CouponEvent.event_date)
+    )
+    return list(result.scalars())
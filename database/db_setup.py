@@ -0,0 +1,32 @@
+# database.db_setup.py
+from sqlalchemy import event
+
+from config import SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS
+
+# Применяются к каждому новому соединению
+SQLITE_PRAGMAS = {
+    # WAL: читатели не блокируют писателя и наоборот
+    "journal_mode": "WAL",
+    # В режиме WAL NORMAL безопасен при падении процесса и не делает fsync на каждый commit
+    "synchronous": SQLITE_SYNCHRONOUS,
+    # Ждём освобождения блокировки вместо мгновенного "database is locked"
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    # Отрицательное значение — размер кэша страниц в КиБ
+    "cache_size": -SQLITE_CACHE_SIZE_KB,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": "MEMORY",
+}
+
+
+def _apply_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite(engine) -> None:
+    """Вешает настройку PRAGMA на событие connect. Для AsyncEngine передавать engine.sync_engine."""
+    event.listen(engine, "connect", _apply_pragmas)
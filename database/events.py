@@ -1,62 +1,45 @@
-from datetime import datetime
-import asyncio
-import httpx
+from datetime import timedelta
 import logging
-import json
-from typing import Dict, List
+
+from bot.DB import get_async_session
+from config import SCHEDULE_CACHE_TTL_HOURS
+from core.bonds import BondEvent
+from core.metrics import SCHEDULE_CACHE
+from database.bond_utils import moex_events, stored_events
+from database.crud import get_cached_schedule
+from database.iss import fetch_iss, SECURITY_BONDIZATION_BLOCKS
+
+logger = logging.getLogger(__name__)
 
 # Параметры запроса
-URL_TEMPLATE = "https://iss.moex.com/iss/securities/{}/bondization.json"
-EVENT_TYPES = ["amortizations", "coupons", "offers"]
+URL_TEMPLATE = "/iss/securities/{}/bondization.json"
+
+
+async def _read_cached_events(isin: str) -> list[BondEvent] | None:
+    """Свежий сохранённый график выплат; None — нужно идти в сеть."""
+    async with get_async_session() as session:
+        events = await get_cached_schedule(session, isin, timedelta(hours=SCHEDULE_CACHE_TTL_HOURS))
+    return stored_events(events) if events else None
 
 
-async def fetch_bond_events(isin: str) -> Dict[str, List]:
+async def fetch_bond_events(isin: str, use_cache: bool = True) -> list[BondEvent]:
     """
     Получает информацию о событиях облигации (амортизации, купоны, оферты) по ISIN с МосБиржи.
+    Если график бумаги недавно загружен (массовой загрузкой или обновлением) — читает его из БД.
     :param isin: Уникальный номер облигации (ISIN)
-    :return: Словарь с событиями облигации
+    :param use_cache: False — всегда запрашивать MOEX
+    :return: События облигации в порядке дат
     """
-    url = URL_TEMPLATE.format(isin)
+    if use_cache:
+        cached = await _read_cached_events(isin)
+        SCHEDULE_CACHE.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            # Распаковка и формирование итогового результата
-            result = {}
-            for event_type in EVENT_TYPES:
-                metadata = data[event_type].get("metadata", {})
-                columns = data[event_type].get("columns", [])
-                rows = data[event_type].get("data", [])
-
-                # Формируем список событий
-                events = []
-                for row in rows:
-                    event = dict(zip(columns, row))
-
-                    # Конвертируем даты и очищаем лишние поля
-                    for key in event.keys():
-                        if "date" in key.lower() and isinstance(event[key], str):
-                            event[key] = convert_date(event[key])
-
-                    events.append(event)
-
-                result[event_type] = events
-
-            return result
+        tables = await fetch_iss(URL_TEMPLATE.format(isin), SECURITY_BONDIZATION_BLOCKS, {"limit": "unlimited"})
     except Exception as e:
-        logging.error(f"Ошибка при получении событий облигации {isin}: {e}")
-        return {}
-
+        logger.error("Ошибка при получении событий облигации %s: %s", isin, e)
+        return []
 
-def convert_date(date_string: str) -> str:
-    """
-    Преобразование даты из формата YYYY-MM-DD в формат DD.MM.YYYY.
-    """
-    try:
-        dt = datetime.strptime(date_string, "%Y-%m-%d")
-        return dt.strftime("%d.%m.%Y")
-    except ValueError:
-        return date_string
+    return sorted(moex_events(tables), key=lambda event: event.event_date)
@@ -1,50 +1,144 @@
 # database.figi_lookup.py
-import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
 import httpx
-from dotenv import load_dotenv
 
-load_dotenv()
-TOKEN = os.getenv("T_TOKEN")
+from bot.DB import get_async_session, FigiResolution
+from config import FIGI_NEGATIVE_TTL_HOURS
+from core.http_client import tinkoff_client
+from core.metrics import FIGI_LOOKUPS
+from database.catalogue import lookup_bond
 
+logger = logging.getLogger(__name__)
+
+BOND_BY_PATH = "/tinkoff.public.invest.api.contract.v1.InstrumentsService/BondBy"
+CLASS_CODES = ["TQCB", "TQOB", "TQOD", "TQIR"]
+# Ответ T-Invest «инструмент не найден»: HTTP 400 с кодом ошибки 50002 в message
+INSTRUMENT_NOT_FOUND = "50002"
+
+
+class ProbeError(ValueError):
+    """T-Invest не ответил по части classCode — FIGI неизвестен, но и «не найден» не записываем."""
+
+
+def _is_not_found(response: httpx.Response) -> bool:
+    if response.status_code == 404:
+        return True
+    if response.status_code != 400:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and str(body.get("message")) == INSTRUMENT_NOT_FOUND
 
-async def get_figi_by_ticker_and_classcode(ticker: str, default_class_code: str = "TQCB") -> str:
-    url = "https://invest-public-api.tinkoff.ru/rest/tinkoff.public.invest.api.contract.v1.InstrumentsService/BondBy"
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Authorization": f"Bearer {TOKEN}"
+async def _probe(client: httpx.AsyncClient, ticker: str,
+                 class_code: str) -> tuple[str, str, str] | Exception | None:
+    """
+    (figi, class_code, name) — бумага найдена, None — в этом classCode её нет (404 или 400/50002).
+    Сетевую ошибку, любой другой код ответа или битый ответ возвращает (как gather с return_exceptions),
+    а не бросает: иначе одна упавшая проба отменила бы остальные в `_probe_class_codes`.
+    """
+    payload = {
+        "idType": "INSTRUMENT_ID_TYPE_TICKER",
+        "classCode": class_code,
+        "id": ticker
     }
+    try:
+        response = await client.post(BOND_BY_PATH, json=payload)
+        response.raise_for_status()
+        instrument = response.json()["instrument"]
+        return instrument["figi"], class_code, instrument["name"]
+    except httpx.HTTPStatusError as e:
+        # 429, 401/403 и 5xx о бумаге ничего не говорят — иначе троттлинг на неделю спрятал бы FIGI
+        return None if _is_not_found(e.response) else e
+    except KeyError:
+        return None
+    except (httpx.HTTPError, ValueError) as e:
+        return e
 
-    class_codes_to_try = [default_class_code, "TQOB", "TQOD", "TQIR"]
 
-    for class_code in class_codes_to_try:
-        payload = {
-            "idType": "INSTRUMENT_ID_TYPE_TICKER",
-            "classCode": class_code,
-            "id": ticker
-        }
+async def _probe_class_codes(ticker: str, class_codes: list[str]) -> tuple[str, str, str] | None:
+    """
+    Опрашивает все classCode параллельно; побеждает первый успешный, остальные отменяются.
+    None — бумаги нет ни в одном classCode. Если хоть одна проба упала, а остальные бумагу не нашли,
+    ответа «не найдена» у нас нет — бросаем ProbeError, чтобы не записывать его в кэш.
+    """
+    client = tinkoff_client()
+    tasks = [asyncio.create_task(_probe(client, ticker, class_code)) for class_code in class_codes]
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if isinstance(result, Exception):
+                errors.append(result)
+            elif result:
+                return result
+        if errors:
+            raise ProbeError(f"❌ Не удалось проверить тикер {ticker} в {len(errors)} classCode: {errors[0]!r}")
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _save_resolution(isin: str, figi: str | None, class_code: str | None, name: str | None) -> None:
+    now = datetime.utcnow()
+    async with get_async_session() as session:
+        resolution = await session.get(FigiResolution, isin) or FigiResolution(isin=isin)
+        resolution.figi = figi
+        resolution.class_code = class_code
+        resolution.name = name
+        resolution.resolved_at = now
+        resolution.retry_after = None if figi else now + timedelta(hours=FIGI_NEGATIVE_TTL_HOURS)
+        session.add(resolution)
+        await session.commit()
+
+
+async def get_figi_by_ticker_and_classcode(ticker: str, default_class_code: str = "TQCB") -> str:
+    from database.update import update_tracked_bond_figi, mark_bond_as_not_found  # ⬅️ импорт внутрь
+
+    # Сначала локальный справочник T-Invest — без сетевых запросов
+    entry = lookup_bond(ticker)
+    if entry:
+        FIGI_LOOKUPS.inc(result="catalogue")
+        await update_tracked_bond_figi(ticker, entry.figi, entry.class_code, entry.name)
+        return entry.figi
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+    async with get_async_session() as session:
+        cached = await session.get(FigiResolution, ticker)
 
-                instrument = data["instrument"]
-                figi = instrument["figi"]
-                name = instrument["name"]
+    if cached and cached.figi:
+        FIGI_LOOKUPS.inc(result="cached")
+        await update_tracked_bond_figi(ticker, cached.figi, cached.class_code, cached.name)
+        return cached.figi
 
-                from database.update import update_tracked_bond_figi  # ⬅️ импорт внутрь
-                await update_tracked_bond_figi(ticker, figi, class_code, name)
+    if cached and cached.retry_after and cached.retry_after > datetime.utcnow():
+        # Недавно уже искали и не нашли — не повторяем все запросы до истечения TTL
+        FIGI_LOOKUPS.inc(result="cached_not_found")
+        raise ValueError(f"❌ FIGI для тикера {ticker} не найден (повторим после {cached.retry_after:%Y-%m-%d %H:%M})")
 
-                return figi
+    class_codes_to_try = [default_class_code] + [code for code in CLASS_CODES if code != default_class_code]
+    try:
+        result = await _probe_class_codes(ticker, class_codes_to_try)
+    except ProbeError:
+        FIGI_LOOKUPS.inc(result="error")
+        raise
 
-            except (httpx.HTTPStatusError, KeyError):
-                continue  # Пробуем следующий classCode
+    if result:
+        figi, class_code, name = result
+        FIGI_LOOKUPS.inc(result="network")
+        await _save_resolution(ticker, figi, class_code, name)
+        await update_tracked_bond_figi(ticker, figi, class_code, name)
+        return figi
 
     # Если ни один classCode не сработал — записываем как не найденную
-    from database.update import mark_bond_as_not_found
+    FIGI_LOOKUPS.inc(result="not_found")
+    logger.info("🔍 FIGI для %s не найден, следующая попытка через %s ч", ticker, FIGI_NEGATIVE_TTL_HOURS)
+    await _save_resolution(ticker, None, None, None)
     await mark_bond_as_not_found(ticker)
 
     raise ValueError(f"❌ Не удалось найти FIGI для тикера {ticker}")
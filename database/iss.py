@@ -0,0 +1,164 @@
+# database.iss.py
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Iterator, NamedTuple
+
+from core.http_cache import cached_get
+from core.http_client import MOEX
+
+
+def iss_date(raw) -> date | None:
+    try:
+        return date.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None  # MOEX отдаёт "0000-00-00" для неизвестных дат
+
+
+def iss_float(raw) -> float | None:
+    return float(raw) if raw is not None else None
+
+
+def iss_decimal(raw) -> Decimal | None:
+    # Суммы — через строку, чтобы 35.4 не превратилось в 35.39999...
+    return Decimal(str(raw)) if raw is not None else None
+
+
+def iss_str(raw) -> str | None:
+    return str(raw) if raw is not None else None
+
+
+# Записи ISS: имена полей совпадают с колонками MOEX — по ним же строится `<блок>.columns`
+class CouponRow(NamedTuple):
+    isin: str | None
+    name: str | None
+    coupondate: date | None
+    value: Decimal | None
+    valueprc: float | None
+
+
+class AmortizationRow(NamedTuple):
+    isin: str | None
+    name: str | None
+    amortdate: date | None
+    value: Decimal | None
+
+
+class OfferRow(NamedTuple):
+    isin: str | None
+    name: str | None
+    offerdate: date | None
+    price: Decimal | None
+
+
+class DescriptionRow(NamedTuple):
+    name: str | None
+    value: str | None
+
+
+class CursorRow(NamedTuple):
+    INDEX: float | None
+    TOTAL: float | None
+    PAGESIZE: float | None
+
+
+class MarketSecurityRow(NamedTuple):
+    SECID: str | None
+    BOARDID: str | None
+    ISIN: str | None
+    FACEVALUE: float | None
+    PREVPRICE: float | None
+    ACCRUEDINT: float | None
+
+
+class MarketDataRow(NamedTuple):
+    SECID: str | None
+    BOARDID: str | None
+    LAST: float | None
+
+
+class Block(NamedTuple):
+    """
+    Блок ответа ISS: тип записи и преобразователи колонок в том же порядке, что и поля записи.
+    `skip` — поля записи, которые не запрашиваются (в записи будут None).
+    """
+    record: type
+    converters: tuple[Callable, ...]
+    skip: frozenset = frozenset()
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return tuple(field for field in self.record._fields if field not in self.skip)
+
+    def without(self, *fields: str) -> "Block":
+        return self._replace(skip=self.skip | frozenset(fields))
+
+
+COUPONS = Block(CouponRow, (iss_str, iss_str, iss_date, iss_decimal, iss_float))
+AMORTIZATIONS = Block(AmortizationRow, (iss_str, iss_str, iss_date, iss_decimal))
+OFFERS = Block(OfferRow, (iss_str, iss_str, iss_date, iss_decimal))
+DESCRIPTION = Block(DescriptionRow, (iss_str, iss_str))
+CURSOR = Block(CursorRow, (iss_float, iss_float, iss_float))
+MARKET_SECURITIES = Block(MarketSecurityRow, (iss_str, iss_str, iss_str, iss_float, iss_float, iss_float))
+MARKET_DATA = Block(MarketDataRow, (iss_str, iss_str, iss_float))
+
+# Блоки bondization.json по всему рынку
+BONDIZATION_BLOCKS = {
+    "coupons": COUPONS,
+    "amortizations": AMORTIZATIONS,
+    "offers": OFFERS,
+}
+# По одной бумаге название в каждой строке не нужно
+SECURITY_BONDIZATION_BLOCKS = {block: spec.without("name") for block, spec in BONDIZATION_BLOCKS.items()}
+
+
+class IssTable:
+    """
+    Строки одного блока ответа. Записи собираются только при обходе, и преобразуются только
+    нужные колонки — сырые списки из JSON никуда не копируются.
+    """
+
+    def __init__(self, block: Block, payload: dict):
+        self._block = block
+        self._rows = payload.get("data", [])
+        columns = payload.get("columns", [])
+        # Незапрошенное поле или колонка, которую MOEX не вернул, — в записи None
+        self._index = [columns.index(field) if field in columns and field not in block.skip else None
+                       for field in block.record._fields]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __bool__(self) -> bool:
+        return bool(self._rows)
+
+    def __iter__(self) -> Iterator[tuple]:
+        record, converters, index = self._block.record, self._block.converters, self._index
+        for row in self._rows:
+            yield record(*(convert(row[i]) if i is not None else None for convert, i in zip(converters, index)))
+
+    def first(self) -> tuple | None:
+        return next(iter(self), None)
+
+
+def iss_params(blocks: dict[str, Block], params: dict | None = None) -> dict:
+    """Параметры запроса: только нужные блоки и колонки, без метаданных, в компактном формате."""
+    query = {
+        "iss.meta": "off",
+        "iss.json": "compact",
+        "iss.only": ",".join(blocks),
+    }
+    for name, block in blocks.items():
+        query[f"{name}.columns"] = ",".join(block.columns)
+    query.update(params or {})
+    return query
+
+
+async def fetch_iss(path: str, blocks: dict[str, Block], params: dict | None = None) -> dict[str, IssTable]:
+    """
+    GET к MOEX ISS (через дисковый кэш) с выборкой только нужных блоков и колонок.
+    Возвращает {блок: IssTable}; отсутствующий в ответе блок — пустая таблица.
+    """
+    response = await cached_get(MOEX, path, params=iss_params(blocks, params))
+    response.raise_for_status()
+    data = response.json()
+    return {name: IssTable(block, data.get(name, {})) for name, block in blocks.items()}
@@ -0,0 +1,105 @@
+# database.migrations.py
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version
+SCHEMA_VERSION = 4
+
+
+def _normalize_instruments(conn) -> None:
+    """
+    v1: данные бумаги (name, figi, class_code, ticker, next_coupon_*) переезжают из каждой подписки
+    в общие таблицы instruments и coupon_events, а tracked_bonds становится связкой (user, isin).
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns("tracked_bonds")}
+    if "name" not in columns:
+        return  # Таблица уже в новом формате
+
+    conn.execute(text("""
+        INSERT OR IGNORE INTO instruments (isin, name, figi, class_code, ticker, last_updated)
+        SELECT isin, MAX(name), MAX(figi), MAX(class_code), MAX(ticker), MAX(last_updated)
+        FROM tracked_bonds
+        GROUP BY isin
+    """))
+    conn.execute(text("""
+        INSERT OR IGNORE INTO coupon_events (isin, event_type, event_date, value, source)
+        SELECT isin, 'COUPON', next_coupon_date, MAX(next_coupon_value), 'LEGACY'
+        FROM tracked_bonds
+        WHERE next_coupon_date IS NOT NULL
+        GROUP BY isin, next_coupon_date
+    """))
+
+    conn.execute(text("ALTER TABLE tracked_bonds RENAME TO tracked_bonds_legacy"))
+    conn.execute(text("""
+        CREATE TABLE tracked_bonds (
+            id INTEGER NOT NULL PRIMARY KEY,
+            user_id BIGINT REFERENCES users (tg_id),
+            isin VARCHAR NOT NULL REFERENCES instruments (isin),
+            added_at DATETIME
+        )
+    """))
+    conn.execute(text("""
+        INSERT INTO tracked_bonds (id, user_id, isin, added_at)
+        SELECT id, user_id, isin, added_at FROM tracked_bonds_legacy
+    """))
+    conn.execute(text("DROP TABLE tracked_bonds_legacy"))
+
+
+def _add_lookup_indexes(conn) -> None:
+    """
+    v2: индексы на горячие выборки и уникальность подписки (user_id, isin).
+    Дубликаты подписок, накопившиеся без ограничения, схлопываются до самой ранней.
+    """
+    conn.execute(text("""
+        DELETE FROM tracked_bonds
+        WHERE id NOT IN (SELECT MIN(id) FROM tracked_bonds GROUP BY user_id, isin)
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_tracked_bonds_user_isin ON tracked_bonds (user_id, isin)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tracked_bonds_isin ON tracked_bonds (isin)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_instruments_last_updated ON instruments (last_updated)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_coupon_events_event_date ON coupon_events (event_date)"))
+
+
+def _add_events_updated_at(conn) -> None:
+    """v3: отметка свежести графика выплат — по ней читатели решают, идти ли в сеть."""
+    columns = {column["name"] for column in inspect(conn).get_columns("instruments")}
+    if "events_updated_at" not in columns:
+        conn.execute(text("ALTER TABLE instruments ADD COLUMN events_updated_at DATETIME"))
+
+
+def _add_digest_mode(conn) -> None:
+    """v4: настройка пользователя — напоминания сразу или сводкой раз в день / неделю."""
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "digest_mode" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN digest_mode VARCHAR NOT NULL DEFAULT 'immediate'"))
+
+
+MIGRATIONS = {
+    1: _normalize_instruments,
+    2: _add_lookup_indexes,
+    3: _add_events_updated_at,
+    4: _add_digest_mode,
+}
+
+
+def stamp_schema_version(engine, version: int = SCHEMA_VERSION) -> None:
+    """Помечает только что созданную базу актуальной версией схемы."""
+    with engine.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def run_migrations(engine) -> None:
+    """Последовательно применяет к существующей базе все миграции новее её версии."""
+    with engine.begin() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar() or 0
+        for target in sorted(MIGRATIONS):
+            if target <= version:
+                continue
+            logger.info("🛠 Миграция БД до версии %s...", target)
+            MIGRATIONS[target](conn)
+            conn.execute(text(f"PRAGMA user_version = {int(target)}"))
@@ -0,0 +1,119 @@
+# database.moex_bulk.py
+import logging
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from bot.DB import get_async_session, Instrument, CouponEvent
+from config import MOEX_BULK_PAGE_SIZE, MOEX_BULK_WINDOW_DAYS
+from core.bonds import SOURCE_MOEX, SOURCE_TINKOFF
+from database.bond_utils import MOEX_EVENT_FIELDS, iter_moex_events, event_row
+from database.iss import fetch_iss, BONDIZATION_BLOCKS, CURSOR
+
+logger = logging.getLogger(__name__)
+
+# Сводные купоны, амортизации и оферты по всему рынку облигаций за период, с постраничной выдачей
+BULK_BONDIZATION_PATH = "/iss/statistics/engines/stock/markets/bonds/bondization.json"
+
+
+async def fetch_market_bondization(from_date: date, till_date: date) -> tuple[list[dict], dict[str, str], int]:
+    """
+    Скачивает события всех облигаций рынка в окне [from_date, till_date].
+    Возвращает (события, {isin: название}, число запросов). Блоки, которые уже кончились,
+    в следующих страницах не запрашиваются.
+    """
+    pending = list(MOEX_EVENT_FIELDS)
+    events, names = [], {}
+    start, requests = 0, 0
+
+    while pending:
+        blocks = {block: BONDIZATION_BLOCKS[block] for block in pending}
+        blocks.update({f"{block}.cursor": CURSOR for block in pending})
+        tables = await fetch_iss(BULK_BONDIZATION_PATH, blocks, {
+            "from": from_date.isoformat(),
+            "till": till_date.isoformat(),
+            "start": start,
+            "limit": MOEX_BULK_PAGE_SIZE,
+        })
+        requests += 1
+
+        for row, event in iter_moex_events(tables):
+            if not row.isin:
+                continue
+            if row.name:
+                names.setdefault(row.isin, row.name)
+            events.append(event_row(row.isin, event))
+
+        still_pending = []
+        for block in pending:
+            rows = tables[block]
+            # Курсор блока: INDEX, TOTAL, PAGESIZE. Без него — ориентируемся на неполную страницу
+            cursor = tables[f"{block}.cursor"].first()
+            total = cursor.TOTAL if cursor else None
+            has_more = len(rows) >= MOEX_BULK_PAGE_SIZE if total is None else start + len(rows) < total
+            if rows and has_more:
+                still_pending.append(block)
+
+        pending = still_pending
+        start += MOEX_BULK_PAGE_SIZE
+
+    return events, names, requests
+
+
+async def ingest_market_bondization(from_date: date | None = None, till_date: date | None = None) -> dict:
+    """
+    Загружает графики выплат всего рынка за окно и записывает их в instruments / coupon_events.
+    MOEX-события окна заменяются целиком; купоны из T-Invest не перезаписываются.
+    События за пределами окна здесь не видны, поэтому events_updated_at не трогаем: свежим график
+    помечает только полная загрузка по бумаге (database/bond_update.py).
+    """
+    from_date = from_date or date.today()
+    till_date = till_date or from_date + timedelta(days=MOEX_BULK_WINDOW_DAYS)
+
+    started = time.monotonic()
+    events, names, requests = await fetch_market_bondization(from_date, till_date)
+    isins = {event["isin"] for event in events}
+
+    async with get_async_session() as session:
+        if isins:
+            instruments = sqlite_insert(Instrument)
+            await session.execute(
+                instruments.on_conflict_do_update(
+                    index_elements=[Instrument.isin],
+                    set_={"name": func.coalesce(Instrument.name, instruments.excluded.name)},
+                ),
+                [{"isin": isin, "name": names.get(isin)} for isin in isins],
+            )
+
+        await session.execute(delete(CouponEvent).where(
+            CouponEvent.source == SOURCE_MOEX,
+            CouponEvent.isin.in_(isins),
+            CouponEvent.event_date >= from_date,
+            CouponEvent.event_date <= till_date,
+        ))
+
+        if events:
+            upsert = sqlite_insert(CouponEvent)
+            await session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[CouponEvent.isin, CouponEvent.event_type, CouponEvent.event_date],
+                    set_={"value": upsert.excluded.value, "source": upsert.excluded.source},
+                    where=CouponEvent.source != SOURCE_TINKOFF,
+                ),
+                events,
+            )
+        await session.commit()
+
+    stats = {
+        "requests": requests,
+        "instruments": len(isins),
+        "events": len(events),
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+    logger.info(
+        "📥 Графики выплат MOEX за %s..%s загружены: %s событий по %s бумагам за %s запросов (%s c)",
+        from_date, till_date, stats["events"], stats["instruments"], stats["requests"], stats["elapsed"]
+    )
+    return stats
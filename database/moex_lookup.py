@@ -1,56 +1,38 @@
 # database.moex_lookup.py
-import httpx
 import logging
-import json
+from datetime import timedelta
 
+from bot.DB import get_async_session, COUPON
+from config import SCHEDULE_CACHE_TTL_HOURS
+from core.bonds import BondEvent
+from database.bond_utils import moex_events, stored_events
+from database.crud import get_cached_schedule
+from database.iss import fetch_iss, COUPONS
 
-async def get_bond_coupons_from_moex(isin: str):
-    """Получение купонов облигации с MOEX по ISIN через bondization.json."""
-    url = f"https://iss.moex.com/iss/securities/{isin}/bondization.json"
+logger = logging.getLogger(__name__)
 
-    try:
-        logging.info(f"🔄 Отправка запроса к MOEX для ISIN {isin} по URL: {url}")
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-        # Логируем весь JSON-ответ (можно частично, если слишком много)
-        logging.info(f"📦 Ответ от MOEX для {isin}: {json.dumps(data, indent=2, ensure_ascii=False)[:3000]}...")
-
-        coupons_metadata = data.get("coupons", {}).get("columns", [])
-        coupons_data = data.get("coupons", {}).get("data", [])
 
-        # Безопасное определение индексов для нужных данных
-        try:
-            idx_coupondate = coupons_metadata.index("coupondate")  # Дата купона
-            idx_value = coupons_metadata.index("value")  # Сумма купона
-            idx_percent = coupons_metadata.index("valueprc")  # Процент купона
-        except ValueError as e:
-            logging.error(f"❌ Не найдены нужные поля в bondization.json для {isin}: {e}")
-            return []
+async def get_bond_coupons_from_moex(isin: str, use_cache: bool = True) -> list[BondEvent]:
+    """
+    Получение купонов облигации с MOEX по ISIN через bondization.json.
+    Свежий сохранённый график (см. database/moex_bulk.py) читается из БД без запроса к MOEX.
+    """
+    if use_cache:
+        async with get_async_session() as session:
+            events = await get_cached_schedule(session, isin, timedelta(hours=SCHEDULE_CACHE_TTL_HOURS))
+        coupons = [event for event in stored_events(events or []) if event.event_type == COUPON]
+        if coupons:
+            return coupons
 
-        coupons = []
-        for row in coupons_data:
-            coupon_date = row[idx_coupondate]
-            coupon_value = row[idx_value] or 0
-            coupon_percent = row[idx_percent] or 0
+    url = f"/iss/securities/{isin}/bondization.json"
 
-            if not coupon_date:
-                logging.warning(f"⚠️ Пропущена строка с отсутствующей датой купона для {isin}")
-                continue  # Пропускаем строки без даты
-
-            coupons.append({
-                "couponDate": str(coupon_date),  # Преобразуем в строку
-                "couponValue": coupon_value,
-                "couponPercent": coupon_percent,
-                "type": "COUPON"
-            })
-
-        logging.info(f"📈 Найдено {len(coupons)} купонов для {isin}")
+    try:
+        logger.debug("🔄 Отправка запроса к MOEX для ISIN %s по URL: %s", isin, url)
+        tables = await fetch_iss(url, {"coupons": COUPONS.without("name")}, {"limit": "unlimited"})
+        coupons = moex_events(tables)
+        logger.info("📈 Найдено %s купонов для %s", len(coupons), isin)
         return coupons
 
     except Exception as e:
-        logging.error(f"❌ Ошибка при получении купонов с МОЕКС для {isin}: {e}")
+        logger.error("❌ Ошибка при получении купонов с МОЕКС для %s: %s", isin, e)
         return []
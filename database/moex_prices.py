@@ -0,0 +1,48 @@
+# database.moex_prices.py
+import logging
+from typing import NamedTuple
+
+from database.iss import fetch_iss, MARKET_SECURITIES, MARKET_DATA
+
+logger = logging.getLogger(__name__)
+
+# Котировки всех облигаций рынка одним запросом (кэшируется на HTTP_CACHE_TTL_MARKETDATA)
+MARKET_SECURITIES_PATH = "/iss/engines/stock/markets/bonds/securities.json"
+
+
+class BondQuote(NamedTuple):
+    price: float  # % от номинала: последняя сделка, иначе цена закрытия прошлого дня
+    face_value: float  # текущий номинал с учётом амортизаций, руб.
+    accrued: float  # НКД, руб.
+
+    @property
+    def clean(self) -> float:
+        return self.price * self.face_value / 100
+
+    @property
+    def dirty(self) -> float:
+        return self.clean + self.accrued
+
+
+async def fetch_bond_quotes(isins: list[str]) -> dict[str, BondQuote]:
+    """
+    Цены бумаг по ISIN с основного режима торгов. Бумаги без цены в ответ не попадают.
+    """
+    try:
+        tables = await fetch_iss(MARKET_SECURITIES_PATH,
+                                 {"securities": MARKET_SECURITIES, "marketdata": MARKET_DATA},
+                                 {"marketprice_board": "1"})
+    except Exception as e:
+        logger.warning("⚠️ Не удалось получить котировки облигаций с MOEX: %s", e)
+        return {}
+
+    wanted = set(isins)
+    last = {(row.SECID, row.BOARDID): row.LAST for row in tables["marketdata"] if row.LAST}
+    quotes = {}
+    for row in tables["securities"]:
+        if row.ISIN not in wanted or row.ISIN in quotes or not row.FACEVALUE:
+            continue
+        price = last.get((row.SECID, row.BOARDID)) or row.PREVPRICE
+        if price:
+            quotes[row.ISIN] = BondQuote(price, row.FACEVALUE, row.ACCRUEDINT or 0.0)
+    return quotes
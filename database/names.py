@@ -0,0 +1,162 @@
+# database.names.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, select, update
+
+from bot.DB import get_async_session, Instrument
+from config import NAME_CACHE_SIZE, NAME_BACKFILL_BATCH, NAME_BACKFILL_DELAY_SECONDS, NAME_RETRY_HOURS
+from core.metrics import Gauge
+from database.catalogue import lookup_bond
+from database.moex_name_lookup import get_bond_name_from_moex
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentNames:
+    """
+    Названия инструментов для обработчиков: LRU-кэш в памяти поверх instruments.name.
+    Обработчики никогда не ходят в сеть — ISIN без названия ставится в очередь, и фоновый воркер
+    догружает названия пачками (справочник T-Invest, затем MOEX параллельно), записывая пачку одним commit.
+    """
+
+    def __init__(self, capacity: int = NAME_CACHE_SIZE):
+        self.capacity = capacity
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._pending: dict[str, None] = {}  # упорядоченное множество ISIN в очереди
+        self._retry_at: dict[str, float] = {}  # ISIN, для которых название не нашлось, -> когда повторить
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.stats = {"hits": 0, "misses": 0, "queued": 0, "resolved": 0, "not_found": 0}
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def remember(self, isin: str, name: str | None) -> None:
+        if not name:
+            return
+        self._cache[isin] = name
+        self._cache.move_to_end(isin)
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def request(self, isin: str) -> None:
+        """Ставит ISIN в очередь фоновой догрузки (если недавно уже не искали)."""
+        if isin in self._pending or self._retry_at.get(isin, 0) > time.monotonic():
+            return
+        self._pending[isin] = None
+        self.stats["queued"] += 1
+        self._wakeup.set()
+
+    async def get_many(self, isins: list[str]) -> dict[str, str | None]:
+        """Названия по ISIN: из кэша, промахи — одним запросом к БД. Чего нет и в БД — в очередь, None."""
+        names, missing = {}, []
+        for isin in isins:
+            name = self._cache.get(isin)
+            if name:
+                self._cache.move_to_end(isin)
+                self.stats["hits"] += 1
+            else:
+                missing.append(isin)
+            names[isin] = name
+
+        if missing:
+            self.stats["misses"] += len(missing)
+            async with get_async_session() as session:
+                result = await session.execute(
+                    select(Instrument.isin, Instrument.name).where(Instrument.isin.in_(missing))
+                )
+                stored = dict(result.all())
+            for isin in missing:
+                name = stored.get(isin)
+                if name:
+                    self.remember(isin, name)
+                    names[isin] = name
+                else:
+                    self.request(isin)
+        return names
+
+    async def _resolve(self, isins: list[str]) -> dict[str, str | None]:
+        names = {}
+        remote = []
+        for isin in isins:
+            entry = lookup_bond(isin)
+            if entry and entry.name:
+                names[isin] = entry.name
+            else:
+                remote.append(isin)
+        # Частоту запросов к MOEX ограничивает token bucket HTTP-клиента
+        for isin, name in zip(remote, await asyncio.gather(*(get_bond_name_from_moex(isin) for isin in remote))):
+            names[isin] = name
+        return names
+
+    async def backfill(self, isins: list[str]) -> int:
+        """Догружает названия пачки и записывает найденные одним commit. Возвращает число найденных."""
+        names = await self._resolve(isins)
+        found = {isin: name for isin, name in names.items() if name}
+
+        if found:
+            async with get_async_session() as session:
+                # Не затираем название, которое успело появиться (например, из справочника при /add)
+                await session.execute(
+                    update(Instrument.__table__)
+                    .where(Instrument.isin == bindparam("b_isin"), Instrument.name.is_(None))
+                    .values(name=bindparam("b_name")),
+                    [{"b_isin": isin, "b_name": name} for isin, name in found.items()],
+                )
+                await session.commit()
+
+        retry_at = time.monotonic() + NAME_RETRY_HOURS * 3600
+        for isin in isins:
+            if isin in found:
+                self.remember(isin, found[isin])
+                self._retry_at.pop(isin, None)
+            else:
+                self._retry_at[isin] = retry_at
+
+        self.stats["resolved"] += len(found)
+        self.stats["not_found"] += len(isins) - len(found)
+        logger.info("🏷 Названия догружены: %s из %s", len(found), len(isins))
+        return len(found)
+
+    async def run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Немного ждём, чтобы собрать пачку из нескольких запросов подряд
+            await asyncio.sleep(NAME_BACKFILL_DELAY_SECONDS)
+            batch = list(self._pending)[:NAME_BACKFILL_BATCH]
+            for isin in batch:
+                del self._pending[isin]
+            if not self._pending:
+                self._wakeup.clear()
+            try:
+                await self.backfill(batch)
+            except Exception as e:
+                logger.error("❌ Догрузка названий не удалась: %s", e, exc_info=e)
+                retry_at = time.monotonic() + NAME_RETRY_HOURS * 3600
+                self._retry_at.update({isin: retry_at for isin in batch})
+
+    async def start(self) -> None:
+        """Ставит в очередь все инструменты без названия и запускает воркер."""
+        async with get_async_session() as session:
+            result = await session.execute(select(Instrument.isin).where(
+                Instrument.name.is_(None), Instrument.subscriptions.any()
+            ))
+            for isin in result.scalars():
+                self.request(isin)
+        self._task = asyncio.create_task(self.run(), name="name-backfill")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+instrument_names = InstrumentNames()
+Gauge("bondwatch_instrument_names_cached", "Названия инструментов в LRU-кэше", lambda: len(instrument_names))
@@ -0,0 +1,126 @@
+# database.shards.py
+import logging
+import math
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from bot.DB import get_async_session, ShardLease, WorkerHeartbeat
+from config import WORKER_SHARDS, WORKER_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(isin: str, shards: int = WORKER_SHARDS) -> int:
+    """Шард бумаги: crc32 от ISIN — стабилен между процессами и перезапусками, в отличие от hash()."""
+    return zlib.crc32(isin.encode()) % max(1, shards)
+
+
+class ShardLeases:
+    """
+    Аренда шардов процессом worker.py через таблицу shard_leases.
+
+    Каждый `tick()` процесс отмечается в worker_heartbeats, продлевает свои аренды и делит шарды поровну
+    между живыми процессами: лишние отпускает, недостающие забирает из свободных и просроченных.
+    Захват — условный UPDATE одной строки, поэтому два процесса не получат один шард. Если процесс упал,
+    его аренды истекают через WORKER_LEASE_SECONDS и достаются остальным.
+    """
+
+    def __init__(self, worker_id: str, shards: int = WORKER_SHARDS, lease_seconds: int = WORKER_LEASE_SECONDS):
+        self.worker_id = worker_id
+        self.shards = shards
+        self.lease = timedelta(seconds=lease_seconds)
+        self.held: set[int] = set()
+
+    async def tick(self) -> set[int]:
+        now = datetime.utcnow()
+        expires_at = now + self.lease
+        async with get_async_session() as session:
+            await session.execute(
+                sqlite_insert(WorkerHeartbeat)
+                .values(worker_id=self.worker_id, heartbeat_at=now)
+                .on_conflict_do_update(index_elements=[WorkerHeartbeat.worker_id], set_={"heartbeat_at": now})
+            )
+            # Давно упавшие процессы больше не нужны даже для истории
+            await session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.heartbeat_at < now - 10 * self.lease))
+            await session.execute(
+                sqlite_insert(ShardLease).values([{"shard": shard} for shard in range(self.shards)])
+                .on_conflict_do_nothing(index_elements=[ShardLease.shard])
+            )
+            live = await session.scalar(
+                select(func.count()).select_from(WorkerHeartbeat).where(WorkerHeartbeat.heartbeat_at > now - self.lease)
+            )
+            target = math.ceil(self.shards / max(1, live))
+
+            result = await session.execute(
+                update(ShardLease).where(ShardLease.owner == self.worker_id)
+                .values(expires_at=expires_at).returning(ShardLease.shard)
+            )
+            held = set(result.scalars())
+
+            # Пришёл новый процесс — отдаём ему лишнее
+            extra = sorted(held)[target:]
+            if extra:
+                await session.execute(
+                    update(ShardLease).where(ShardLease.shard.in_(extra), ShardLease.owner == self.worker_id)
+                    .values(owner=None, expires_at=None)
+                )
+                held.difference_update(extra)
+
+            if len(held) < target:
+                free = await session.execute(
+                    select(ShardLease.shard)
+                    .where(ShardLease.shard < self.shards,
+                           or_(ShardLease.owner.is_(None), ShardLease.expires_at < now))
+                    .order_by(ShardLease.shard)
+                )
+                for shard in free.scalars().all():
+                    if len(held) >= target:
+                        break
+                    claimed = await session.execute(
+                        update(ShardLease)
+                        .where(ShardLease.shard == shard,
+                               or_(ShardLease.owner.is_(None), ShardLease.expires_at < now))
+                        .values(owner=self.worker_id, expires_at=expires_at)
+                    )
+                    if claimed.rowcount:
+                        held.add(shard)
+            await session.commit()
+
+        if held != self.held:
+            logger.info("🧱 %s: шарды %s из %s (живых процессов: %s)", self.worker_id, sorted(held), self.shards, live)
+        # Меняем на месте: идущее обновление сверяется с этим множеством перед каждой бумагой
+        self.held.intersection_update(held)
+        self.held.update(held)
+        return set(held)
+
+    async def due(self, interval: timedelta) -> list[int]:
+        """Свои шарды, которые не обновлялись целиком дольше `interval`."""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(ShardLease.shard).where(
+                    ShardLease.owner == self.worker_id,
+                    or_(ShardLease.refreshed_at.is_(None), ShardLease.refreshed_at < datetime.utcnow() - interval),
+                ).order_by(ShardLease.shard)
+            )
+            return list(result.scalars())
+
+    async def mark_refreshed(self, shards: list[int]) -> None:
+        async with get_async_session() as session:
+            await session.execute(
+                update(ShardLease).where(ShardLease.shard.in_(shards), ShardLease.owner == self.worker_id)
+                .values(refreshed_at=datetime.utcnow())
+            )
+            await session.commit()
+
+    async def release(self) -> None:
+        """Штатная остановка: шарды сразу достаются остальным, не дожидаясь истечения аренды."""
+        async with get_async_session() as session:
+            await session.execute(
+                update(ShardLease).where(ShardLease.owner == self.worker_id).values(owner=None, expires_at=None)
+            )
+            await session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == self.worker_id))
+            await session.commit()
+        self.held.clear()
@@ -1,85 +1,186 @@
 # database.update.py
+import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
+from typing import Collection
+from sqlalchemy import select, func
+from config import REFRESH_WORKERS, WORKER_SYNC_SECONDS
 from database.figi_lookup import get_figi_by_ticker_and_classcode
-from database.moex_name_lookup import get_bond_name_from_moex
-from database.bond_update import get_next_coupon
+from database.names import instrument_names
+from database.bond_update import update_coupon_schedule
+from database.moex_bulk import ingest_market_bondization
+from database.catalogue import sync_bond_catalogue, load_bond_catalogue
+from database.shards import shard_of
+from bot.bond_info import bond_info_cache
+from bot.reminders import reminder_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Что процесс бота уже подхватил из БД за процессами worker.py (см. sync_worker_updates)
+_worker_sync: dict[str, datetime | None] = {"checked_at": None, "catalogue_synced_at": None}
 
 
 async def update_tracked_bond_figi(isin: str, figi: str, class_code: str, name: str):
-    from bot.DB import get_session, TrackedBond
-    session = get_session()
+    from bot.DB import get_async_session, Instrument
     try:
-        bond = session.query(TrackedBond).filter_by(isin=isin).first()
-        if bond:
-            bond.figi = figi if figi else bond.figi
-            bond.class_code = class_code
-            if not bond.name and name:
-                bond.name = name
-            bond.last_updated = datetime.utcnow()
-
-            # Обновим купон, если есть FIGI или хотя бы ISIN
-            coupon_info = await get_next_coupon(bond.isin, bond.figi, bond, session)
-            if coupon_info:
-                bond.next_coupon_date = coupon_info["next_coupon_date"]
-                bond.next_coupon_value = coupon_info["next_coupon_value"]
-
-            session.commit()
+        async with get_async_session() as session:
+            instrument = await session.get(Instrument, isin)
+            if instrument:
+                instrument.figi = figi if figi else instrument.figi
+                instrument.class_code = class_code
+                if not instrument.name and name:
+                    instrument.name = name
+                    instrument_names.remember(isin, name)
+                instrument.last_updated = datetime.utcnow()
+                await session.commit()
     except Exception as e:
-        print(f"Ошибка при обновлении облигации {isin}: {e}")
-    finally:
-        session.close()
+        logger.error("Ошибка при обновлении облигации %s: %s", isin, e)
 
 
-async def update_bond_data():
-    from bot.DB import get_session, TrackedBond
-    session = get_session()
-    try:
-        bonds_to_update = session.query(TrackedBond).filter(
-            TrackedBond.last_updated < datetime.utcnow() - timedelta(days=1)
-        ).all()
+async def _refresh_instrument(isin: str) -> None:
+    """Обновляет один инструмент в собственной сессии, чтобы воркеры не делили транзакцию."""
+    from bot.DB import get_async_session, Instrument
+    async with get_async_session() as session:
+        instrument = await session.get(Instrument, isin)
+        if not instrument:
+            return
 
-        for bond in bonds_to_update:
+        # FIGI ищем только если его ещё нет; ненайденный FIGI не мешает обновить график по MOEX
+        if not instrument.figi:
             try:
-                figi = None
-                try:
-                    figi = await get_figi_by_ticker_and_classcode(bond.isin, bond.class_code or "TQCB")
-                except ValueError as e:
-                    logging.error(f"Ошибка при получении FIGI для облигации {bond.isin}: {e}")
-                    continue  # Если не удалось получить FIGI, пропускаем эту облигацию
+                await get_figi_by_ticker_and_classcode(instrument.isin, instrument.class_code or "TQCB")
+            except ValueError as e:
+                logger.warning("Ошибка при получении FIGI для облигации %s: %s", isin, e)
+            await session.refresh(instrument)
+
+        # Название догрузит фоновый воркер — пачкой вместе с остальными
+        if not instrument.name:
+            instrument_names.request(instrument.isin)
+
+        instrument.last_updated = datetime.utcnow()
+
+        # Обновим график выплат (коммитит сессию)
+        if not await update_coupon_schedule(instrument, session):
+            await session.commit()
+    await reminder_scheduler.reschedule_isin(isin)
+    bond_info_cache.invalidate(isin)
+
+
+async def refresh_market_data() -> None:
+    """
+    Данные по всему рынку сразу: справочник облигаций T-Invest (FIGI без поиска по одной бумаге)
+    и графики выплат MOEX несколькими постраничными запросами.
+    """
+    try:
+        await sync_bond_catalogue()
+    except Exception as e:
+        logger.error("❌ Синхронизация справочника T-Invest не удалась, FIGI ищем по одной бумаге: %s", e)
+
+    try:
+        await ingest_market_bondization()
+    except Exception as e:
+        logger.error("❌ Массовая загрузка графиков MOEX не удалась, обновляем по одной бумаге: %s", e)
 
-                if not bond.name:
-                    name = await get_bond_name_from_moex(bond.isin)
-                    if name:
-                        bond.name = name
 
-                bond.figi = figi if figi else bond.figi
-                bond.last_updated = datetime.utcnow()
+async def refresh_instruments(workers: int = REFRESH_WORKERS, shards: Collection[int] | None = None,
+                              owned: Collection[int] | None = None) -> dict:
+    """
+    Параллельно обновляет устаревшие инструменты пулом из `workers` воркеров.
+    Каждый ISIN обновляется один раз, сколько бы пользователей его ни отслеживали.
+    :param shards: только бумаги этих шардов (см. database/shards.py), None — все
+    :param owned: арендованные процессом шарды; множество меняется во время обновления,
+        и бумаги шардов, которые из него пропали, пропускаются
+    """
+    from bot.DB import get_async_session, Instrument
+    async with get_async_session() as session:
+        result = await session.execute(select(Instrument.isin).where(
+            Instrument.last_updated < datetime.utcnow() - timedelta(days=1),
+            Instrument.subscriptions.any(),
+        ))
+        isins = list(result.scalars())
+    if shards is not None:
+        isins = [isin for isin in isins if shard_of(isin) in shards]
 
-                # Обновим купонную информацию
-                coupon_info = await get_next_coupon(bond.isin, bond.figi, bond, session)
-                if coupon_info:
-                    bond.next_coupon_date = coupon_info["next_coupon_date"]
-                    bond.next_coupon_value = coupon_info["next_coupon_value"]
+    queue = asyncio.Queue()
+    for isin in isins:
+        queue.put_nowait(isin)
 
-                session.commit()
+    stats = {"total": len(isins), "updated": 0, "errors": 0, "skipped": 0}
 
+    async def worker():
+        while True:
+            try:
+                isin = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if owned is not None and shard_of(isin) not in owned:
+                stats["skipped"] += 1  # Шард отдан другому процессу
+                continue
+            try:
+                await _refresh_instrument(isin)
+                stats["updated"] += 1
             except Exception as e:
-                logging.error(f"Ошибка при обновлении облигации {bond.isin}: {e}")
-    finally:
-        session.close()
+                stats["errors"] += 1
+                logger.error("Ошибка при обновлении облигации %s: %s", isin, e)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(isins))))))
+    elapsed = time.monotonic() - started
+
+    stats["elapsed"] = round(elapsed, 2)
+    stats["per_second"] = round(stats["total"] / elapsed, 2) if elapsed > 0 else 0.0
+    logger.info(
+        "🏁 Обновление облигаций завершено: %s/%s успешно, %s ошибок за %s c (%s обл./с, воркеров: %s)",
+        stats["updated"], stats["total"], stats["errors"], stats["elapsed"], stats["per_second"], workers
+    )
+    return stats
+
+
+async def update_bond_data(workers: int = REFRESH_WORKERS) -> dict:
+    """
+    Ежедневное обновление в процессе бота: сначала данные всего рынка, затем устаревшие бумаги.
+    Полный график каждой устаревшей бумаги запрашивается у MOEX отдельно: массовая загрузка видит только окно дат.
+    Частота запросов к MOEX и T-Invest ограничивается на уровне HTTP-клиентов.
+    """
+    await refresh_market_data()
+    return await refresh_instruments(workers)
+
+
+async def sync_worker_updates() -> dict:
+    """
+    Процесс бота при WORKER_SHARDS > 0: справочник и графики обновляют процессы worker.py, а кэши
+    в памяти бота живут своей жизнью. Перечитывает справочник, если его синхронизировали, и помечает
+    устаревшими ответы /info по бумагам, обновлённым с прошлой проверки.
+    """
+    from bot.DB import get_async_session, Instrument, BondCatalogue
+    now = datetime.utcnow()
+    # last_updated выставляется до загрузки графика, а коммитится после — берём проверки внахлёст
+    since = (_worker_sync["checked_at"] or now) - timedelta(seconds=WORKER_SYNC_SECONDS)
+    async with get_async_session() as session:
+        catalogue_synced_at = await session.scalar(select(func.max(BondCatalogue.synced_at)))
+        result = await session.execute(select(Instrument.isin).where(Instrument.last_updated >= since))
+        isins = list(result.scalars())
+
+    stats = {"catalogue": 0, "invalidated": len(isins)}
+    if catalogue_synced_at != _worker_sync["catalogue_synced_at"]:
+        stats["catalogue"] = await load_bond_catalogue()
+        _worker_sync["catalogue_synced_at"] = catalogue_synced_at
+    for isin in isins:
+        bond_info_cache.invalidate(isin)
+    _worker_sync["checked_at"] = now
+    logger.debug("🔁 Изменения процессов worker.py подхвачены: %s", stats)
+    return stats
 
 
 async def mark_bond_as_not_found(isin: str):
-    from bot.DB import get_session, TrackedBond
-    session = get_session()
+    from bot.DB import get_async_session, Instrument
     try:
-        bond = session.query(TrackedBond).filter_by(isin=isin).first()
-        if bond:
-            bond.name = None
-            bond.last_updated = datetime.utcnow()
-            session.commit()
+        async with get_async_session() as session:
+            instrument = await session.get(Instrument, isin)
+            if instrument:
+                # Название не сбрасываем: ненайденный FIGI ничего не говорит о названии бумаги
+                instrument.last_updated = datetime.utcnow()
+                await session.commit()
     except Exception as e:
-        print(f"Ошибка при отметке облигации {isin} как несуществующей: {e}")
-    finally:
-        session.close()
+        logger.error("Ошибка при отметке облигации %s как несуществующей: %s", isin, e)
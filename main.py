@@ -4,60 +4,116 @@ import io
 import logging
 from telegram.ext import Application
 from telegram.ext import ContextTypes
-from config import TELEGRAM_TOKEN
+from config import TELEGRAM_TOKEN, TELEGRAM_API_URL, WORKER_SHARDS, WORKER_SYNC_SECONDS, OUTBOX_POLL_SECONDS, \
+    CONCURRENT_UPDATES, BOT_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET
 from bot.handlers import register_handlers
-from bot.DB import init_db
-from apscheduler.schedulers.background import BackgroundScheduler
+from bot.updates import PerChatUpdateProcessor
+from bot.DB import init_db, async_engine
+from bot.reminders import reminder_scheduler
+from bot.outbox import outbox
+from bot.enrichment import bond_enrichment
+from core.http_cache import close_cache
+from database.catalogue import load_bond_catalogue, sync_bond_catalogue
+from core.http_client import close_clients
+from core.scheduler import run_repeating, job_stats
+from core.logging_setup import setup_logging, stop_logging
+from core.metrics import start_metrics_server, stop_metrics_server
 from bot.notifications import check_and_notify
-from database.update import update_bond_data
+from database.update import update_bond_data, sync_worker_updates
+from database.names import instrument_names
 import sys
 import os
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
 sys.stdout = io.TextIOWrapper(sys.stdout.detach(), encoding='utf-8', errors='ignore')
 sys.stderr = io.TextIOWrapper(sys.stderr.detach(), encoding='utf-8', errors='ignore')
 
 sys.stdout.reconfigure(encoding='utf-8')
 os.environ["PYTHONIOENCODING"] = "utf-8"
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,  # Можно оставить INFO вместо DEBUG, чтобы файл не забивался
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()  # <== Удалено: теперь не логирует в консоль
-    ]
-)
-
 
 # Обработчик ошибок
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logging.error("Exception while handling update:", exc_info=context.error)
+    logger.error("Exception while handling update:", exc_info=context.error)
+
+
+async def post_init(app: Application) -> None:
+    # Справочник облигаций T-Invest: из БД, а при первом запуске — сразу из сети
+    if not await load_bond_catalogue():
+        app.create_task(sync_bond_catalogue())
+
+    # Исходящие сообщения живут на event loop бота. Очередь напоминаний — тоже, если нет отдельных
+    # процессов worker.py: иначе её ведёт worker, а бот дочитывает его сообщения из outbox
+    if WORKER_SHARDS:
+        await outbox.start(app.bot, poll_seconds=OUTBOX_POLL_SECONDS)
+    else:
+        await outbox.start(app.bot)
+        await reminder_scheduler.start()
+    await instrument_names.start()
+    await start_metrics_server()
+
+
+async def post_shutdown(app: Application) -> None:
+    logger.info("🕒 Статистика периодических задач: %s", job_stats)
+    await stop_metrics_server()
+    await reminder_scheduler.stop()
+    await bond_enrichment.stop()
+    await instrument_names.stop()
+    await outbox.stop()
+    await close_clients()
+    close_cache()
+    await async_engine.dispose()
 
 
 # Основная точка входа
 def main():
-    logging.info("Initializing database...")
+    # Файл и консоль пишутся в отдельном потоке; уровни и ротация — LOG_* в config.py
+    setup_logging()
+
+    logger.info("Initializing database...")
     init_db()
 
-    logging.info("Starting bot...")
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    logger.info("Starting bot...")
+    builder = (Application.builder().token(TELEGRAM_TOKEN).base_url(TELEGRAM_API_URL)
+               .post_init(post_init).post_shutdown(post_shutdown))
+    if CONCURRENT_UPDATES > 1:
+        # Разные чаты — параллельно, один чат — по очереди (диалоги /add и /remove остаются согласованными)
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES))
+    app = builder.build()
 
     register_handlers(app)
     app.add_error_handler(error_handler)
 
-    # Настройка APScheduler с использованием job queue
-    scheduler = BackgroundScheduler()
-
-    # Добавляем задачу для проверки и уведомления о событиях
-    scheduler.add_job(check_and_notify, 'interval', seconds=30, args=[app.bot])
-
-    # Добавляем задачу для обновления данных облигаций раз в сутки
-    scheduler.add_job(update_bond_data, 'interval', hours=24)
-
-    # Запускаем планировщик
-    scheduler.start()
-
-    logging.info("Bot started...")
-    app.run_polling()  # теперь без asyncio.run()
+    if WORKER_SHARDS:
+        logger.info("🛠 Обновление облигаций и напоминания — в процессах worker.py (шардов: %s)", WORKER_SHARDS)
+        # Справочник и кэш /info в памяти бота сверяются с тем, что записали процессы worker.py
+        run_repeating(app.job_queue, sync_worker_updates, timedelta(seconds=WORKER_SYNC_SECONDS),
+                      name="sync_worker_updates")
+    else:
+        # Периодические задачи выполняются на event loop бота (JobQueue) и останавливаются вместе с ним
+        # Напоминания отправляет reminder_scheduler по датам из БД; здесь — только периодическая сверка очереди
+        run_repeating(app.job_queue, check_and_notify, timedelta(hours=1), name="check_and_notify", args=(app.bot,))
+
+        # Обновление данных облигаций раз в сутки
+        run_repeating(app.job_queue, update_bond_data, timedelta(hours=24), name="update_bond_data")
+
+    logger.info("Bot started (%s, одновременно обновлений: %s)...", BOT_MODE, CONCURRENT_UPDATES)
+    try:
+        if BOT_MODE == "webhook":
+            app.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=min(100, max(40, CONCURRENT_UPDATES)),
+            )
+        else:
+            app.run_polling()  # теперь без asyncio.run()
+    finally:
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+# tests/test_reminders.py
+import asyncio
+from datetime import date, datetime, timedelta
+
+from bot import reminders
+from bot.DB import COUPON
+from bot.reminders import ReminderScheduler
+from config import REMINDER_DAYS_BEFORE
+
+
+def test_reminder_is_retried_when_outbox_write_fails(monkeypatch):
+    """Сбой записи в outbox не теряет напоминание: оно возвращается в очередь и уходит со второй попытки."""
+    calls = []
+
+    async def enqueue_many(messages: list[dict]) -> int:
+        calls.append(messages)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return len(messages)
+
+    async def already_sent(user_ids=None) -> set:
+        return set()
+
+    monkeypatch.setattr(reminders.outbox, "enqueue_many", enqueue_many)
+    monkeypatch.setattr(ReminderScheduler, "_already_sent", staticmethod(already_sent))
+
+    async def scenario() -> None:
+        scheduler = ReminderScheduler()
+        event_date = date.today() + timedelta(days=REMINDER_DAYS_BEFORE)
+        key = (1, "RU000A000001", COUPON, event_date)
+        scheduler._schedule(*key, 10.0)
+        later = datetime.now() + timedelta(days=1)
+
+        await scheduler._send(scheduler._pop_due(later))
+        assert key not in scheduler._fired
+        assert len(scheduler) == 1
+
+        await scheduler._send(scheduler._pop_due(later))
+        assert key in scheduler._fired
+        assert len(scheduler) == 0
+        assert len(calls) == 2
+
+        # Отправленное в тот же день при перестройке очереди не возвращается
+        scheduler._schedule(*key, 10.0)
+        assert len(scheduler) == 0
+
+    asyncio.run(scenario())
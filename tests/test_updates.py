@@ -0,0 +1,60 @@
+# tests/test_updates.py
+import asyncio
+import time
+
+from telegram import Chat, Message, Update
+
+from bot.updates import PerChatUpdateProcessor
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(chat_id, Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, None, chat, text="/list"))
+
+
+def test_busy_chat_does_not_block_other_chats():
+    """Очередь занятого чата не занимает общие слоты: другой чат отвечает сразу."""
+    async def scenario() -> tuple[list[int], float]:
+        processor = PerChatUpdateProcessor(4)
+        order: list[int] = []
+        started = time.monotonic()
+
+        async def handler(update_id: int, seconds: float) -> None:
+            await asyncio.sleep(seconds)
+            order.append(update_id)
+
+        busy = [asyncio.create_task(processor.process_update(_update(1, 1), handler(1, 0.5)))]
+        await asyncio.sleep(0.01)
+        for update_id in range(2, 6):
+            busy.append(asyncio.create_task(processor.process_update(_update(update_id, 1), handler(update_id, 0))))
+        await asyncio.sleep(0.01)
+
+        await processor.process_update(_update(100, 2), handler(100, 0))
+        other_chat_done = time.monotonic() - started
+        await asyncio.gather(*busy)
+        return order, other_chat_done
+
+    order, other_chat_done = asyncio.run(scenario())
+    assert other_chat_done < 0.2
+    # Обновления одного чата — в порядке поступления
+    assert [update_id for update_id in order if update_id != 100] == [1, 2, 3, 4, 5]
+
+
+def test_concurrency_limit_is_kept():
+    async def scenario() -> int:
+        processor = PerChatUpdateProcessor(2)
+        running = peak = 0
+
+        async def handler() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(_update(i, i), handler()) for i in range(10)))
+        assert not processor._locks
+        assert processor.concurrency == 2 and processor.current_concurrent_updates == 0
+        return peak
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,135 @@
+# worker.py
+"""
+Отдельный процесс обновления облигаций и планирования напоминаний (при WORKER_SHARDS > 0).
+
+Бумаги делятся на WORKER_SHARDS шардов по crc32 от ISIN, процессы арендуют шарды через БД
+(database/shards.py) и обновляют только свои. Владелец шарда 0 дополнительно загружает данные
+всего рынка перед обновлением и ведёт очередь напоминаний и сводок: сообщения он только записывает
+в outbox, доставляет их процесс бота. Упавший процесс теряет аренду, и его шарды забирают остальные.
+
+Запуск (несколько процессов — на одной или разных машинах с общей БД):
+    WORKER_SHARDS=4 LOG_FILE=worker.log python worker.py
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from datetime import timedelta
+
+from config import WORKER_SHARDS, WORKER_TICK_SECONDS, REFRESH_WORKERS
+from bot.DB import init_db, async_engine
+from bot.reminders import reminder_scheduler
+from core.http_cache import close_cache
+from core.http_client import close_clients
+from core.logging_setup import setup_logging, stop_logging
+from database.catalogue import load_bond_catalogue
+from database.shards import ShardLeases
+from database.update import refresh_market_data, refresh_instruments
+
+logger = logging.getLogger(__name__)
+
+# Как часто обновлять бумаги шарда и сверять очередь напоминаний с БД (как в процессе бота)
+REFRESH_INTERVAL = timedelta(hours=24)
+REMINDER_RELOAD_SECONDS = 3600
+# Шард, владелец которого отвечает за общие для всего рынка задачи
+MARKET_SHARD = 0
+
+
+class RefreshWorker:
+    def __init__(self, worker_id: str, workers: int = REFRESH_WORKERS):
+        self.leases = ShardLeases(worker_id)
+        self.workers = workers
+        self._refresh_task: asyncio.Task | None = None
+        self._next_reload = 0.0
+
+    async def _refresh(self, shards: list[int]) -> None:
+        if MARKET_SHARD in shards:
+            await refresh_market_data()
+        # Живое множество аренд: если шард отдадут другому процессу, его бумаги дальше не обновляем
+        stats = await refresh_instruments(self.workers, set(shards), owned=self.leases.held)
+        await self.leases.mark_refreshed(shards)
+        logger.info("🏁 Шарды %s обновлены: %s", shards, stats)
+
+    async def _notifications(self, owner: bool) -> None:
+        """Очередь напоминаний живёт только у владельца шарда 0."""
+        if owner and not reminder_scheduler.running:
+            await reminder_scheduler.start()
+            self._next_reload = time.monotonic() + REMINDER_RELOAD_SECONDS
+        elif not owner and reminder_scheduler.running:
+            await reminder_scheduler.stop()
+        elif owner and time.monotonic() >= self._next_reload:
+            # Графики и подписки меняют другие процессы — раз в час перестраиваем очередь по БД
+            await reminder_scheduler.load()
+            self._next_reload = time.monotonic() + REMINDER_RELOAD_SECONDS
+
+    async def tick(self) -> None:
+        held = await self.leases.tick()
+        await self._notifications(MARKET_SHARD in held)
+
+        if self._refresh_task is None or self._refresh_task.done():
+            due = await self.leases.due(REFRESH_INTERVAL)
+            if due:
+                self._refresh_task = asyncio.create_task(self._refresh(due), name="refresh-shards")
+                self._refresh_task.add_done_callback(_log_failure)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        await load_bond_catalogue()
+        try:
+            while not stop.is_set():
+                try:
+                    await self.tick()
+                except Exception as e:
+                    logger.error("❌ Ошибка цикла воркера: %s", e, exc_info=e)
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=WORKER_TICK_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._refresh_task:
+                self._refresh_task.cancel()
+                await asyncio.gather(self._refresh_task, return_exceptions=True)
+            await reminder_scheduler.stop()
+            await self.leases.release()
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        logger.error("❌ Обновление шардов завершилось с ошибкой: %s", task.exception())
+
+
+async def run_worker(worker_id: str) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("🛠 Воркер %s запущен: шардов %s", worker_id, WORKER_SHARDS)
+    try:
+        await RefreshWorker(worker_id).run(stop)
+    finally:
+        await close_clients()
+        close_cache()
+        await async_engine.dispose()
+        logger.info("🛠 Воркер %s остановлен", worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--id", default=f"{socket.gethostname()}:{os.getpid()}", help="имя процесса в shard_leases")
+    args = parser.parse_args()
+    if WORKER_SHARDS < 1:
+        parser.error("WORKER_SHARDS не задан: без него обновление работает в процессе бота (main.py)")
+
+    setup_logging()
+    init_db()
+    try:
+        asyncio.run(run_worker(args.id))
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()